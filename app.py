@@ -4,18 +4,43 @@ Processa dados de jogadores e calcula métricas de saúde/engajamento
 Parâmetros dinâmicos calculados a partir dos dados carregados
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import io
+import re
+import csv
+import gzip
+import zipfile
+import hashlib
+import codecs
+import fnmatch
+import itertools
+import unicodedata
 import json
+import tempfile
+import time
+import select
+import struct
 import sqlite3
 import os
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import uuid
+from itertools import repeat
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Callable
 import uvicorn
 import sys
 import warnings
@@ -41,8 +66,8 @@ IS_FROZEN = getattr(sys, 'frozen', False)
 
 app = FastAPI(title="Health Score Dashboard", version="2.8.0")
 
-# Configuração do banco de dados SQLite
-DB_PATH = os.path.join(BASE_DIR, "historico.db")
+# Configuração do banco de dados SQLite (HISTORICO_DB troca o arquivo, ex.: nos testes)
+DB_PATH = os.environ.get('HISTORICO_DB') or os.path.join(BASE_DIR, "historico.db")
 
 print(f"[INFO] Base dir: {BASE_DIR}")
 print(f"[INFO] DB path: {DB_PATH}")
@@ -167,6 +192,24 @@ def init_db():
         ON player_snapshots(player_id, data)
     ''')
     
+    # Arquivos ingeridos pelo monitoramento de pasta (evita reprocessar após reiniciar)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS arquivos_monitorados (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            tamanho INTEGER NOT NULL,
+            modificado_em REAL NOT NULL,
+            hash TEXT,
+            data TEXT,
+            status TEXT,
+            job_id TEXT,
+            snapshot_id INTEGER,
+            erro TEXT,
+            processado_em TEXT,
+            UNIQUE (nome, tamanho, modificado_em)
+        )
+    ''')
+    
     conn.commit()
     conn.close()
 
@@ -197,9 +240,6 @@ print(f"[INFO] Templates dir: {TEMPLATES_DIR}")
 # Servir arquivos estáticos
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
-# Cache temporário dos dados processados
-cached_data = {}
-
 # ========== PARÂMETROS PADRÃO (fallback) ==========
 DEFAULT_PARAMS = {
     'torneios_por_dia': 40,
@@ -218,6 +258,96 @@ VIP_MAPPING = {
     5: {'nome': 'Berilo', 'cor': '#3498DB', 'icone': '👑'},
 }
 
+# ========== COLUNAS DAS MÉTRICAS ==========
+# Nomes aceitos para cada métrica (já normalizados: minúsculas, sem espaços nas pontas),
+# em ordem de preferência
+COLUNAS_METRICAS = {
+    'torneios': ['qtd_torneios_3d', 'torneios_3d', 'qtd_torneios'],
+    'maratonas': ['qtd_maratonas_3d', 'maratonas_3d', 'qtd_maratonas'],
+    'missoes': ['qtd_missoes_3d', 'missoes_3d', 'qtd_missoes', 'qtd_missões_3d'],
+    'promos': ['qtd_promos_3d', 'promos_3d', 'qtd_promos'],
+    'logins': ['qtd_logins_3d', 'logins_3d'],
+    'compras': ['qtd_compras_7d'],
+    'ticket': ['ticket_medio_7d'],
+}
+
+# ========== ATIVIDADES DO SCORE DE ENGAJAMENTO ==========
+# Coluna de origem e peso de cada atividade na média ponderada
+ATIVIDADES_ENGAJAMENTO = {
+    'torneios': {'col': 'qtd_torneios_3d', 'peso': 2.0},
+    'maratonas': {'col': 'qtd_maratonas_3d', 'peso': 2.5},
+    'missoes': {'col': 'qtd_missoes_3d', 'peso': 1.5},
+    'promos': {'col': 'qtd_promos_3d', 'peso': 1.0},
+    'logins': {'col': 'qtd_logins_3d', 'peso': 1.0},
+}
+
+# ========== ESQUEMA DE ENTRADA ==========
+# Colunas do arquivo usadas pelo processamento: nome padrão -> nomes aceitos
+# (normalizados, em ordem de preferência) e tipo compacto aplicado após a leitura.
+# 'contador': menor inteiro que comporta os valores; 'categoria': pd.Categorical;
+# None: mantém o tipo lido. As demais colunas só são lidas com colunas_extras.
+ESQUEMA_ENTRADA = {
+    'player_id': {'aliases': ['player_id', 'pid'], 'tipo': None},
+    'nivel_vip': {'aliases': ['nivel_vip'], 'tipo': 'categoria'},
+    'lastlogin': {'aliases': ['lastlogin'], 'tipo': None},
+    'ultima_compra': {'aliases': ['ultima_compra'], 'tipo': None},
+    'translation': {'aliases': ['translation'], 'tipo': 'categoria'},
+    **{possiveis[0]: {'aliases': possiveis, 'tipo': 'contador'}
+       for metrica, possiveis in COLUNAS_METRICAS.items() if metrica != 'ticket'},
+    'ticket_medio_7d': {'aliases': COLUNAS_METRICAS['ticket'], 'tipo': None},
+}
+
+# Todos os nomes aceitos, para a projeção de colunas na leitura
+NOMES_ESQUEMA = {alias for config in ESQUEMA_ENTRADA.values() for alias in config['aliases']}
+
+# ========== CATEGORIAS DE JOGADORES ==========
+# Ordem fixa das 12 categorias (mesma ordem de distribuicao_categorias)
+CATEGORIAS = [
+    '⭐ Elite',
+    '🏆 VIP Ativo',
+    '📈 Bom',
+    '📊 Estável',
+    '⚠️ Atenção',
+    '🚨 Risco Alto',
+    '🚨 Risco: Queda Receita',
+    '🚨 Risco: Queda Engajamento',
+    '💎 Churn Iminente',
+    '💰 Oportunidade VIP',
+    '💰 Oportunidade',
+    '🎯 Potencial',
+]
+
+# Chave de cada categoria em distribuicao_categorias (resumo do dashboard)
+CHAVES_CATEGORIAS = dict(zip([
+    'elite', 'vip_ativo', 'bom', 'estavel', 'atencao', 'risco_alto',
+    'risco_receita', 'risco_engajamento', 'churn_iminente',
+    'oportunidade_vip', 'oportunidade', 'potencial',
+], CATEGORIAS))
+
+# Tabela de regras avaliada em ordem: a primeira condição verdadeira define a categoria.
+# Cada condição recebe arrays 'geral', 'compras', 'engajamento' e 'vip'.
+REGRAS_CATEGORIA = [
+    # OPORTUNIDADES: Alto engajamento mas compras baixas (prioritários para CRM)
+    ('💰 Oportunidade VIP', lambda s: (s['engajamento'] >= 60) & (s['compras'] < 40) & (s['vip'] >= 3)),
+    ('💰 Oportunidade', lambda s: (s['engajamento'] >= 60) & (s['compras'] < 40)),
+    # POTENCIAL: Bom engajamento, compras médias
+    ('🎯 Potencial', lambda s: (s['engajamento'] >= 40) & (s['compras'] >= 30) & (s['compras'] < 50)),
+    # Categorização por score geral
+    ('⭐ Elite', lambda s: s['geral'] >= 90),
+    ('🏆 VIP Ativo', lambda s: s['geral'] >= 80),
+    ('📈 Bom', lambda s: s['geral'] >= 65),
+    ('📊 Estável', lambda s: s['geral'] >= 50),
+    ('⚠️ Atenção', lambda s: s['geral'] >= 40),
+    # Risco moderado (25-40) - identificar causa
+    ('🚨 Risco Alto', lambda s: (s['geral'] >= 25) & (s['compras'] < 25) & (s['engajamento'] < 35)),
+    ('🚨 Risco: Queda Receita', lambda s: (s['geral'] >= 25) & (s['compras'] < s['engajamento'])),
+    ('🚨 Risco: Queda Engajamento', lambda s: s['geral'] >= 25),
+    # Score < 25 = Crítico
+    ('💎 Churn Iminente', lambda s: (s['compras'] < 15) & (s['engajamento'] < 20)),
+    ('🚨 Risco: Queda Receita', lambda s: s['compras'] < s['engajamento']),
+]
+CATEGORIA_PADRAO = '🚨 Risco: Queda Engajamento'
+
 def get_vip_info(nivel: int) -> Dict:
     """Retorna informações do nível VIP"""
     return VIP_MAPPING.get(nivel, {'nome': 'Desconhecido', 'cor': '#95A5A6', 'icone': '❓'})
@@ -240,6 +370,45 @@ def media_sem_zeros(serie) -> float:
     return valores_validos.mean()
 
 
+def estatisticas_zscore(matriz: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Média e desvio padrão (amostral) por coluna de uma matriz já sem nulos.
+    Desvio zero ou indefinido (menos de 2 linhas) vira 1 para evitar divisão por zero.
+    """
+    medias = matriz.mean(axis=0) if len(matriz) > 0 else np.full(matriz.shape[1], np.nan)
+    if len(matriz) > 1:
+        desvios = matriz.std(axis=0, ddof=1)
+    else:
+        desvios = np.ones(matriz.shape[1])
+    desvios = np.where(desvios == 0, 1.0, desvios)
+    return medias, desvios
+
+
+def score_zscore(matriz: np.ndarray, medias: np.ndarray, desvios: np.ndarray) -> np.ndarray:
+    """
+    Converte valores em pontuações 0-100 via Z-Score.
+    Score = 50 + (z_score * 25), limitado entre 0 e 100.
+    """
+    z_scores = (matriz - medias) / desvios
+    return np.clip(50 + z_scores * 25, 0, 100)
+
+
+def converter_datas(serie: pd.Series) -> pd.Series:
+    """
+    Converte uma coluna de datas de uma só vez.
+    Valores inválidos viram NaT; células em formato diferente do inferido
+    são reconvertidas individualmente (format='mixed').
+    """
+    datas = pd.to_datetime(serie, errors='coerce')
+    falhas = datas.isna() & serie.notna()
+    if falhas.any():
+        datas = datas.copy()
+        datas[falhas] = pd.to_datetime(serie[falhas], errors='coerce', format='mixed')
+    if getattr(datas.dt, 'tz', None) is not None:
+        datas = datas.dt.tz_localize(None)
+    return datas
+
+
 def get_regiao(translation: str) -> str:
     """
     Identifica a região do jogador baseado na tradução.
@@ -262,6 +431,15 @@ def get_regiao(translation: str) -> str:
     return 'int'
 
 
+def calcular_regioes(traducoes: pd.Series) -> np.ndarray:
+    """Região de cada jogador, aplicando get_regiao uma vez por tradução distinta"""
+    categorias = traducoes.astype('category')
+    
+    # Última posição da tabela: tradução nula (código -1)
+    regioes = np.array([get_regiao(t) for t in categorias.cat.categories] + ['int'], dtype=object)
+    return regioes[categorias.cat.codes.to_numpy()]
+
+
 def get_regiao_nome(regiao: str) -> str:
     """Retorna o nome amigável da região"""
     nomes = {
@@ -273,102 +451,242 @@ def get_regiao_nome(regiao: str) -> str:
     return nomes.get(regiao, 'Desconhecido')
 
 
+def resolver_colunas_metricas(colunas) -> Dict[str, str]:
+    """
+    Resolve, uma única vez, qual coluna real corresponde a cada métrica de
+    COLUNAS_METRICAS (comparação com nomes normalizados).
+    """
+    colunas_normalizadas = {}
+    for col in colunas:
+        colunas_normalizadas.setdefault(str(col).lower().strip(), col)
+    
+    metricas = {}
+    for metrica, possiveis in COLUNAS_METRICAS.items():
+        for nome in possiveis:
+            if nome in colunas_normalizadas:
+                metricas[metrica] = colunas_normalizadas[nome]
+                break
+    return metricas
+
+
+# ========== ESTATÍSTICAS MESCLÁVEIS ==========
+
+# Linhas por partição no cálculo das estatísticas. As partições (e a ordem de
+# mescla) não dependem do número de workers, o que mantém o modo paralelo
+# idêntico bit a bit ao serial.
+TAMANHO_PARTICAO = 131_072
+
+
+class SketchQuantis:
+    """
+    Histograma mesclável (valor -> contagem) para medianas calculadas por blocos.
+    Exato enquanto houver até max_valores valores distintos (sempre, se max_valores
+    for None); acima disso, valores vizinhos são fundidos e a mediana fica aproximada.
+    """
+    
+    def __init__(self, max_valores: Optional[int] = 8192):
+        self.max_valores = max_valores
+        self.valores = np.empty(0)
+        self.contagens = np.empty(0)
+    
+    def adicionar(self, valores: np.ndarray, contagens: np.ndarray = None):
+        """Adiciona valores (ou pares valor/contagem) ao histograma"""
+        if contagens is None:
+            valores, contagens = np.unique(valores, return_counts=True)
+        todos = np.concatenate([self.valores, valores])
+        todas_contagens = np.concatenate([self.contagens, contagens])
+        self.valores, inverso = np.unique(todos, return_inverse=True)
+        self.contagens = np.bincount(inverso, weights=todas_contagens)
+        self._compactar()
+    
+    def mesclar(self, outro: 'SketchQuantis'):
+        """Mescla outro histograma neste"""
+        self.adicionar(outro.valores, outro.contagens)
+    
+    def _compactar(self):
+        """Funde pares de valores vizinhos (média ponderada) até caber no limite"""
+        while self.max_valores is not None and len(self.valores) > self.max_valores:
+            pares = len(self.valores) // 2 * 2
+            valores = self.valores[:pares].reshape(-1, 2)
+            contagens = self.contagens[:pares].reshape(-1, 2)
+            novas_contagens = contagens.sum(axis=1)
+            novos_valores = (valores * contagens).sum(axis=1) / novas_contagens
+            self.valores = np.concatenate([novos_valores, self.valores[pares:]])
+            self.contagens = np.concatenate([novas_contagens, self.contagens[pares:]])
+    
+    def mediana(self) -> float:
+        """Mediana dos valores adicionados (média dos dois centrais se a contagem for par)"""
+        total = self.contagens.sum()
+        if total == 0:
+            return 0
+        acumulado = np.cumsum(self.contagens)
+        inferior = self.valores[np.searchsorted(acumulado, (total + 1) // 2)]
+        superior = self.valores[np.searchsorted(acumulado, total // 2 + 1)]
+        return (inferior + superior) / 2
+
+
+class AcumuladorEstatisticas:
+    """
+    Acumula, bloco a bloco, as mesmas estatísticas de calcular_estatisticas
+    com momentos mescláveis (contagem, média, M2 - fórmula de Chan) e
+    SketchQuantis para as medianas. Acumuladores podem ser mesclados entre si.
+    
+    max_valores_sketch=None mantém as medianas exatas (modo em memória).
+    """
+    
+    def __init__(self, max_valores_sketch: Optional[int] = 8192):
+        self.max_valores_sketch = max_valores_sketch
+        self.metricas = {}
+    
+    @staticmethod
+    def _momentos(valores: np.ndarray) -> tuple[int, float, float]:
+        """Contagem, média e soma dos quadrados dos desvios (M2) de um array"""
+        n = len(valores)
+        if n == 0:
+            return 0, 0.0, 0.0
+        media = valores.mean()
+        return n, media, ((valores - media) ** 2).sum()
+    
+    @staticmethod
+    def _mesclar_momentos(a: tuple, b: tuple) -> tuple[int, float, float]:
+        """Mescla dois conjuntos de momentos (contagem, média, M2)"""
+        n_a, media_a, m2_a = a
+        n_b, media_b, m2_b = b
+        if n_a == 0:
+            return b
+        if n_b == 0:
+            return a
+        n = n_a + n_b
+        delta = media_b - media_a
+        media = media_a + delta * n_b / n
+        m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+        return n, media, m2
+    
+    def _metrica(self, metrica: str, col: str) -> Dict[str, Any]:
+        if metrica not in self.metricas:
+            self.metricas[metrica] = {
+                'coluna': col,
+                'ativos': (0, 0.0, 0.0),
+                'total': (0, 0.0, 0.0),
+                'sketch': SketchQuantis(self.max_valores_sketch),
+            }
+        return self.metricas[metrica]
+    
+    def atualizar(self, df: pd.DataFrame):
+        """Acumula as estatísticas de um bloco"""
+        for metrica, col in resolver_colunas_metricas(df.columns).items():
+            acc = self._metrica(metrica, col)
+            valores = df[col].to_numpy(dtype=float, na_value=np.nan)
+            ativos = valores[valores > 0]
+            acc['ativos'] = self._mesclar_momentos(acc['ativos'], self._momentos(ativos))
+            acc['total'] = self._mesclar_momentos(acc['total'], self._momentos(np.nan_to_num(valores, nan=0.0)))
+            acc['sketch'].adicionar(ativos)
+    
+    def mesclar(self, outro: 'AcumuladorEstatisticas'):
+        """Mescla as estatísticas de outro acumulador neste"""
+        for metrica, acc_outro in outro.metricas.items():
+            acc = self._metrica(metrica, acc_outro['coluna'])
+            acc['ativos'] = self._mesclar_momentos(acc['ativos'], acc_outro['ativos'])
+            acc['total'] = self._mesclar_momentos(acc['total'], acc_outro['total'])
+            acc['sketch'].mesclar(acc_outro['sketch'])
+    
+    def resultado(self) -> Dict[str, Dict[str, Any]]:
+        """Estatísticas globais no mesmo formato de HealthScoreCalculator.calcular_estatisticas"""
+        estatisticas = {}
+        for metrica, acc in self.metricas.items():
+            contagem, media, m2 = acc['ativos']
+            n_total, media_total, m2_total = acc['total']
+            
+            if contagem > 1:
+                desvpad = np.sqrt(m2 / (contagem - 1))
+            else:
+                desvpad = np.nan if contagem == 1 else 0  # Desvio de um único valor é indefinido
+            
+            # Mesmas regras de estatisticas_zscore: desvio zero ou indefinido vira 1
+            desvpad_zscore = np.sqrt(m2_total / (n_total - 1)) if n_total > 1 else 1.0
+            if desvpad_zscore == 0:
+                desvpad_zscore = 1.0
+            
+            estatisticas[metrica] = {
+                'coluna': acc['coluna'],
+                'contagem': contagem,
+                'media': media if contagem > 0 else 0,
+                'desvpad': desvpad,
+                'mediana': acc['sketch'].mediana(),
+                'media_zscore': media_total if n_total > 0 else np.nan,
+                'desvpad_zscore': desvpad_zscore,
+            }
+        return estatisticas
+
+
 class HealthScoreCalculator:
     """Calcula scores de saúde para jogadores com parâmetros dinâmicos"""
     
-    def __init__(self, params: Dict[str, float] = None):
+    def __init__(self, params: Dict[str, float] = None, pesos_engajamento: Dict[str, float] = None,
+                 estatisticas: Dict[str, Dict[str, Any]] = None, data_referencia: datetime = None):
         self.params = params or self._calcular_params_padrao()
+        # Data de referência ("hoje") para recência de login e compra
+        self.data_referencia = data_referencia or datetime.now()
+        # Estatísticas do dataset (calcular_estatisticas), reaproveitadas pelos Z-Scores
+        self.estatisticas = estatisticas or {}
+        # Pesos das atividades no score de engajamento (sobrescrevíveis por atividade)
+        self.pesos_engajamento = {key: config['peso'] for key, config in ATIVIDADES_ENGAJAMENTO.items()}
+        self.pesos_engajamento.update(pesos_engajamento or {})
+    
+    @staticmethod
+    def calcular_estatisticas(df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+        """
+        Calcula numa única etapa as estatísticas de todas as métricas (COLUNAS_METRICAS):
+        - coluna: nome real da coluna no DataFrame (aliases resolvidos uma vez)
+        - contagem, media, desvpad, mediana: apenas valores > 0 (participantes ativos)
+        - media_zscore, desvpad_zscore: coluna inteira com fillna(0), usadas pelos Z-Scores
+        
+        Os momentos são calculados por partições de TAMANHO_PARTICAO linhas e
+        mesclados em ordem (mesmo resultado do modo paralelo); medianas exatas.
+        """
+        acumulador = AcumuladorEstatisticas(max_valores_sketch=None)
+        for inicio in range(0, max(len(df), 1), TAMANHO_PARTICAO):
+            acumulador.atualizar(df.iloc[inicio:inicio + TAMANHO_PARTICAO])
+        return acumulador.resultado()
     
     @staticmethod
-    def calcular_params_dinamicos(df: pd.DataFrame) -> Dict[str, float]:
+    def calcular_params_dinamicos(df: pd.DataFrame, estatisticas: Dict[str, Dict[str, Any]] = None) -> Dict[str, float]:
         """
         Calcula parâmetros dinâmicos baseados nas médias do dataset:
         - Média de torneios_3d / 3
         - Média de maratonas_3d / 3
         - Média de missões_3d / 3
         - Média de promoções_3d / 3
+        
+        Aceita as estatísticas já calculadas por calcular_estatisticas.
         """
+        if estatisticas is None:
+            estatisticas = HealthScoreCalculator.calcular_estatisticas(df)
+        
         params = {
             'janela_logins_dias': 3,
             'fonte': 'dinamico'  # Marca que são parâmetros calculados
         }
         
-        # Normaliza nomes de colunas
-        df_cols = df.columns.str.lower().str.strip()
-        
-        # Mapeia colunas possíveis
-        col_mapping = {
-            'torneios': ['qtd_torneios_3d', 'torneios_3d', 'qtd_torneios'],
-            'maratonas': ['qtd_maratonas_3d', 'maratonas_3d', 'qtd_maratonas'],
-            'missoes': ['qtd_missoes_3d', 'missoes_3d', 'qtd_missoes', 'qtd_missões_3d'],
-            'promos': ['qtd_promos_3d', 'promos_3d', 'qtd_promos'],
-        }
-        
-        def encontrar_coluna(possiveis):
-            for col in possiveis:
-                if col in df_cols:
-                    return col
-            return None
-        
         # Calcula médias e converte para "por dia"
         # Fórmula: MÉDIA(qtd_xxx_3d) / 3 = média por dia
-        
-        # Torneios - média apenas de quem participou (ignora zeros)
-        col_torneios = encontrar_coluna(col_mapping['torneios'])
-        if col_torneios:
-            media_torneios_3d = media_sem_zeros(df[col_torneios])
-            params['torneios_por_dia'] = media_torneios_3d / 3
-            params['media_torneios_3d'] = media_torneios_3d
-            # Desvio padrão e mediana também ignorando zeros
-            valores_torneios = df[col_torneios][df[col_torneios] > 0]
-            params['desvpad_torneios_3d'] = valores_torneios.std() if len(valores_torneios) > 0 else 0
-            params['mediana_torneios_3d'] = valores_torneios.median() if len(valores_torneios) > 0 else 0
-        else:
-            params['torneios_por_dia'] = DEFAULT_PARAMS['torneios_por_dia']
-        
-        # Maratonas - média apenas de quem participou (ignora zeros)
-        col_maratonas = encontrar_coluna(col_mapping['maratonas'])
-        if col_maratonas:
-            media_maratonas_3d = media_sem_zeros(df[col_maratonas])
-            params['maratonas_por_dia'] = media_maratonas_3d / 3
-            params['media_maratonas_3d'] = media_maratonas_3d
-            valores_maratonas = df[col_maratonas][df[col_maratonas] > 0]
-            params['desvpad_maratonas_3d'] = valores_maratonas.std() if len(valores_maratonas) > 0 else 0
-            params['mediana_maratonas_3d'] = valores_maratonas.median() if len(valores_maratonas) > 0 else 0
-        else:
-            params['maratonas_por_dia'] = DEFAULT_PARAMS['maratonas_por_dia']
-        
-        # Missões - média apenas de quem participou (ignora zeros)
-        col_missoes = encontrar_coluna(col_mapping['missoes'])
-        if col_missoes:
-            media_missoes_3d = media_sem_zeros(df[col_missoes])
-            params['missoes_por_dia'] = media_missoes_3d / 3
-            params['media_missoes_3d'] = media_missoes_3d
-            valores_missoes = df[col_missoes][df[col_missoes] > 0]
-            params['desvpad_missoes_3d'] = valores_missoes.std() if len(valores_missoes) > 0 else 0
-            params['mediana_missoes_3d'] = valores_missoes.median() if len(valores_missoes) > 0 else 0
-        else:
-            params['missoes_por_dia'] = DEFAULT_PARAMS['missoes_por_dia']
-        
-        # Promoções - média apenas de quem participou (ignora zeros)
-        col_promos = encontrar_coluna(col_mapping['promos'])
-        if col_promos:
-            media_promos_3d = media_sem_zeros(df[col_promos])
-            params['promos_por_dia'] = media_promos_3d / 3
-            params['media_promos_3d'] = media_promos_3d
-            valores_promos = df[col_promos][df[col_promos] > 0]
-            params['desvpad_promos_3d'] = valores_promos.std() if len(valores_promos) > 0 else 0
-            params['mediana_promos_3d'] = valores_promos.median() if len(valores_promos) > 0 else 0
-        else:
-            params['promos_por_dia'] = DEFAULT_PARAMS['promos_por_dia']
+        # Média, desvio padrão e mediana apenas de quem participou (ignora zeros)
+        for metrica in ['torneios', 'maratonas', 'missoes', 'promos']:
+            stats = estatisticas.get(metrica)
+            if stats:
+                params[f'{metrica}_por_dia'] = stats['media'] / 3
+                params[f'media_{metrica}_3d'] = stats['media']
+                params[f'desvpad_{metrica}_3d'] = stats['desvpad']
+                params[f'mediana_{metrica}_3d'] = stats['mediana']
+            else:
+                params[f'{metrica}_por_dia'] = DEFAULT_PARAMS[f'{metrica}_por_dia']
         
         # Logins - média apenas de quem logou (ignora zeros)
-        col_logins = encontrar_coluna(['qtd_logins_3d', 'logins_3d'])
-        if col_logins:
-            params['media_logins_3d'] = media_sem_zeros(df[col_logins])
-            valores_logins = df[col_logins][df[col_logins] > 0]
-            params['desvpad_logins_3d'] = valores_logins.std() if len(valores_logins) > 0 else 0
-            params['mediana_logins_3d'] = valores_logins.median() if len(valores_logins) > 0 else 0
+        stats = estatisticas.get('logins')
+        if stats:
+            params['media_logins_3d'] = stats['media']
+            params['desvpad_logins_3d'] = stats['desvpad']
+            params['mediana_logins_3d'] = stats['mediana']
         
         # Calcula os fatores de conversão
         # Fórmula: 100 / (média_3d * 1.5) - jogador acima da média ganha mais pontos
@@ -407,41 +725,54 @@ class HealthScoreCalculator:
         
         return params
     
+    def _estatisticas_zscore(self, metricas: List[tuple], matriz: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Média e desvio padrão (fillna(0)) das colunas da matriz.
+        Reaproveita self.estatisticas quando todas as métricas foram calculadas
+        sobre as mesmas colunas; senão calcula a partir da matriz.
+        """
+        stats = [self.estatisticas.get(metrica) for metrica, _ in metricas]
+        if all(stat and stat['coluna'] == col for stat, (_, col) in zip(stats, metricas)):
+            return (np.array([stat['media_zscore'] for stat in stats]),
+                    np.array([stat['desvpad_zscore'] for stat in stats]))
+        return estatisticas_zscore(matriz)
+    
     def calcular_score_login(self, df: pd.DataFrame) -> pd.Series:
         """
         Calcula score de login baseado em:
         - Dias desde último login (decaimento exponencial)
         - Quantidade de logins na janela de 3 dias
+        
+        Cálculo colunar: a coluna lastlogin é convertida uma única vez e as
+        pontuações são calculadas sobre arrays NumPy inteiros.
         """
-        hoje = datetime.now()
-        scores = []
+        hoje = self.data_referencia
+        n = len(df)
+        soma = np.zeros(n)
+        qtd_pontuacoes = np.zeros(n)
         
-        for _, row in df.iterrows():
-            pontuacoes = []
-            
-            # Recência do último login
-            if 'lastlogin' in df.columns and pd.notna(row.get('lastlogin')):
-                try:
-                    last_login = pd.to_datetime(row['lastlogin'])
-                    dias_desde_login = (hoje - last_login).days
-                    login_score = 100 * np.exp(-max(0, dias_desde_login) / 7)
-                    pontuacoes.append(login_score)
-                except:
-                    pass
-            
-            # Frequência de logins na janela de 3 dias
-            if 'qtd_logins_3d' in df.columns:
-                qtd = row.get('qtd_logins_3d', 0)
-                if pd.notna(qtd):
-                    freq_score = min(qtd * self.params['logins_factor'], 100)
-                    pontuacoes.append(freq_score)
-            
-            if pontuacoes:
-                scores.append(np.mean(pontuacoes))
-            else:
-                scores.append(50)
+        # Recência do último login
+        if 'lastlogin' in df.columns:
+            datas = converter_datas(df['lastlogin'])
+            validos = datas.notna().to_numpy()
+            dias_desde_login = (pd.Timestamp(hoje) - datas).dt.days.to_numpy(dtype=float, na_value=0)
+            login_score = 100 * np.exp(-np.maximum(0, dias_desde_login) / 7)
+            soma += np.where(validos, login_score, 0)
+            qtd_pontuacoes += validos
         
-        return pd.Series(scores)
+        # Frequência de logins na janela de 3 dias
+        if 'qtd_logins_3d' in df.columns:
+            qtd = df['qtd_logins_3d'].to_numpy(dtype=float, na_value=np.nan)
+            validos = ~np.isnan(qtd)
+            freq_score = np.minimum(qtd * self.params['logins_factor'], 100)
+            soma += np.where(validos, freq_score, 0)
+            qtd_pontuacoes += validos
+        
+        # Média das pontuações disponíveis (50 quando não há nenhuma)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = np.where(qtd_pontuacoes > 0, soma / qtd_pontuacoes, 50.0)
+        
+        return pd.Series(scores, index=df.index)
     
     def calcular_score_engajamento(self, df: pd.DataFrame) -> pd.Series:
         """
@@ -454,57 +785,32 @@ class HealthScoreCalculator:
         
         Z-Score = (valor - média) / desvio_padrão
         Score final = 50 + (z_score * 25)  # Média = 50, cada desvio = 25 pontos
+        
+        As atividades presentes são empilhadas numa matriz (linhas x atividades)
+        e a média ponderada sai de um único produto matriz-vetor.
         """
-        scores = []
-        
-        # Calcula estatísticas para cada atividade (com fillna(0) para zeros)
-        atividades = {
-            'torneios': {'col': 'qtd_torneios_3d', 'peso': 2.0},
-            'maratonas': {'col': 'qtd_maratonas_3d', 'peso': 2.5},
-            'missoes': {'col': 'qtd_missoes_3d', 'peso': 1.5},
-            'promos': {'col': 'qtd_promos_3d', 'peso': 1.0},
-            'logins': {'col': 'qtd_logins_3d', 'peso': 1.0}
-        }
+        # Apenas atividades com coluna no arquivo entram no cálculo
+        chaves = [key for key, config in ATIVIDADES_ENGAJAMENTO.items() if config['col'] in df.columns]
         
-        # Calcula média e desvio padrão para cada atividade
-        stats = {}
-        for key, config in atividades.items():
-            col = config['col']
-            if col in df.columns:
-                valores = df[col].fillna(0)
-                media = valores.mean()
-                std = valores.std() if len(valores) > 1 else 1
-                if std == 0:
-                    std = 1  # Evita divisão por zero
-                stats[key] = {'media': media, 'std': std, 'peso': config['peso']}
-        
-        for _, row in df.iterrows():
-            atividades_scores = []
-            atividades_pesos = []
-            
-            # Calcula Z-Score para cada atividade
-            for key, stat in stats.items():
-                col = atividades[key]['col']
-                valor = row.get(col, 0) or 0
-                
-                # Calcula Z-Score
-                z_score = (valor - stat['media']) / stat['std']
-                # Converte Z-Score para escala 0-100 (média = 50, desvio = 25)
-                atividade_score = 50 + (z_score * 25)
-                # Limita entre 0 e 100
-                atividade_score = max(0, min(100, atividade_score))
-                
-                atividades_scores.append(atividade_score * stat['peso'])
-                atividades_pesos.append(stat['peso'])
-            
-            if atividades_scores:
-                # Média ponderada das atividades
-                score_final = sum(atividades_scores) / sum(atividades_pesos)
-                scores.append(score_final)
-            else:
-                scores.append(40)  # Score padrão se não houver dados
+        if not chaves:
+            return pd.Series(40.0, index=df.index)  # Score padrão se não houver dados
+        
+        # Matriz de atividades (com fillna(0): contagem ausente conta como zero
+        # atividades, tanto na média e desvio padrão quanto na pontuação)
+        colunas = [ATIVIDADES_ENGAJAMENTO[key]['col'] for key in chaves]
+        matriz = df[colunas].fillna(0).to_numpy(dtype=float)
+        pesos = np.array([self.pesos_engajamento[key] for key in chaves], dtype=float)
+        
+        # Média e desvio padrão de cada atividade
+        medias, desvios = self._estatisticas_zscore(list(zip(chaves, colunas)), matriz)
         
-        return pd.Series(scores)
+        # Z-Score de cada atividade, convertido para escala 0-100
+        atividades_scores = score_zscore(matriz, medias, desvios)
+        
+        # Média ponderada das atividades
+        scores = atividades_scores @ pesos / pesos.sum()
+        
+        return pd.Series(scores, index=df.index)
     
     def calcular_score_compras(self, df: pd.DataFrame) -> pd.Series:
         """
@@ -515,142 +821,88 @@ class HealthScoreCalculator:
         
         Z-Score = (valor - média) / desvio_padrão
         Score final = 50 + (z_score * 25)  # Média = 50, cada desvio = 25 pontos
+        
+        Cálculo colunar: cada componente só pesa nas linhas em que existe
+        (máscara por linha) e os pesos são renormalizados por linha.
         """
-        scores = []
-        hoje = datetime.now()
-        
-        # Calcula estatísticas para quantidade (ignorando zeros)
-        if 'qtd_compras_7d' in df.columns:
-            valores_qtd = df['qtd_compras_7d'].fillna(0)
-            media_qtd = valores_qtd.mean()
-            std_qtd = valores_qtd.std() if len(valores_qtd) > 1 else 1
-            if std_qtd == 0:
-                std_qtd = 1  # Evita divisão por zero
-        else:
-            media_qtd = 2
-            std_qtd = 1
-        
-        # Calcula estatísticas para ticket (ignorando zeros)
-        if 'ticket_medio_7d' in df.columns:
-            valores_ticket = df['ticket_medio_7d'].fillna(0)
-            media_ticket = valores_ticket.mean()
-            std_ticket = valores_ticket.std() if len(valores_ticket) > 1 else 1
-            if std_ticket == 0:
-                std_ticket = 1
-        else:
-            media_ticket = 50
-            std_ticket = 10
+        hoje = self.data_referencia
+        n = len(df)
+        soma_pontuacoes = np.zeros(n)
+        soma_pesos = np.zeros(n)
         
-        for _, row in df.iterrows():  
-            pontuacoes = []
-            pesos = []
-            
-            # 1. Quantidade de compras (40% de peso) - Z-Score
-            if 'qtd_compras_7d' in df.columns:
-                qtd = row.get('qtd_compras_7d', 0) or 0
-                # Calcula Z-Score
-                z_score_qtd = (qtd - media_qtd) / std_qtd
-                # Converte Z-Score para escala 0-100 (média = 50, desvio = 25)
-                qtd_score = 50 + (z_score_qtd * 25)
-                # Limita entre 0 e 100
-                qtd_score = max(0, min(100, qtd_score))
-                pontuacoes.append(qtd_score * 0.40)
-                pesos.append(0.40)
-            
-            # 2. Ticket médio (35% de peso) - Z-Score
-            if 'ticket_medio_7d' in df.columns:
-                ticket = row.get('ticket_medio_7d', 0) or 0
-                # Calcula Z-Score
-                z_score_ticket = (ticket - media_ticket) / std_ticket
-                # Converte Z-Score para escala 0-100
-                ticket_score = 50 + (z_score_ticket * 25)
-                # Limita entre 0 e 100
-                ticket_score = max(0, min(100, ticket_score))
-                pontuacoes.append(ticket_score * 0.35)
-                pesos.append(0.35)
-            
-            # 3. Recência da última compra (25% de peso)
-            if 'ultima_compra' in df.columns and pd.notna(row.get('ultima_compra')):
-                try:
-                    ultima = pd.to_datetime(row['ultima_compra'])
-                    dias_ultima = (hoje - ultima).days
-                    # Decaimento: 100% no dia 0, 50% aos 21 dias, 25% aos 42 dias
-                    recencia_score = 100 * np.exp(-max(0, dias_ultima) / 30)
-                    pontuacoes.append(recencia_score * 0.25)
-                    pesos.append(0.25)
-                except:
-                    pass
-            
-            if pontuacoes:
-                # Média ponderada
-                score_final = sum(pontuacoes) / sum(pesos) if sum(pesos) > 0 else 30
-                scores.append(score_final)
-            else:
-                scores.append(0)  # Sem dados de compra = 0
+        # 1. Quantidade de compras (40% de peso) e 2. Ticket médio (35% de peso) - Z-Score
+        for metrica, col, peso in [('compras', 'qtd_compras_7d', 0.40), ('ticket', 'ticket_medio_7d', 0.35)]:
+            if col in df.columns:
+                # Valor ausente conta como zero (média, desvio padrão e pontuação)
+                valores = df[[col]].fillna(0).to_numpy(dtype=float)
+                medias, desvios = self._estatisticas_zscore([(metrica, col)], valores)
+                col_score = score_zscore(valores, medias, desvios)[:, 0]
+                soma_pontuacoes += col_score * peso
+                soma_pesos += peso
+        
+        # 3. Recência da última compra (25% de peso) - apenas onde a data é válida
+        if 'ultima_compra' in df.columns:
+            datas = converter_datas(df['ultima_compra'])
+            validos = datas.notna().to_numpy()
+            dias_ultima = (pd.Timestamp(hoje) - datas).dt.days.to_numpy(dtype=float, na_value=0)
+            # Decaimento: 100% no dia 0, 50% aos 21 dias, 25% aos 42 dias
+            recencia_score = 100 * np.exp(-np.maximum(0, dias_ultima) / 30)
+            soma_pontuacoes += np.where(validos, recencia_score * 0.25, 0)
+            soma_pesos += np.where(validos, 0.25, 0)
         
-        return pd.Series(scores)
+        # Média ponderada; sem dados de compra = 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = np.where(soma_pesos > 0, soma_pontuacoes / soma_pesos, 0.0)
+        
+        return pd.Series(scores, index=df.index)
     
-    def calcular_score_geral(self, row: pd.Series) -> float:
-        """Calcula score geral ponderado"""
-        engajamento = row.get('score_engajamento', 50)
-        compras = row.get('score_compras', 30)
+    def calcular_score_geral(self, df: pd.DataFrame) -> pd.Series:
+        """Calcula score geral ponderado (colunar; aceita DataFrame ou dict de Series)"""
+        engajamento = df.get('score_engajamento', 50)
+        compras = df.get('score_compras', 30)
         
         # Ponderação: Engajamento 30%, Compras 70%
         return engajamento * 0.3 + compras * 0.7
     
-    def categorizar_jogador(self, row: pd.Series) -> str:
+    def categorizar_jogadores(self, df: pd.DataFrame) -> pd.Series:
         """
-        Categoriza jogador com granularidade para ações de CRM:
+        Categoriza jogadores com granularidade para ações de CRM:
         
-        Hierarquia de categorização:
+        Hierarquia de categorização (ver REGRAS_CATEGORIA):
         1. Primeiro verifica oportunidades (alto engajamento + baixas compras)
         2. Depois categoriza por score geral
         3. Por fim, identifica tipo de risco
+        
+        A tabela de regras é avaliada com np.select sobre os arrays de score;
+        retorna um Categorical com a ordem fixa de CATEGORIAS.
         """
-        score_geral = row.get('score_geral', 50)
-        score_compras = row.get('score_compras', 0)
-        score_engajamento = row.get('score_engajamento', 0)
-        nivel_vip = row.get('nivel_vip', 1)
-        
-        # OPORTUNIDADES: Alto engajamento mas compras baixas
-        # Estes são prioritários para CRM pois têm potencial
-        if score_engajamento >= 60 and score_compras < 40:
-            if nivel_vip >= 3:
-                return "💰 Oportunidade VIP"
-            else:
-                return "💰 Oportunidade"
-        
-        # POTENCIAL: Bom engajamento, compras médias
-        if score_engajamento >= 40 and score_compras >= 30 and score_compras < 50:
-            return "🎯 Potencial"
-        
-        # Categorização por score geral (mais granular)
-        if score_geral >= 90:
-            return "⭐ Elite"
-        elif score_geral >= 80:
-            return "🏆 VIP Ativo"
-        elif score_geral >= 65:
-            return "📈 Bom"
-        elif score_geral >= 50:
-            return "📊 Estável"
-        elif score_geral >= 40:
-            return "⚠️ Atenção"
-        elif score_geral >= 25:
-            # Risco moderado - identificar causa
-            if score_compras < 25 and score_engajamento < 35:
-                return "🚨 Risco Alto"
-            elif score_compras < score_engajamento:
-                return "🚨 Risco: Queda Receita"
-            else:
-                return "🚨 Risco: Queda Engajamento"
-        else:
-            # Score < 25 = Crítico
-            if score_compras < 15 and score_engajamento < 20:
-                return "💎 Churn Iminente"
-            elif score_compras < score_engajamento:
-                return "🚨 Risco: Queda Receita"
-            else:
-                return "🚨 Risco: Queda Engajamento"
+        n = len(df)
+        scores = {
+            'geral': df['score_geral'].to_numpy(dtype=float) if 'score_geral' in df.columns else np.full(n, 50.0),
+            'compras': df['score_compras'].to_numpy(dtype=float) if 'score_compras' in df.columns else np.zeros(n),
+            'engajamento': df['score_engajamento'].to_numpy(dtype=float) if 'score_engajamento' in df.columns else np.zeros(n),
+            'vip': df['nivel_vip'].to_numpy(dtype=float, na_value=np.nan) if 'nivel_vip' in df.columns else np.ones(n),
+        }
+        
+        condicoes = [regra(scores) for _, regra in REGRAS_CATEGORIA]
+        nomes = [categoria for categoria, _ in REGRAS_CATEGORIA]
+        codigos = np.select(condicoes, [CATEGORIAS.index(nome) for nome in nomes],
+                            default=CATEGORIAS.index(CATEGORIA_PADRAO))
+        
+        return pd.Series(pd.Categorical.from_codes(codigos, categories=CATEGORIAS), index=df.index)
+
+
+# Expectativas de compra por nível VIP (nível desconhecido usa o nível 1)
+EXPECTATIVAS_VIP = {
+    1: {'compras_7d': 1, 'ticket_medio': 20, 'label': 'Iniciante'},
+    2: {'compras_7d': 2, 'ticket_medio': 35, 'label': 'Regular'},
+    3: {'compras_7d': 3, 'ticket_medio': 50, 'label': 'Fiel'},
+    4: {'compras_7d': 4, 'ticket_medio': 75, 'label': 'Premium'},
+    5: {'compras_7d': 5, 'ticket_medio': 100, 'label': 'Elite'}
+}
+
+# Status de performance vs. expectativa do VIP, do melhor para o pior
+STATUS_VIP = ["🏆 Superando", "✅ Dentro da meta", "⚠️ Abaixo do esperado", "🚨 Crítico"]
 
 
 def get_expectativa_vip(nivel: int) -> Dict:
@@ -658,90 +910,208 @@ def get_expectativa_vip(nivel: int) -> Dict:
     Retorna expectativas de compra por nível VIP
     Usado para comparar performance real vs esperada
     """
-    expectativas = {
-        1: {'compras_7d': 1, 'ticket_medio': 20, 'label': 'Iniciante'},
-        2: {'compras_7d': 2, 'ticket_medio': 35, 'label': 'Regular'},
-        3: {'compras_7d': 3, 'ticket_medio': 50, 'label': 'Fiel'},
-        4: {'compras_7d': 4, 'ticket_medio': 75, 'label': 'Premium'},
-        5: {'compras_7d': 5, 'ticket_medio': 100, 'label': 'Elite'}
-    }
-    return expectativas.get(int(nivel) if pd.notna(nivel) else 1, expectativas[1])
+    return EXPECTATIVAS_VIP.get(int(nivel) if pd.notna(nivel) else 1, EXPECTATIVAS_VIP[1])
 
 
-def calcular_status_vip(row: pd.Series) -> str:
-    """
-    Compara performance do jogador com a expectativa do seu VIP
-    Retorna: acima, na_media, abaixo, critico
+def _tabela_vip(mapa: Dict[int, Dict], campo: str, padrao) -> np.ndarray:
+    """Monta array de lookup indexado pelo nível VIP (posição 0 = padrão)"""
+    tabela = np.full(max(mapa) + 1, padrao, dtype=object)
+    for nivel, info in mapa.items():
+        tabela[nivel] = info[campo]
+    return tabela
+
+
+def calcular_colunas_vip(df: pd.DataFrame) -> Dict[str, pd.Categorical]:
     """
-    nivel = row.get('nivel_vip', 1)
-    expectativa = get_expectativa_vip(nivel)
-    
-    qtd_real = row.get('qtd_compras_7d', 0) or 0
-    ticket_real = row.get('ticket_medio_7d', 0) or 0
+    Calcula de uma só vez as colunas derivadas do nível VIP:
+    vip_expectativa, vip_status, vip_nome, vip_cor e vip_icone.
     
-    qtd_esperada = expectativa['compras_7d']
-    ticket_esperado = expectativa['ticket_medio']
+    Os atributos vêm de arrays de lookup indexados pelo nível (np.take);
+    o status compara performance real vs. esperada com np.select.
+    """
+    niveis = df['nivel_vip'].to_numpy(dtype=float, na_value=np.nan)
+    
+    # Índice na tabela: nível truncado (como int()), 0 para nulo/fora do mapeamento
+    with np.errstate(invalid='ignore'):
+        truncados = np.trunc(niveis)
+    indice_vip = np.where((truncados >= 1) & (truncados <= max(VIP_MAPPING)), truncados, 0)
+    indice_vip = np.nan_to_num(indice_vip).astype(np.intp)
+    indice_expectativa = np.where((truncados >= 1) & (truncados <= max(EXPECTATIVAS_VIP)), truncados, 1)
+    indice_expectativa = np.nan_to_num(indice_expectativa, nan=1).astype(np.intp)
+    
+    # Expectativas do nível de cada jogador
+    qtd_esperada = _tabela_vip(EXPECTATIVAS_VIP, 'compras_7d', EXPECTATIVAS_VIP[1]['compras_7d']).astype(float)
+    ticket_esperado = _tabela_vip(EXPECTATIVAS_VIP, 'ticket_medio', EXPECTATIVAS_VIP[1]['ticket_medio']).astype(float)
+    labels = _tabela_vip(EXPECTATIVAS_VIP, 'label', EXPECTATIVAS_VIP[1]['label'])
+    
+    n = len(df)
+    qtd_real = df['qtd_compras_7d'].to_numpy(dtype=float, na_value=np.nan) if 'qtd_compras_7d' in df.columns else np.zeros(n)
+    ticket_real = df['ticket_medio_7d'].to_numpy(dtype=float, na_value=np.nan) if 'ticket_medio_7d' in df.columns else np.zeros(n)
+    
+    # Calcula performance (0 a 200%); média ponderada: quantidade pesa mais
+    perf_qtd = qtd_real / np.take(qtd_esperada, indice_expectativa) * 100
+    perf_ticket = ticket_real / np.take(ticket_esperado, indice_expectativa) * 100
+    performance = (perf_qtd * 0.6) + (perf_ticket * 0.4)
     
-    # Calcula performance (0 a 200%)
-    perf_qtd = (qtd_real / qtd_esperada * 100) if qtd_esperada > 0 else 0
-    perf_ticket = (ticket_real / ticket_esperado * 100) if ticket_esperado > 0 else 0
+    # Performance nula (dados faltantes) cai no status crítico
+    codigo_status = np.select(
+        [performance >= 120, performance >= 90, performance >= 60],
+        [0, 1, 2],
+        default=3
+    )
     
-    # Média ponderada: quantidade pesa mais
-    performance = (perf_qtd * 0.6) + (perf_ticket * 0.4)
+    def categorical(tabela: np.ndarray, indices: np.ndarray) -> pd.Categorical:
+        categorias, codigos = np.unique(tabela.astype(str), return_inverse=True)
+        return pd.Categorical.from_codes(np.take(codigos, indices), categories=categorias)
     
-    if performance >= 120:
-        return "🏆 Superando"
-    elif performance >= 90:
-        return "✅ Dentro da meta"
-    elif performance >= 60:
-        return "⚠️ Abaixo do esperado"
-    else:
-        return "🚨 Crítico"
+    padrao = get_vip_info(0)
+    return {
+        'vip_expectativa': categorical(labels, indice_expectativa),
+        'vip_status': pd.Categorical.from_codes(codigo_status, categories=STATUS_VIP),
+        'vip_nome': categorical(_tabela_vip(VIP_MAPPING, 'nome', padrao['nome']), indice_vip),
+        'vip_cor': categorical(_tabela_vip(VIP_MAPPING, 'cor', padrao['cor']), indice_vip),
+        'vip_icone': categorical(_tabela_vip(VIP_MAPPING, 'icone', padrao['icone']), indice_vip),
+    }
 
 
 def detectar_tipo_arquivo(filename: str) -> str:
     """Detecta o tipo de arquivo baseado na extensão"""
-    if filename.lower().endswith('.csv'):
+    nome = filename.lower()
+    if nome.endswith('.csv'):
         return 'csv'
-    elif filename.lower().endswith(('.xlsx', '.xls')):
+    elif nome.endswith('.csv.gz'):
+        return 'csv_gz'
+    elif nome.endswith('.zip'):
+        return 'zip'
+    elif nome.endswith(('.xlsx', '.xls')):
         return 'excel'
+    elif nome.endswith('.parquet'):
+        return 'parquet'
+    elif nome.endswith(('.feather', '.arrow', '.ipc')):
+        return 'feather'
     else:
         return 'unknown'
 
 
-def processar_dados_jogadores(df: pd.DataFrame) -> tuple[pd.DataFrame, Dict]:
-    """Processa DataFrame e adiciona scores calculados com parâmetros dinâmicos"""
-    
-    # Calcula parâmetros dinâmicos a partir dos dados
-    params = HealthScoreCalculator.calcular_params_dinamicos(df)
+# Formatos colunares são lidos com pyarrow (dependência opcional)
+TIPOS_COLUNARES = {'parquet', 'feather'}
+
+
+def coluna_do_esquema(col) -> bool:
+    """Indica se uma coluna do arquivo pertence ao ESQUEMA_ENTRADA (usado como usecols)"""
+    return str(col).lower().strip() in NOMES_ESQUEMA
+
+
+def compactar_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte as colunas do ESQUEMA_ENTRADA para tipos compactos: contadores
+    inteiros (sem nulos) para o menor inteiro possível e colunas 'categoria'
+    para pd.Categorical. Os valores não mudam.
+    """
+    for col, config in ESQUEMA_ENTRADA.items():
+        if col not in df.columns:
+            continue
+        if config['tipo'] == 'contador' and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif config['tipo'] == 'categoria' and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def normalizar_colunas(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normaliza nomes de colunas (minúsculas, sem espaços), renomeia os aliases
+    do ESQUEMA_ENTRADA para o nome padrão (ex.: pid -> player_id) e compacta os tipos
+    """
+    df.columns = df.columns.str.lower().str.strip()
     
-    # Inicializa calculador com parâmetros dinâmicos
-    calc = HealthScoreCalculator(params)
+    # Renomeia colunas comuns do CRM para padrão
+    renomear = {}
+    for col, config in ESQUEMA_ENTRADA.items():
+        if col in df.columns:
+            continue
+        for alias in config['aliases']:
+            if alias in df.columns:
+                renomear[alias] = col
+                break
+    if renomear:
+        df = df.rename(columns=renomear)
+    
+    return compactar_tipos(df)
+
+
+def processar_dados_jogadores(df: pd.DataFrame, workers: int = None,
+                              progresso: Callable[[str], None] = None) -> tuple[pd.DataFrame, Dict]:
+    """
+    Processa DataFrame e adiciona scores calculados com parâmetros dinâmicos.
+    Com workers > 1 (padrão: WORKERS_PADRAO), arquivos grandes usam o modo
+    paralelo, com resultado idêntico ao serial.
+    progresso, se informado, é chamado no início de cada etapa ('parametros', 'pontuacao').
+    """
+    workers = workers or WORKERS_PADRAO
+    progresso = progresso or (lambda etapa: None)
     
     # Normaliza nomes de colunas
-    df.columns = df.columns.str.lower().str.strip()
+    df = normalizar_colunas(df)
     
-    # Renomeia colunas comuns do CRM para padrão
-    if 'pid' in df.columns and 'player_id' not in df.columns:
-        df = df.rename(columns={'pid': 'player_id'})
+    if workers > 1 and len(df) > TAMANHO_PARTICAO:
+        return processar_dados_paralelo(df, workers, progresso)
     
+    progresso('parametros')
+    
+    # Estatísticas do dataset (uma única etapa, reaproveitada pelos Z-Scores)
+    estatisticas = HealthScoreCalculator.calcular_estatisticas(df)
+    
+    # Calcula parâmetros dinâmicos a partir dos dados
+    params = HealthScoreCalculator.calcular_params_dinamicos(df, estatisticas)
+    
+    # Inicializa calculador com parâmetros dinâmicos
+    calc = HealthScoreCalculator(params, estatisticas=estatisticas)
+    
+    progresso('pontuacao')
+    return pontuar_jogadores(df, calc), params
+
+
+COLUNAS_SCORES = ['score_login', 'score_engajamento', 'score_compras', 'score_geral']
+
+
+def calcular_scores(df: pd.DataFrame, calc: HealthScoreCalculator) -> Dict[str, pd.Series]:
+    """Calcula os scores numéricos (COLUNAS_SCORES) de cada jogador"""
     # Calcula scores individuais
-    df['score_login'] = calc.calcular_score_login(df)
-    df['score_engajamento'] = calc.calcular_score_engajamento(df)
-    df['score_compras'] = calc.calcular_score_compras(df)
+    scores = {
+        'score_login': calc.calcular_score_login(df),
+        'score_engajamento': calc.calcular_score_engajamento(df),
+        'score_compras': calc.calcular_score_compras(df),
+    }
     
     # Calcula score geral
-    df['score_geral'] = df.apply(calc.calcular_score_geral, axis=1)
+    scores['score_geral'] = calc.calcular_score_geral(scores)
+    return scores
+
+
+def pontuar_jogadores(df: pd.DataFrame, calc: HealthScoreCalculator,
+                      scores: Dict[str, Any] = None) -> pd.DataFrame:
+    """
+    Adiciona scores, categoria, região, ação sugerida e colunas VIP a um
+    DataFrame já normalizado, usando um calculador com parâmetros globais.
+    Cada linha depende apenas dos parâmetros, então pode ser aplicado por blocos.
+    Aceita scores já calculados (modo paralelo).
+    """
+    if scores is None:
+        scores = calcular_scores(df, calc)
+    
+    for col in COLUNAS_SCORES:
+        df[col] = scores[col]
     
     # Categoriza jogadores
-    df['categoria'] = df.apply(calc.categorizar_jogador, axis=1)
+    df['categoria'] = calc.categorizar_jogadores(df)
     
     # Status de atividade
     df['ativo'] = df['score_login'] >= 50
     
     # Identifica região do jogador
     if 'translation' in df.columns:
-        df['regiao'] = df['translation'].apply(get_regiao)
+        df['regiao'] = calcular_regioes(df['translation'])
     else:
         df['regiao'] = 'int'  # Default: Internacional
     
@@ -762,65 +1132,419 @@ def processar_dados_jogadores(df: pd.DataFrame) -> tuple[pd.DataFrame, Dict]:
         '🎯 Potencial': '📈 Nutrir + Incentivo gradual'
     }
     
-    df['acao_sugerida'] = df['categoria'].map(acoes_crm)
+    df['acao_sugerida'] = df['categoria'].astype(object).map(acoes_crm)
     df['acao_sugerida'] = df['acao_sugerida'].fillna('📊 Acompanhamento geral')
     
-    # Adiciona expectativa e status por VIP
+    # Adiciona expectativa, status e informações de VIP
     if 'nivel_vip' in df.columns:
-        df['vip_expectativa'] = df['nivel_vip'].apply(lambda x: get_expectativa_vip(x)['label'])
-        df['vip_status'] = df.apply(calcular_status_vip, axis=1)
+        for col, valores in calcular_colunas_vip(df).items():
+            df[col] = valores
     
-    # Adiciona informações de VIP
-    if 'nivel_vip' in df.columns:
-        df['vip_nome'] = df['nivel_vip'].apply(lambda x: get_vip_info(int(x) if pd.notna(x) else 0)['nome'])
-        df['vip_cor'] = df['nivel_vip'].apply(lambda x: get_vip_info(int(x) if pd.notna(x) else 0)['cor'])
-        df['vip_icone'] = df['nivel_vip'].apply(lambda x: get_vip_info(int(x) if pd.notna(x) else 0)['icone'])
-    
-    return df, params
+    return df
 
 
-def salvar_snapshot(resumo: Dict, filtros: Dict = None, data_custom: str = None) -> int:
-    """Salva um snapshot do dia no banco de dados"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+# ========== PROCESSAMENTO PARALELO (MULTI-CORE) ==========
+
+# Número de processos do modo paralelo (1 = serial)
+WORKERS_PADRAO = int(os.environ.get('SCORE_WORKERS', 1))
+
+# Contexto dos processos filhos: "fork" copiaria as threads e locks do servidor
+# (jobs, registro, SQLite) em estado indefinido; forkserver/spawn partem de um
+# interpretador limpo. Windows só tem spawn.
+CONTEXTO_PROCESSOS = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+COLUNAS_DATAS = ['lastlogin', 'ultima_compra']
+
+
+def _criar_compartilhado(array: np.ndarray) -> tuple[shared_memory.SharedMemory, tuple]:
+    """Copia um array para memória compartilhada; retorna o bloco e sua descrição"""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    destino = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    destino[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _abrir_compartilhado(descricao: tuple) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    """Abre (sem copiar) um array em memória compartilhada criado pelo processo principal"""
+    nome, formato, dtype = descricao
+    shm = shared_memory.SharedMemory(name=nome)
+    return shm, np.ndarray(formato, dtype=dtype, buffer=shm.buf)
+
+
+def _quadro_compartilhado(entrada: Dict[str, Any], inicio: int, fim: int) -> tuple[list, pd.DataFrame]:
+    """Monta o DataFrame de uma partição a partir das colunas em memória compartilhada"""
+    blocos = []
+    colunas = {}
+    shm, numericos = _abrir_compartilhado(entrada['numericos'])
+    blocos.append(shm)
+    for i, col in enumerate(entrada['colunas_numericas']):
+        colunas[col] = numericos[i, inicio:fim]
+    if entrada['colunas_datas']:
+        shm, datas = _abrir_compartilhado(entrada['datas'])
+        blocos.append(shm)
+        for i, col in enumerate(entrada['colunas_datas']):
+            colunas[col] = datas[i, inicio:fim].view('M8[ns]')
+    df = pd.DataFrame(colunas, index=pd.RangeIndex(inicio, fim))
+    return blocos, df
+
+
+def _fechar_compartilhados(blocos: list):
+    for shm in blocos:
+        shm.close()
+
+
+def _worker_estatisticas(entrada: Dict[str, Any], inicio: int, fim: int) -> AcumuladorEstatisticas:
+    """Worker: momentos parciais de uma partição"""
+    blocos, df = _quadro_compartilhado(entrada, inicio, fim)
+    try:
+        acumulador = AcumuladorEstatisticas(max_valores_sketch=None)
+        acumulador.atualizar(df)
+        return acumulador
+    finally:
+        del df
+        _fechar_compartilhados(blocos)
+
+
+def _worker_scores(entrada: Dict[str, Any], saida: tuple, params: Dict, estatisticas: Dict,
+                   pesos_engajamento: Dict, data_referencia: datetime, inicio: int, fim: int):
+    """Worker: calcula os scores de uma partição e grava direto na saída compartilhada"""
+    blocos, df = _quadro_compartilhado(entrada, inicio, fim)
+    shm_saida, resultado = _abrir_compartilhado(saida)
+    try:
+        calc = HealthScoreCalculator(params, pesos_engajamento, estatisticas, data_referencia)
+        scores = calcular_scores(df, calc)
+        for i, col in enumerate(COLUNAS_SCORES):
+            resultado[i, inicio:fim] = scores[col]
+    finally:
+        del df, resultado
+        _fechar_compartilhados(blocos + [shm_saida])
+
+
+def processar_dados_paralelo(df: pd.DataFrame, workers: int,
+                             progresso: Callable[[str], None] = None) -> tuple[pd.DataFrame, Dict]:
+    """
+    Modo paralelo de processar_dados_jogadores (DataFrame já normalizado):
+    1. Colunas numéricas e datas (convertidas uma vez) vão para memória compartilhada
+    2. Cada worker calcula momentos parciais de partições de TAMANHO_PARTICAO linhas,
+       mesclados em ordem nos parâmetros globais
+    3. Os workers pontuam as partições e gravam os scores na memória compartilhada
+    Categorias, região e colunas VIP são vetorizadas no processo principal.
+    """
+    progresso = progresso or (lambda etapa: None)
+    progresso('parametros')
+    
+    # Colunas usadas pelas estatísticas e pelos scores
+    colunas_numericas = list(dict.fromkeys(
+        list(resolver_colunas_metricas(df.columns).values()) +
+        [config['col'] for config in ATIVIDADES_ENGAJAMENTO.values() if config['col'] in df.columns] +
+        [col for col in ['qtd_compras_7d', 'ticket_medio_7d'] if col in df.columns]
+    ))
+    colunas_datas = [col for col in COLUNAS_DATAS if col in df.columns]
     
-    # Usa data customizada (do arquivo) ou data atual
-    if data_custom:
-        data_snapshot = data_custom
-    else:
-        data_snapshot = datetime.now().strftime("%Y-%m-%d")
+    n = len(df)
+    numericos = np.empty((len(colunas_numericas), n))
+    for i, col in enumerate(colunas_numericas):
+        numericos[i] = df[col].to_numpy(dtype=float, na_value=np.nan)
+    datas = np.empty((len(colunas_datas), n), dtype=np.int64)
+    for i, col in enumerate(colunas_datas):
+        datas[i] = converter_datas(df[col]).to_numpy(dtype='M8[ns]').view(np.int64)
     
-    agora = datetime.now().isoformat()
+    compartilhados = []
+    try:
+        shm, descricao_numericos = _criar_compartilhado(numericos)
+        compartilhados.append(shm)
+        shm, descricao_datas = _criar_compartilhado(datas)
+        compartilhados.append(shm)
+        shm, descricao_saida = _criar_compartilhado(np.zeros((len(COLUNAS_SCORES), n)))
+        compartilhados.append(shm)
+        del numericos, datas
+        
+        entrada = {
+            'numericos': descricao_numericos,
+            'colunas_numericas': colunas_numericas,
+            'datas': descricao_datas,
+            'colunas_datas': colunas_datas,
+        }
+        particoes = [(inicio, min(inicio + TAMANHO_PARTICAO, n)) for inicio in range(0, n, TAMANHO_PARTICAO)]
+        
+        with ProcessPoolExecutor(max_workers=workers, mp_context=CONTEXTO_PROCESSOS) as pool:
+            # Momentos parciais por partição, mesclados na ordem das partições
+            estatisticas_parciais = pool.map(_worker_estatisticas, *zip(*[(entrada, a, b) for a, b in particoes]))
+            acumulador = AcumuladorEstatisticas(max_valores_sketch=None)
+            for parcial in estatisticas_parciais:
+                acumulador.mesclar(parcial)
+            estatisticas = acumulador.resultado()
+            
+            params = HealthScoreCalculator.calcular_params_dinamicos(df, estatisticas)
+            calc = HealthScoreCalculator(params, estatisticas=estatisticas)
+            progresso('pontuacao')
+            
+            # Scores por partição, gravados na saída compartilhada
+            tarefas = [
+                pool.submit(_worker_scores, entrada, descricao_saida, params, estatisticas,
+                            calc.pesos_engajamento, calc.data_referencia, a, b)
+                for a, b in particoes
+            ]
+            for tarefa in tarefas:
+                tarefa.result()
+        
+        saida = np.ndarray((len(COLUNAS_SCORES), n), dtype=np.float64, buffer=compartilhados[2].buf)
+        scores = {col: saida[i].copy() for i, col in enumerate(COLUNAS_SCORES)}
+        del saida
+    finally:
+        for shm in compartilhados:
+            shm.close()
+            shm.unlink()
+    
+    return pontuar_jogadores(df, calc, scores), params
+
+
+# ========== LEITURA DE CSV ==========
+
+AMOSTRA_DETECCAO = 16 * 1024  # Bytes iniciais usados para detectar encoding e delimitador
+ENCODINGS_CSV = ['utf-8', 'cp1252', 'latin-1']  # Ordem de tentativa (latin-1 sempre decodifica)
+
+# Motor do parser rápido: 'c' (padrão) ou 'pyarrow' (se instalado).
+# O pyarrow infere colunas de data como timestamp e devolve None em textos vazios,
+# então só é usado quando pedido explicitamente.
+MOTOR_CSV = os.environ.get('CSV_ENGINE', 'c')
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+
+def detectar_formato_csv(amostra: bytes) -> Dict[str, Optional[str]]:
+    """
+    Detecta encoding, delimitador e colunas a partir dos primeiros bytes de um CSV.
+    O delimitador vem do cabeçalho, como no sep=None do pandas; retorna
+    sep=None quando não for possível detectá-lo.
+    """
+    if amostra.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    elif amostra.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = 'utf-16'
+    else:
+        encoding = ENCODINGS_CSV[-1]
+        for candidato in ENCODINGS_CSV:
+            try:
+                # Decodificador incremental: ignora um caractere cortado no fim da amostra
+                codecs.getincrementaldecoder(candidato)().decode(amostra, final=False)
+                encoding = candidato
+                break
+            except UnicodeDecodeError:
+                continue
     
-    filtros = filtros or {}
-    filtro_regiao = filtros.get('regiao', 'all')
-    filtro_vip = filtros.get('vip', 'all')
+    texto = codecs.getincrementaldecoder(encoding)(errors='replace').decode(amostra, final=False)
+    cabecalho = texto.split('\n', 1)[0]
     
-    # Agrupa as 12 categorias com emojis nas 6 categorias do banco
-    contagem = resumo.get('contagem_por_categoria', {})
+    try:
+        sep = csv.Sniffer().sniff(cabecalho).delimiter if cabecalho.strip() else None
+    except csv.Error:
+        sep = None
     
-    # Mapeamento: 12 novas categorias -> 6 grupos do banco
-    cluster_elite = contagem.get('⭐ Elite', 0) + contagem.get('💰 Oportunidade VIP', 0)
-    cluster_muito_bom = (contagem.get('🏆 VIP Ativo', 0) + contagem.get('📈 Bom', 0) + 
-                         contagem.get('💰 Oportunidade', 0) + contagem.get('🎯 Potencial', 0))
-    cluster_estavel = contagem.get('📊 Estável', 0)
-    cluster_baixo = (contagem.get('⚠️ Atenção', 0) + contagem.get('🚨 Risco Alto', 0) + 
-                     contagem.get('💎 Churn Iminente', 0))
-    cluster_risco_receita = contagem.get('🚨 Risco: Queda Receita', 0)
-    cluster_risco_engajamento = contagem.get('🚨 Risco: Queda Engajamento', 0)
+    colunas = next(csv.reader([cabecalho.rstrip('\r')], delimiter=sep)) if sep else []
     
-    # Insere snapshot principal
-    cursor.execute('''
-        INSERT INTO snapshots (
-            data, data_timestamp, total_jogadores, percentual_ativos,
-            media_score_geral, media_score_login, media_score_engajamento, media_score_compras,
-            cluster_elite, cluster_muito_bom, cluster_estavel, cluster_baixo,
-            cluster_risco_receita, cluster_risco_engajamento,
-            filtro_regiao, filtro_vip
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        data_snapshot, agora,
-        resumo.get('total_jogadores', 0),
+    return {'encoding': encoding, 'sep': sep, 'colunas': colunas}
+
+
+def ler_csv(origem, info: Dict = None, **kwargs):
+    """
+    Lê um CSV (bytes, caminho ou arquivo binário) com o parser mais rápido disponível.
+    Encoding e delimitador são detectados nos primeiros AMOSTRA_DETECCAO bytes;
+    se a detecção ou o parser rápido falharem, usa o engine python com sep=None.
+    Aceita os demais argumentos de pd.read_csv (ex.: chunksize, usecols);
+    um usecols que não seleciona nenhuma coluna do cabeçalho é ignorado.
+    Se info for informado, recebe o motor usado em info['motor'].
+    """
+    info = info if info is not None else {}
+    if isinstance(origem, bytes):
+        amostra = origem[:AMOSTRA_DETECCAO]
+        abrir = lambda: io.BytesIO(origem)
+    elif hasattr(origem, 'read'):
+        # Arquivo já aberto: cada leitura recomeça do início
+        origem.seek(0)
+        amostra = origem.read(AMOSTRA_DETECCAO)
+        abrir = lambda: origem.seek(0) or origem
+    else:
+        with open(origem, 'rb') as f:
+            amostra = f.read(AMOSTRA_DETECCAO)
+        abrir = lambda: origem
+    
+    formato = detectar_formato_csv(amostra)
+    
+    usecols = kwargs.get('usecols')
+    if callable(usecols) and formato['colunas'] and not any(usecols(col) for col in formato['colunas']):
+        kwargs = {k: v for k, v in kwargs.items() if k != 'usecols'}
+    
+    if formato['sep'] is not None:
+        motor = 'pyarrow' if MOTOR_CSV == 'pyarrow' and PYARROW_DISPONIVEL and 'chunksize' not in kwargs else 'c'
+        opcoes = dict(kwargs)
+        if motor == 'pyarrow' and callable(opcoes.get('usecols')):
+            # O pyarrow só aceita usecols como lista
+            opcoes['usecols'] = [col for col in formato['colunas'] if opcoes['usecols'](col)]
+        if motor == 'c' and 'chunksize' not in kwargs:
+            # Infere o tipo de cada coluna no arquivo inteiro, como o engine python
+            opcoes.setdefault('low_memory', False)
+        try:
+            leitor = pd.read_csv(abrir(), sep=formato['sep'], encoding=formato['encoding'],
+                                 engine=motor, **opcoes)
+            info['motor'] = motor
+            if 'chunksize' not in kwargs:
+                return leitor
+            # Lê o primeiro bloco já aqui para que erros de parsing caiam no fallback
+            primeiro = next(leitor, None)
+            return _encadear_blocos(primeiro, leitor)
+        except ValueError as e:
+            print(f"[AVISO] Parser '{motor}' falhou ({e}); usando engine python")
+    
+    info['motor'] = 'python'
+    return pd.read_csv(abrir(), sep=None, encoding=formato['encoding'], engine='python', **kwargs)
+
+
+def _encadear_blocos(primeiro, leitor):
+    """Devolve o primeiro bloco já lido seguido dos demais blocos do leitor"""
+    if primeiro is None:
+        return
+    yield primeiro
+    yield from leitor
+
+
+# ========== LEITURA DE EXCEL ==========
+
+# Motor do Excel: python-calamine (Rust) se instalado; senão openpyxl
+try:
+    import python_calamine  # noqa: F401
+    # engine="calamine" do read_excel existe a partir do pandas 2.2
+    CALAMINE_DISPONIVEL = tuple(int(parte) for parte in pd.__version__.split('.')[:2]) >= (2, 2)
+except ImportError:
+    CALAMINE_DISPONIVEL = False
+
+
+def ler_excel(arquivo, usecols=None, info: Dict = None) -> pd.DataFrame:
+    """
+    Lê a primeira planilha de um Excel (arquivo binário aberto) com o read_excel
+    do pandas: motor calamine se disponível; senão openpyxl (.xlsx) ou o motor
+    padrão (.xls, que o openpyxl não lê).
+    Se info for informado, recebe o motor usado em info['motor'].
+    """
+    info = info if info is not None else {}
+    arquivo.seek(0)
+    
+    if CALAMINE_DISPONIVEL:
+        motor = 'calamine'
+    elif arquivo.read(4) == b'PK\x03\x04':
+        motor = 'openpyxl'
+    else:
+        motor = None
+    info['motor'] = motor or 'padrao'
+    
+    arquivo.seek(0)
+    df = pd.read_excel(arquivo, engine=motor, usecols=usecols)
+    if df.columns.empty and usecols is not None:
+        # Nenhuma coluna do esquema: relê tudo para a validação apontar as ausentes
+        arquivo.seek(0)
+        df = pd.read_excel(arquivo, engine=motor)
+    return df
+
+
+# ========== PROCESSAMENTO EM BLOCOS (ARQUIVOS MAIORES QUE A MEMÓRIA) ==========
+
+TAMANHO_BLOCO_PADRAO = 200_000  # Linhas por bloco no modo streaming
+TAMANHO_BLOCO_MAXIMO = 2_000_000  # Acima disso o bloco deixa de limitar a memória
+
+
+def ler_csv_em_blocos(caminho: str, tamanho_bloco: int = TAMANHO_BLOCO_PADRAO,
+                      colunas_extras: bool = False):
+    """
+    Lê um CSV em blocos de tamanho_bloco linhas, com colunas normalizadas.
+    Lê só as colunas do ESQUEMA_ENTRADA, a menos que colunas_extras seja True.
+    """
+    usecols = None if colunas_extras else coluna_do_esquema
+    for bloco in ler_csv(caminho, chunksize=tamanho_bloco, usecols=usecols):
+        yield normalizar_colunas(bloco)
+
+
+def processar_csv_em_blocos(caminho: str, destino: str,
+                            tamanho_bloco: int = TAMANHO_BLOCO_PADRAO,
+                            colunas_extras: bool = False) -> Dict[str, Any]:
+    """
+    Processa um CSV maior que a memória em duas passagens:
+    1. Lê os blocos e acumula as estatísticas globais (AcumuladorEstatisticas)
+    2. Pontua cada bloco com os parâmetros globais e grava o resultado em destino
+    
+    O pico de memória fica limitado ao tamanho do bloco.
+    Retorna total de jogadores, parâmetros e estatísticas usados.
+    """
+    # Passagem 1: estatísticas globais
+    acumulador = AcumuladorEstatisticas()
+    for bloco in ler_csv_em_blocos(caminho, tamanho_bloco, colunas_extras):
+        acumulador.atualizar(bloco)
+    
+    estatisticas = acumulador.resultado()
+    params = HealthScoreCalculator.calcular_params_dinamicos(pd.DataFrame(), estatisticas)
+    calc = HealthScoreCalculator(params, estatisticas=estatisticas)
+    
+    # Passagem 2: pontua cada bloco e grava em disco
+    total = 0
+    for i, bloco in enumerate(ler_csv_em_blocos(caminho, tamanho_bloco, colunas_extras)):
+        bloco = pontuar_jogadores(bloco, calc)
+        bloco.to_csv(destino, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        total += len(bloco)
+    
+    return {
+        'total_jogadores': total,
+        'params': params,
+        'estatisticas': estatisticas,
+    }
+
+
+def salvar_snapshot(resumo: Dict, filtros: Dict = None, data_custom: str = None) -> int:
+    """Salva um snapshot do dia no banco de dados"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    # Usa data customizada (do arquivo) ou data atual
+    if data_custom:
+        data_snapshot = data_custom
+    else:
+        data_snapshot = datetime.now().strftime("%Y-%m-%d")
+    
+    agora = datetime.now().isoformat()
+    
+    filtros = filtros or {}
+    filtro_regiao = filtros.get('regiao', 'all')
+    filtro_vip = filtros.get('vip', 'all')
+    
+    # Agrupa as 12 categorias com emojis nas 6 categorias do banco
+    contagem = resumo.get('contagem_por_categoria', {})
+    
+    # Mapeamento: 12 novas categorias -> 6 grupos do banco
+    cluster_elite = contagem.get('⭐ Elite', 0) + contagem.get('💰 Oportunidade VIP', 0)
+    cluster_muito_bom = (contagem.get('🏆 VIP Ativo', 0) + contagem.get('📈 Bom', 0) + 
+                         contagem.get('💰 Oportunidade', 0) + contagem.get('🎯 Potencial', 0))
+    cluster_estavel = contagem.get('📊 Estável', 0)
+    cluster_baixo = (contagem.get('⚠️ Atenção', 0) + contagem.get('🚨 Risco Alto', 0) + 
+                     contagem.get('💎 Churn Iminente', 0))
+    cluster_risco_receita = contagem.get('🚨 Risco: Queda Receita', 0)
+    cluster_risco_engajamento = contagem.get('🚨 Risco: Queda Engajamento', 0)
+    
+    # Insere snapshot principal
+    cursor.execute('''
+        INSERT INTO snapshots (
+            data, data_timestamp, total_jogadores, percentual_ativos,
+            media_score_geral, media_score_login, media_score_engajamento, media_score_compras,
+            cluster_elite, cluster_muito_bom, cluster_estavel, cluster_baixo,
+            cluster_risco_receita, cluster_risco_engajamento,
+            filtro_regiao, filtro_vip
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        data_snapshot, agora,
+        resumo.get('total_jogadores', 0),
         resumo.get('percentual_ativos', 0),
         resumo.get('media_pontuacao_geral', 0),
         resumo.get('media_saude_login', 0),
@@ -873,30 +1597,43 @@ def salvar_player_snapshots(df: pd.DataFrame, data_snapshot: str = None, campanh
     
     agora = datetime.now().isoformat()
     
-    # Prepara dados para inserção em lote
-    player_data = []
-    
-    for _, row in df.iterrows():
-        player_data.append((
-            str(row.get('player_id', row.get('pid', ''))),
-            data_snapshot,
-            agora,
-            float(row.get('score_geral', 0)),
-            float(row.get('score_engajamento', 0)),
-            float(row.get('score_compras', 0)),
-            float(row.get('score_login', 0)),
-            int(row.get('qtd_compras_7d', 0) or 0),
-            float(row.get('ticket_medio_7d', 0) or 0),
-            int(row.get('qtd_torneios_3d', 0) or 0),
-            int(row.get('qtd_maratonas_3d', 0) or 0),
-            int(row.get('qtd_missoes_3d', 0) or 0),
-            int(row.get('qtd_promos_3d', 0) or 0),
-            int(row.get('qtd_logins_3d', 0) or 0),
-            str(row.get('categoria', '')),
-            int(row.get('nivel_vip', 1) or 1),
-            str(row.get('regiao', 'int')),
-            campanha_nome
-        ))
+    # Prepara dados para inserção em lote (coluna a coluna, em tipos Python para o sqlite3)
+    def coluna(nome, padrao):
+        return df[nome] if nome in df.columns else pd.Series(padrao, index=df.index)
+    
+    def textos(nome, padrao):
+        return coluna(nome, padrao).astype(str).tolist()
+    
+    def decimais(nome, padrao):
+        return pd.to_numeric(coluna(nome, padrao), errors='coerce').astype(float).tolist()
+    
+    def inteiros(nome, padrao):
+        # Equivale a int(valor or padrao): nulo ou zero usam o padrão
+        valores = pd.to_numeric(coluna(nome, padrao), errors='coerce')
+        return valores.where(valores.notna() & (valores != 0), padrao).astype(np.int64).tolist()
+    
+    ids = textos('player_id', '') if 'player_id' in df.columns else textos('pid', '')
+    
+    player_data = list(zip(
+        ids,
+        repeat(data_snapshot),
+        repeat(agora),
+        decimais('score_geral', 0),
+        decimais('score_engajamento', 0),
+        decimais('score_compras', 0),
+        decimais('score_login', 0),
+        inteiros('qtd_compras_7d', 0),
+        decimais('ticket_medio_7d', 0),
+        inteiros('qtd_torneios_3d', 0),
+        inteiros('qtd_maratonas_3d', 0),
+        inteiros('qtd_missoes_3d', 0),
+        inteiros('qtd_promos_3d', 0),
+        inteiros('qtd_logins_3d', 0),
+        textos('categoria', ''),
+        inteiros('nivel_vip', 1),
+        textos('regiao', 'int'),
+        repeat(campanha_nome)
+    ))
     
     # Insere em lote usando INSERT OR REPLACE para evitar duplicatas
     # Se já existir registro para este player_id + data, atualiza os dados
@@ -1253,205 +1990,1989 @@ def comparar_periodos(data_inicio: str, data_fim: str) -> Dict:
     media_ativos = sum(r[4] for r in rows) / total_dias
     media_score = sum(r[5] for r in rows) / total_dias
     
-    # Tendência (último vs primeiro dia)
-    primeira_data = rows[0]
-    ultima_data = rows[-1]
+    # Tendência (último vs primeiro dia)
+    primeira_data = rows[0]
+    ultima_data = rows[-1]
+    
+    return {
+        'periodo': {'inicio': data_inicio, 'fim': data_fim, 'dias': total_dias},
+        'medias': {
+            'total_jogadores': round(media_jogadores, 0),
+            'percentual_ativos': round(media_ativos, 2),
+            'score_geral': round(media_score, 2),
+        },
+        'tendencia': {
+            'total_jogadores': ultima_data[3] - primeira_data[3],
+            'percentual_ativos': round(ultima_data[4] - primeira_data[4], 2),
+            'score_geral': round(ultima_data[5] - primeira_data[5], 2),
+        },
+        'evolucao_diaria': [
+            {
+                'data': r[1],
+                'total_jogadores': r[3],
+                'percentual_ativos': r[4],
+                'score_geral': r[5],
+            } for r in rows
+        ]
+    }
+
+
+def clean_for_json(obj):
+    """Limpa valores NaN, Infinity para serialização JSON"""
+    if isinstance(obj, dict):
+        return {k: clean_for_json(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [clean_for_json(item) for item in obj]
+    elif isinstance(obj, float):
+        if pd.isna(obj):
+            return 0.0
+        elif np.isinf(obj):
+            return 999999.99 if obj > 0 else -999999.99
+        return round(obj, 2)
+    elif isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj) if not (pd.isna(obj) or np.isinf(obj)) else 0.0
+    else:
+        return obj
+
+
+# Dimensões do cubo de métricas (categoria por último: a distribuição é o nível mais fino)
+DIMENSOES_CUBO = ['regiao', 'nivel_vip', 'categoria']
+
+
+def construir_cubo(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cubo (regiao, nivel_vip, categoria) em uma única passada pelo DataFrame.
+    Cada célula guarda medidas aditivas: jogadores, ativos, soma e contagem de
+    cada score e a primeira linha do grupo. Qualquer recorte é a soma das células.
+    """
+    dimensoes = [coluna for coluna in DIMENSOES_CUBO if coluna in df.columns]
+    medidas = pd.DataFrame({
+        'linha': np.arange(len(df)),
+        'ativo': df['ativo'].to_numpy(),
+        **{coluna: df[coluna].to_numpy() for coluna in COLUNAS_SCORES},
+    })
+    cubo = medidas.groupby([df[coluna].reset_index(drop=True) for coluna in dimensoes],
+                           observed=True, dropna=False, sort=False).agg(
+        jogadores=('linha', 'size'),
+        primeira=('linha', 'min'),
+        ativos=('ativo', 'sum'),
+        **{f'soma_{coluna}': (coluna, 'sum') for coluna in COLUNAS_SCORES},
+        **{f'n_{coluna}': (coluna, 'count') for coluna in COLUNAS_SCORES},
+    )
+    cubo.index.names = dimensoes
+    return cubo
+
+
+def consolidar_cubo(cubo: pd.DataFrame, dimensoes: List[str]) -> pd.DataFrame:
+    """Soma as células do cubo nas dimensões pedidas (roll-up); sem dimensões, uma linha com o total"""
+    if not dimensoes:
+        return cubo.sum().to_frame().T
+    return cubo.groupby(level=dimensoes, observed=True, dropna=False, sort=False).sum()
+
+
+def _medias_cubo(linha: Dict[str, Any]) -> Dict[str, Any]:
+    """Média de cada score a partir de soma/contagem (NaN quando o grupo não tem valores)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {coluna: np.float64(linha[f'soma_{coluna}']) / np.int64(linha[f'n_{coluna}'])
+                for coluna in COLUNAS_SCORES}
+
+
+def _distribuicao_cubo(contagens: Dict[str, Any], quantidade: int) -> Dict[str, Any]:
+    """% de cada categoria, nas chaves de distribuicao_categorias"""
+    return {
+        chave: round(np.int64(contagens.get(categoria, 0)) / quantidade * 100, 2)
+        for chave, categoria in CHAVES_CATEGORIAS.items()
+    }
+
+
+def _contagens_por_grupo(cubo: pd.DataFrame, dimensao: str) -> Dict[Any, Dict[str, Any]]:
+    """Jogadores por categoria dentro de cada valor da dimensão"""
+    contagens: Dict[Any, Dict[str, Any]] = {}
+    for (valor, categoria), quantidade in consolidar_cubo(cubo, [dimensao, 'categoria'])['jogadores'].items():
+        contagens.setdefault(valor, {})[categoria] = quantidade
+    return contagens
+
+
+def _maiores_scores(df: pd.DataFrame, n: int) -> np.ndarray:
+    """
+    Posições dos n maiores score_geral, na ordem do DataFrame.nlargest
+    (que copia o DataFrame inteiro antes de selecionar)
+    """
+    return pd.Series(df['score_geral'].to_numpy()).nlargest(n).index.to_numpy()
+
+
+def _top_por_grupo(df: pd.DataFrame, dimensao: str, n: int = 3) -> Dict[Any, np.ndarray]:
+    """Posições dos n maiores score_geral de cada grupo (mesma ordem e desempate do nlargest)"""
+    scores = pd.Series(df['score_geral'].to_numpy())
+    maiores = scores.groupby(df[dimensao].reset_index(drop=True), observed=True, sort=False).nlargest(n)
+    grupos = maiores.index.get_level_values(0)
+    posicoes = maiores.index.get_level_values(-1).to_numpy()
+    return {valor: posicoes[grupos == valor] for valor in grupos.unique()}
+
+
+def _contagem_categorias(cubo: pd.DataFrame) -> Dict[str, Any]:
+    """Jogadores por categoria na ordem do value_counts (desempate pela primeira aparição)"""
+    por_categoria = consolidar_cubo(cubo, ['categoria'])
+    por_categoria = por_categoria[por_categoria.index.notna()].sort_values('primeira', kind='stable')
+    return pd.Series(por_categoria['jogadores'].to_numpy(),
+                     index=por_categoria.index.astype(object)).sort_values(ascending=False).to_dict()
+
+
+def _coluna_id(df: pd.DataFrame) -> str:
+    """Identifica coluna de ID"""
+    return 'player_id' if 'player_id' in df.columns else df.columns[0]
+
+
+def _secao_principal(df: pd.DataFrame, params: Dict, cubo: pd.DataFrame) -> Dict[str, Any]:
+    """Indicadores gerais, distribuição por categoria, parâmetros e estatísticas (o cabeçalho do dashboard)"""
+    total = len(df)
+    geral = consolidar_cubo(cubo, []).iloc[0].to_dict()
+    ativos = cubo['ativos'].sum()
+    medias = _medias_cubo(geral)
+    contagens = _contagem_categorias(cubo)
+    
+    return {
+        "data": datetime.now().strftime("%d/%m/%Y"),
+        "total_jogadores": total,
+        "percentual_ativos": round(ativos / total * 100, 2) if total > 0 else 0,
+        "media_saude_login": round(medias['score_login'], 2),
+        "media_saude_engajamento": round(medias['score_engajamento'], 2),
+        "media_saude_compras": round(medias['score_compras'], 2),
+        "media_pontuacao_geral": round(medias['score_geral'], 2),
+        "distribuicao_categorias": _distribuicao_cubo(contagens, total) if total > 0 else {
+            chave: 0 for chave in CHAVES_CATEGORIAS
+        },
+        "contagem_por_categoria": contagens,
+        "parametros_calculados": params,
+        "benchmarks": {
+            "torneios_por_dia": round(params.get('torneios_por_dia', 0), 2),
+            "maratonas_por_dia": round(params.get('maratonas_por_dia', 0), 2),
+            "missoes_por_dia": round(params.get('missoes_por_dia', 0), 2),
+            "promos_por_dia": round(params.get('promos_por_dia', 0), 2),
+            "logins_3d": round(params.get('media_logins_3d', 0), 2),
+        },
+        "estatisticas": {
+            # Médias (MÉDIA no Excel)
+            "media_torneios_3d": round(params.get('media_torneios_3d', 0), 2),
+            "media_maratonas_3d": round(params.get('media_maratonas_3d', 0), 2),
+            "media_missoes_3d": round(params.get('media_missoes_3d', 0), 2),
+            "media_promos_3d": round(params.get('media_promos_3d', 0), 2),
+            "media_logins_3d": round(params.get('media_logins_3d', 0), 2),
+            # Desvios Padrão (DESVPAD.P no Excel)
+            "desvpad_torneios_3d": round(params.get('desvpad_torneios_3d', 0), 2),
+            "desvpad_maratonas_3d": round(params.get('desvpad_maratonas_3d', 0), 2),
+            "desvpad_missoes_3d": round(params.get('desvpad_missoes_3d', 0), 2),
+            "desvpad_promos_3d": round(params.get('desvpad_promos_3d', 0), 2),
+            "desvpad_logins_3d": round(params.get('desvpad_logins_3d', 0), 2),
+            # Medianas (MED no Excel)
+            "mediana_torneios_3d": round(params.get('mediana_torneios_3d', 0), 2),
+            "mediana_maratonas_3d": round(params.get('mediana_maratonas_3d', 0), 2),
+            "mediana_missoes_3d": round(params.get('mediana_missoes_3d', 0), 2),
+            "mediana_promos_3d": round(params.get('mediana_promos_3d', 0), 2),
+            "mediana_logins_3d": round(params.get('mediana_logins_3d', 0), 2),
+        }
+    }
+
+
+def _secao_top_jogadores(df: pd.DataFrame, params: Dict, cubo: pd.DataFrame) -> Dict[str, Any]:
+    """Os 10 maiores score_geral"""
+    id_col = _coluna_id(df)
+    return {
+        "top_jogadores": df.iloc[_maiores_scores(df, 10)][[id_col, 
+                                                          'score_login', 'score_engajamento', 
+                                                          'score_compras', 'score_geral', 
+                                                          'categoria', 'acao_sugerida']].to_dict('records')
+    }
+
+
+def _secao_jogadores_risco(df: pd.DataFrame, params: Dict, cubo: pd.DataFrame) -> Dict[str, Any]:
+    """Até 50 jogadores de cada lista de risco"""
+    id_col = _coluna_id(df)
+    contagens = _contagem_categorias(cubo)
+    
+    def jogadores_categoria(categoria: str) -> pd.DataFrame:
+        """Linhas da categoria; sem varrer o DataFrame quando o cubo indica que ela não ocorre"""
+        if contagens.get(categoria, 0) == 0:
+            return df.iloc[:0]
+        return df[df['categoria'] == categoria]
+    
+    return {
+        "jogadores_risco_receita": jogadores_categoria('Risco: Queda em Receita')[[id_col, 
+                                                                          'score_geral', 'score_engajamento', 'score_compras',
+                                                                          'categoria', 'acao_sugerida']].head(50).to_dict('records'),
+        "jogadores_risco_engajamento": jogadores_categoria('Risco: Queda em Engajamento')[[id_col, 
+                                                                          'score_geral', 'score_engajamento', 'score_compras',
+                                                                          'categoria', 'acao_sugerida']].head(50).to_dict('records')
+    }
+
+
+def _secao_regiao(df: pd.DataFrame, params: Dict, cubo: pd.DataFrame) -> Dict[str, Any]:
+    """Análise por região (es, br, int)"""
+    total = len(df)
+    id_col = _coluna_id(df)
+    resumo = {"analise_regiao": {}, "distribuicao_regiao": {}}
+    por_regiao = consolidar_cubo(cubo, ['regiao'])
+    categorias_regiao = _contagens_por_grupo(cubo, 'regiao')
+    top_regiao = _top_por_grupo(df, 'regiao')
+    
+    for regiao in ['es', 'br', 'int']:
+        if regiao not in por_regiao.index:
+            continue
+        linha = por_regiao.loc[regiao].to_dict()
+        quantidade = int(linha['jogadores'])
+        medias_regiao = _medias_cubo(linha)
+        resumo["analise_regiao"][regiao] = {
+            "codigo": regiao,
+            "nome": get_regiao_nome(regiao),
+            "quantidade": quantidade,
+            "percentual": round(quantidade / total * 100, 2),
+            "score_geral_medio": round(medias_regiao['score_geral'], 2),
+            "score_login_medio": round(medias_regiao['score_login'], 2),
+            "score_engajamento_medio": round(medias_regiao['score_engajamento'], 2),
+            "score_compras_medio": round(medias_regiao['score_compras'], 2),
+            "percentual_ativos": round((np.int64(linha['ativos']) / quantidade * 100), 2),
+            "distribuicao_categorias": _distribuicao_cubo(categorias_regiao.get(regiao, {}), quantidade),
+            "top_3": df.iloc[top_regiao[regiao]][[id_col, 'score_geral', 'categoria', 'regiao']].to_dict('records')
+        }
+        resumo["distribuicao_regiao"][regiao] = quantidade
+    
+    return resumo
+
+
+def _secao_vip(df: pd.DataFrame, params: Dict, cubo: pd.DataFrame) -> Dict[str, Any]:
+    """Análise por nível VIP"""
+    total = len(df)
+    id_col = _coluna_id(df)
+    resumo = {"analise_vip": {}, "distribuicao_vip": {}}
+    por_vip = consolidar_cubo(cubo, ['nivel_vip'])
+    categorias_vip = _contagens_por_grupo(cubo, 'nivel_vip')
+    top_vip = _top_por_grupo(df, 'nivel_vip')
+    
+    for nivel in sorted(por_vip.index.dropna()):
+        nivel_int = int(nivel)
+        linha = por_vip.loc[nivel].to_dict()
+        quantidade = int(linha['jogadores'])
+        medias_vip = _medias_cubo(linha)
+        vip_info = get_vip_info(nivel_int)
+        
+        resumo["analise_vip"][f"vip_{nivel_int}"] = {
+            "nivel": nivel_int,
+            "nome": vip_info['nome'],
+            "cor": vip_info['cor'],
+            "icone": vip_info['icone'],
+            "quantidade": quantidade,
+            "percentual": round(quantidade / total * 100, 2),
+            "score_geral_medio": round(medias_vip['score_geral'], 2),
+            "score_login_medio": round(medias_vip['score_login'], 2),
+            "score_engajamento_medio": round(medias_vip['score_engajamento'], 2),
+            "score_compras_medio": round(medias_vip['score_compras'], 2),
+            "percentual_ativos": round((np.int64(linha['ativos']) / quantidade * 100), 2) if quantidade > 0 else 0,
+            "distribuicao_categorias": _distribuicao_cubo(categorias_vip.get(nivel, {}), quantidade),
+            "top_3": df.iloc[top_vip[nivel]][[id_col, 'score_geral', 'categoria']].to_dict('records')
+        }
+        
+        resumo["distribuicao_vip"][vip_info['nome']] = quantidade
+    
+    return resumo
+
+
+# Seções do resumo, na ordem das chaves: nome -> (chaves, coluna exigida, cálculo)
+SECOES_RESUMO: Dict[str, tuple] = {
+    'principal': ([
+        'data', 'total_jogadores', 'percentual_ativos', 'media_saude_login', 'media_saude_engajamento',
+        'media_saude_compras', 'media_pontuacao_geral', 'distribuicao_categorias', 'contagem_por_categoria',
+        'parametros_calculados', 'benchmarks', 'estatisticas',
+    ], None, _secao_principal),
+    'top_jogadores': (['top_jogadores'], None, _secao_top_jogadores),
+    'jogadores_risco': (['jogadores_risco_receita', 'jogadores_risco_engajamento'], None, _secao_jogadores_risco),
+    'regiao': (['analise_regiao', 'distribuicao_regiao'], 'regiao', _secao_regiao),
+    'vip': (['analise_vip', 'distribuicao_vip'], 'nivel_vip', _secao_vip),
+}
+
+
+class ResumoDashboard(Mapping):
+    """
+    Resumo do dashboard de uma versão do dataset, dividido em SECOES_RESUMO.
+    Cada seção é calculada no primeiro acesso a uma de suas chaves e memorizada;
+    lê-se como um dict (resumo['analise_vip'], resumo.get(...), dict(resumo)).
+    calculado: seções já prontas (cache em disco, Arrow), como dict plano.
+    """
+    
+    def __init__(self, df: pd.DataFrame, params: Dict, cubo: pd.DataFrame = None, calculado: Dict = None):
+        self.df = df
+        self.params = params
+        self._cubo = cubo
+        self._lock = threading.Lock()
+        self.nomes = [nome for nome, (_, coluna, _) in SECOES_RESUMO.items() if coluna is None or coluna in df.columns]
+        self._secao_da_chave = {chave: nome for nome in self.nomes for chave in SECOES_RESUMO[nome][0]}
+        self._secoes: Dict[str, Dict[str, Any]] = {}
+        self._regioes: Dict[str, Dict[str, Any]] = {}  # resumo_da_regiao memorizado por região
+        
+        for nome in self.nomes:
+            chaves = SECOES_RESUMO[nome][0]
+            if calculado and all(chave in calculado for chave in chaves):
+                self._secoes[nome] = {chave: calculado[chave] for chave in chaves}
+    
+    @property
+    def cubo(self) -> pd.DataFrame:
+        """Cubo (construir_cubo) de onde saem as seções, montado no primeiro uso"""
+        if self._cubo is None:
+            with self._lock:
+                if self._cubo is None:
+                    self._cubo = construir_cubo(self.df)
+        return self._cubo
+    
+    def secao(self, nome: str) -> Dict[str, Any]:
+        """Chaves da seção, calculadas uma vez (corridas esperam o primeiro cálculo)"""
+        secao = self._secoes.get(nome)
+        if secao is None:
+            cubo = self.cubo
+            with self._lock:
+                secao = self._secoes.get(nome)
+                if secao is None:
+                    secao = self._secoes[nome] = SECOES_RESUMO[nome][2](self.df, self.params, cubo)
+        return secao
+    
+    def secoes(self, nomes: List[str] = None) -> Dict[str, Any]:
+        """Resumo (dict) com as seções pedidas, todas se nomes for None"""
+        resumo = {}
+        for nome in self.nomes:
+            if nomes is None or nome in nomes:
+                resumo.update(self.secao(nome))
+        return resumo
+    
+    def da_regiao(self, regiao: str) -> Dict[str, Any]:
+        """Seções principal e regiao com os indicadores da região (resumo_da_regiao), calculado uma vez por região"""
+        resumo = self._regioes.get(regiao)
+        if resumo is None:
+            base = self.secoes(['principal', 'regiao'])
+            with self._lock:
+                resumo = self._regioes.setdefault(regiao, resumo_da_regiao(base, regiao))
+        return resumo
+    
+    def calculado(self) -> Dict[str, Any]:
+        """Só as seções já calculadas, como dict plano (para persistir sem calcular as demais)"""
+        return {chave: valor for nome in self.nomes for chave, valor in self._secoes.get(nome, {}).items()}
+    
+    def __getitem__(self, chave: str):
+        if chave not in self._secao_da_chave:
+            raise KeyError(chave)
+        return self.secao(self._secao_da_chave[chave])[chave]
+    
+    def __contains__(self, chave) -> bool:
+        return chave in self._secao_da_chave
+    
+    def __iter__(self):
+        return iter(self._secao_da_chave)
+    
+    def __len__(self) -> int:
+        return len(self._secao_da_chave)
+
+
+def gerar_resumo_dashboard(df: pd.DataFrame, params: Dict, cubo: pd.DataFrame = None) -> Dict[str, Any]:
+    """
+    Gera resumo estatístico para o dashboard (todas as seções).
+    Percentuais e médias saem do cubo (regiao, nivel_vip, categoria): uma passada
+    pelo DataFrame em vez de uma máscara por categoria, região e nível VIP.
+    """
+    return ResumoDashboard(df, params, cubo).secoes()
+
+
+# ========== CACHE DE RESULTADOS ==========
+
+# Resultados processados em disco, por hash do arquivo + versão do cálculo.
+# Incrementar VERSAO_SCORE ao mudar scores, categorias ou o resumo.
+VERSAO_SCORE = 1
+CACHE_DIR = os.path.join(BASE_DIR, "cache_resultados")
+CACHE_MAX_MB = int(os.environ.get('CACHE_MAX_MB', 500))
+
+cache_lock = threading.Lock()
+
+
+def chave_cache(hash_arquivo: str, colunas_extras: bool = False, data_referencia: str = None) -> str:
+    """
+    Chave do resultado: hash do conteúdo, dia de referência (AAAA-MM-DD, padrão: hoje),
+    versão do cálculo e opções que mudam o resultado. O dia entra porque a recência
+    de login/compra e resumo['data'] dependem dele: o mesmo arquivo em outro dia é outro resultado.
+    """
+    data_referencia = data_referencia or datetime.now().strftime("%Y-%m-%d")
+    return f"{hash_arquivo}-{data_referencia}-v{VERSAO_SCORE}{'-extras' if colunas_extras else ''}"
+
+
+def existe_cache(chave: str) -> bool:
+    """Indica se o resultado já está gravado no cache"""
+    return os.path.exists(os.path.join(CACHE_DIR, f"{chave}.pkl"))
+
+
+def carregar_cache(chave: str) -> Optional[Dict[str, Any]]:
+    """Carrega um resultado do cache (df, resumo, params) ou None; marca o uso para o LRU"""
+    caminho = os.path.join(CACHE_DIR, f"{chave}.pkl")
+    
+    with cache_lock:
+        if not os.path.exists(caminho):
+            return None
+        os.utime(caminho)
+    
+    try:
+        return pd.read_pickle(caminho)
+    except Exception as e:
+        print(f"[AVISO] Cache inválido ({chave}): {e}")
+        with cache_lock:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        return None
+
+
+def salvar_cache(chave: str, df: pd.DataFrame, resumo: Dict, params: Dict):
+    """Grava um resultado no cache e remove os menos usados acima de CACHE_MAX_MB"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    caminho = os.path.join(CACHE_DIR, f"{chave}.pkl")
+    
+    # Grava em arquivo temporário e renomeia: leitores nunca veem arquivo pela metade
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    if isinstance(resumo, ResumoDashboard):
+        resumo = resumo.calculado()
+    pd.to_pickle({'df': df, 'resumo': resumo, 'params': params}, temporario)
+    
+    with cache_lock:
+        os.replace(temporario, caminho)
+        
+        # LRU: o uso mais recente fica no mtime
+        arquivos = []
+        for nome in os.listdir(CACHE_DIR):
+            if nome.endswith('.pkl'):
+                info = os.stat(os.path.join(CACHE_DIR, nome))
+                arquivos.append((info.st_mtime, info.st_size, nome))
+        arquivos.sort()
+        
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        limite = CACHE_MAX_MB * 1024 * 1024
+        for _, tamanho, nome in arquivos[:-1]:
+            if total <= limite:
+                break
+            os.remove(os.path.join(CACHE_DIR, nome))
+            total -= tamanho
+
+
+# ========== ÍNDICES POR GRUPO ==========
+
+# Montados uma vez por versão do dataset: recortar ou contar região, nível VIP
+# e categoria (e combinações) custa O(tamanho do recorte), sem varrer o df.
+COLUNAS_INDEXADAS = ['regiao', 'nivel_vip', 'categoria']
+
+
+class IndiceGrupos:
+    """
+    Índice de uma coluna: código do grupo de cada linha e, para cada valor,
+    as posições das linhas em ordem crescente (views de um único array).
+    """
+    
+    def __init__(self, serie: pd.Series):
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+        else:
+            try:
+                codigos, valores = pd.factorize(serie, sort=True)
+            except TypeError:
+                codigos, valores = pd.factorize(serie)
+        
+        tipo_posicao = np.int32 if len(serie) < 2 ** 31 else np.int64
+        ordem = np.argsort(codigos, kind='stable').astype(tipo_posicao)
+        limites = np.searchsorted(codigos[ordem], np.arange(len(valores) + 1))
+        
+        self.codigos = codigos
+        self.codigo = {valor: i for i, valor in enumerate(valores)}  # Linhas sem valor têm código -1
+        self.posicoes = {valor: ordem[limites[i]:limites[i + 1]] for i, valor in enumerate(valores)}
+        self.nbytes = codigos.nbytes + ordem.nbytes
+    
+    def linhas(self, valor) -> np.ndarray:
+        """Posições das linhas com o valor (vazio se não existir)"""
+        return self.posicoes.get(valor, np.empty(0, dtype=np.int32))
+
+
+def construir_indices(df: pd.DataFrame) -> Dict[str, IndiceGrupos]:
+    """Índices das COLUNAS_INDEXADAS presentes no df"""
+    return {coluna: IndiceGrupos(df[coluna]) for coluna in COLUNAS_INDEXADAS if coluna in df.columns}
+
+
+def posicoes_grupos(indices: Dict[str, IndiceGrupos], **filtros) -> np.ndarray:
+    """
+    Posições (crescentes) das linhas que atendem a todos os filtros coluna=valor.
+    Parte do menor grupo e confere os demais pelos códigos: O(tamanho do menor grupo).
+    """
+    candidatos = sorted(filtros.items(), key=lambda item: len(indices[item[0]].linhas(item[1])))
+    coluna, valor = candidatos[0]
+    posicoes = indices[coluna].linhas(valor)
+    
+    for coluna, valor in candidatos[1:]:
+        indice = indices[coluna]
+        if valor not in indice.codigo:
+            return posicoes[:0]
+        posicoes = posicoes[indice.codigos[posicoes] == indice.codigo[valor]]
+    
+    return posicoes
+
+
+def resumo_da_regiao(resumo: Dict, regiao: str) -> Dict:
+    """
+    Resumo do dashboard com os indicadores principais da região (usado em /api/regiao
+    via ResumoDashboard.da_regiao); o resumo geral se a região não tiver jogadores
+    """
+    resumo_regiao = resumo.get('analise_regiao', {}).get(regiao)
+    if resumo_regiao is None:
+        return dict(resumo)
+    
+    return {
+        **resumo,
+        'total_jogadores': resumo_regiao['quantidade'],
+        'percentual_ativos': resumo_regiao['percentual_ativos'],
+        'media_saude_login': resumo_regiao['score_login_medio'],
+        'media_saude_engajamento': resumo_regiao['score_engajamento_medio'],
+        'media_saude_compras': resumo_regiao['score_compras_medio'],
+        'media_pontuacao_geral': resumo_regiao['score_geral_medio'],
+        'distribuicao_categorias': resumo_regiao['distribuicao_categorias'],
+        'regiao_atual': regiao,
+        'regiao_nome': resumo_regiao['nome']
+    }
+
+
+# ========== CONSULTA DE SEGMENTOS ==========
+
+# Filtros separados por ';' ou 'and', ex.:
+#   nivel_vip>=3; regiao=es; score_compras<30; categoria in (risco*, churn*)
+# - Categóricas (COLUNAS_INDEXADAS): = e in; categorias sem emoji/acentos e com * como coringa.
+#   Se os valores forem numéricos (nivel_vip), também < <= > >=
+# - Scores (COLUNAS_SCORES): < <= > >= =
+# Categóricas são avaliadas com bitmaps por valor e scores por busca binária em
+# índices ordenados; ambos são montados sob demanda, uma vez por versão do dataset.
+POR_PAGINA_MAX_SEGMENTO = 1000
+CONDICAO_SEGMENTO = re.compile(r'^\s*(\w+?)\s*(<=|>=|<|>|=|\s+in\s+)\s*(.+?)\s*$', re.IGNORECASE)
+COMPARADORES = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal, '=': np.equal}
+
+
+class IndicesSegmento:
+    """
+    Estruturas da consulta de segmentos de uma versão do dataset:
+    - bitmaps (np.packbits) das linhas de cada valor das colunas categóricas
+    - valores ordenados e posições de cada coluna de score
+    Montadas na primeira consulta que precisa delas; corridas só repetem trabalho.
+    """
+    
+    def __init__(self, df: pd.DataFrame, indices: Dict[str, IndiceGrupos]):
+        self.df = df
+        self.indices = indices
+        self.total = len(df)
+        self._bitmaps: Dict[tuple, np.ndarray] = {}
+        self._ordenados: Dict[str, tuple] = {}
+    
+    def bitmap(self, coluna: str, valor) -> np.ndarray:
+        bitmap = self._bitmaps.get((coluna, valor))
+        if bitmap is None:
+            linhas = np.zeros(self.total, dtype=bool)
+            linhas[self.indices[coluna].linhas(valor)] = True
+            bitmap = self._bitmaps[(coluna, valor)] = np.packbits(linhas)
+        return bitmap
+    
+    def ordenado(self, coluna: str) -> tuple[np.ndarray, np.ndarray, int]:
+        """Valores em ordem crescente, posição de cada um e quantos não são NaN (ficam no fim)"""
+        ordenado = self._ordenados.get(coluna)
+        if ordenado is None:
+            valores = self.df[coluna].to_numpy(dtype=float)
+            ordem = np.argsort(valores, kind='stable')
+            ordenado = self._ordenados[coluna] = (
+                valores[ordem], ordem.astype(np.int32 if self.total < 2 ** 31 else np.int64),
+                self.total - int(np.isnan(valores).sum())
+            )
+        return ordenado
+    
+    def ordenar(self, posicoes: np.ndarray, coluna: str, decrescente: bool = False) -> np.ndarray:
+        """Posições do segmento na ordem do score, a partir do índice ordenado (NaN no fim)"""
+        _, ordem, validos = self.ordenado(coluna)
+        no_segmento = np.zeros(self.total, dtype=bool)
+        no_segmento[posicoes] = True
+        
+        com_valor = ordem[:validos][::-1] if decrescente else ordem[:validos]
+        return np.concatenate([com_valor[no_segmento[com_valor]], ordem[validos:][no_segmento[ordem[validos:]]]])
+
+
+def _normalizar_texto(texto) -> str:
+    """Minúsculas, sem acentos, emojis e pontuação ('🚨 Risco: Queda Receita' -> 'risco queda receita')"""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^\w*?]+', ' ', texto).lower().split())
+
+
+def _numero(texto: str) -> float:
+    try:
+        return float(texto)
+    except ValueError:
+        raise ValueError(f"Valor numérico inválido: {texto}") from None
+
+
+def valores_aceitos(coluna: str, categorias: list, operador: str, termos: List[str]) -> set:
+    """
+    Valores da coluna categórica que atendem à condição: comparação numérica se
+    os valores forem números; senão = / in com texto normalizado e coringas
+    """
+    numericas = all(isinstance(categoria, (int, float, np.number)) for categoria in categorias)
+    
+    if numericas:
+        comparador = COMPARADORES['=' if operador == 'in' else operador]
+        numeros = [_numero(termo) for termo in termos]
+        return {c for c in categorias if any(comparador(c, numero) for numero in numeros)}
+    if operador in ('=', 'in'):
+        padroes = [_normalizar_texto(termo) for termo in termos]
+        return {
+            c for c in categorias
+            if any(fnmatch.fnmatchcase(_normalizar_texto(c), padrao) for padrao in padroes)
+        }
+    raise ValueError(f"{coluna} aceita apenas = e in")
+
+
+def interpretar_filtro(filtro: str, indices: Dict[str, IndiceGrupos]) -> tuple[Dict[str, set], Dict[str, list]]:
+    """
+    Converte o filtro em:
+    - categóricas: coluna -> valores aceitos (várias condições na mesma coluna se somam com E)
+    - scores: coluna -> [(operador, número), ...]
+    ValueError com a condição inválida.
+    """
+    categoricas: Dict[str, set] = {}
+    scores: Dict[str, list] = {}
+    
+    for condicao in re.split(r';|\s+and\s+', filtro or '', flags=re.IGNORECASE):
+        if not condicao.strip():
+            continue
+        
+        encontrado = CONDICAO_SEGMENTO.match(condicao)
+        if encontrado is None:
+            raise ValueError(f"Condição inválida: {condicao.strip()}")
+        coluna, operador, valor = encontrado.group(1).lower(), encontrado.group(2).strip().lower(), encontrado.group(3)
+        
+        if coluna in COLUNAS_SCORES:
+            if operador == 'in':
+                raise ValueError(f"{coluna} aceita apenas < <= > >= =")
+            scores.setdefault(coluna, []).append((operador, _numero(valor)))
+            continue
+        
+        if coluna not in indices:
+            colunas = sorted(list(indices) + COLUNAS_SCORES)
+            raise ValueError(f"Coluna não filtrável: {coluna} (use: {', '.join(colunas)})")
+        
+        if operador == 'in':
+            termos = [termo.strip().strip('\'"') for termo in valor.strip().strip('()[]').split(',')]
+        else:
+            termos = [valor.strip().strip('\'"')]
+        aceitos = valores_aceitos(coluna, list(indices[coluna].codigo), operador, termos)
+        
+        categoricas[coluna] = categoricas[coluna] & aceitos if coluna in categoricas else aceitos
+    
+    return categoricas, scores
+
+
+def consultar_segmento(segmentos: IndicesSegmento, categoricas: Dict[str, set],
+                       scores: Dict[str, list]) -> np.ndarray:
+    """
+    Posições (crescentes) das linhas que atendem ao filtro:
+    1. Categóricas: OR dos bitmaps de cada valor aceito, AND entre colunas
+    2. Scores: o intervalo mais seletivo sai do índice ordenado (busca binária);
+       os demais e o bitmap são conferidos só nessas linhas
+    """
+    bitmap = None
+    for coluna, aceitos in categoricas.items():
+        bits = np.zeros((segmentos.total + 7) // 8, dtype=np.uint8)
+        for valor in aceitos:
+            bits |= segmentos.bitmap(coluna, valor)
+        bitmap = bits if bitmap is None else bitmap & bits
+    
+    if not scores:
+        if bitmap is None:
+            return np.arange(segmentos.total)
+        return np.flatnonzero(np.unpackbits(bitmap, count=segmentos.total))
+    
+    intervalos = {}
+    for coluna, condicoes in scores.items():
+        valores, _, validos = segmentos.ordenado(coluna)
+        inicio, fim = 0, validos
+        for operador, numero in condicoes:
+            if operador in ('>', '>=', '='):
+                inicio = max(inicio, int(np.searchsorted(valores[:validos], numero, 'right' if operador == '>' else 'left')))
+            if operador in ('<', '<=', '='):
+                fim = min(fim, int(np.searchsorted(valores[:validos], numero, 'left' if operador == '<' else 'right')))
+        intervalos[coluna] = (inicio, max(inicio, fim))
+    
+    guia = min(intervalos, key=lambda coluna: intervalos[coluna][1] - intervalos[coluna][0])
+    inicio, fim = intervalos[guia]
+    posicoes = np.sort(segmentos.ordenado(guia)[1][inicio:fim])
+    
+    for coluna, condicoes in scores.items():
+        if coluna == guia:
+            continue
+        valores = segmentos.df[coluna].to_numpy(dtype=float)[posicoes]
+        mascara = np.ones(len(posicoes), dtype=bool)
+        for operador, numero in condicoes:
+            mascara &= COMPARADORES[operador](valores, numero)
+        posicoes = posicoes[mascara]
+    
+    if bitmap is not None:
+        posicoes = posicoes[((bitmap[posicoes >> 3] >> (7 - (posicoes & 7))) & 1).astype(bool)]
+    
+    return posicoes
+
+
+def agregar_segmento(df: pd.DataFrame, indices: Dict[str, IndiceGrupos], posicoes: np.ndarray) -> Dict[str, Any]:
+    """Médias, mínimos e máximos dos scores, % de ativos e distribuição por categoria do segmento"""
+    agregados: Dict[str, Any] = {}
+    
+    for coluna in COLUNAS_SCORES:
+        if coluna in df.columns:
+            valores = df[coluna].to_numpy(dtype=float)[posicoes]
+            vazio = len(valores) == 0 or np.isnan(valores).all()
+            agregados[coluna] = {
+                'media': None if vazio else round(float(np.nanmean(valores)), 2),
+                'min': None if vazio else round(float(np.nanmin(valores)), 2),
+                'max': None if vazio else round(float(np.nanmax(valores)), 2)
+            }
+    
+    if 'ativo' in df.columns:
+        ativos = df['ativo'].to_numpy()[posicoes]
+        agregados['percentual_ativos'] = round(float(ativos.mean()) * 100, 2) if len(ativos) else 0.0
+    
+    if 'categoria' in indices:
+        indice = indices['categoria']
+        contagens = np.bincount(indice.codigos[posicoes] + 1, minlength=len(indice.codigo) + 1)[1:]
+        agregados['distribuicao_categorias'] = {
+            str(categoria): int(contagens[codigo]) for categoria, codigo in indice.codigo.items() if contagens[codigo]
+        }
+    
+    return agregados
+
+
+# ========== CUBO DE MÉTRICAS (OLAP) ==========
+
+# Medidas aditivas das células (colunas de construir_cubo)
+MEDIDAS_CUBO = (['jogadores', 'ativos'] + [f'soma_{coluna}' for coluna in COLUNAS_SCORES]
+                + [f'n_{coluna}' for coluna in COLUNAS_SCORES])
+
+# Scores com média no cubo, na ordem de analise_regiao/analise_vip
+SCORES_CUBO = ['score_geral', 'score_login', 'score_engajamento', 'score_compras']
+
+
+class CuboMetricas:
+    """
+    Cubo denso regiao × nivel_vip × categoria × medida, montado uma vez por versão
+    do dataset a partir de construir_cubo. Fatiar e consolidar somam no máximo
+    algumas centenas de células, sem tocar no DataFrame.
+    Linhas sem valor numa dimensão ficam na última coordenada dela (None).
+    """
+    
+    def __init__(self, cubo: pd.DataFrame):
+        self.dimensoes = list(cubo.index.names)
+        chaves = cubo.index.to_frame(index=False)
+        self.valores: Dict[str, list] = {}
+        coordenadas = []
+        
+        for dimensao in self.dimensoes:
+            codigos, valores = pd.factorize(chaves[dimensao], sort=True)
+            self.valores[dimensao] = [_valor_cubo(valor) for valor in valores] + [None]
+            coordenadas.append(np.where(codigos < 0, len(valores), codigos))
+        
+        self.medidas = np.zeros([len(valores) for valores in self.valores.values()] + [len(MEDIDAS_CUBO)])
+        np.add.at(self.medidas, tuple(coordenadas), cubo[MEDIDAS_CUBO].to_numpy(dtype=float))
+        self.total = int(self.medidas[..., 0].sum())
+        self.nbytes = self.medidas.nbytes
+    
+    def consultar(self, filtros: Dict[str, set], agrupar: List[str]) -> tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Métricas do recorte (filtros: dimensão -> valores aceitos) e de cada combinação
+        dos valores das dimensões em agrupar (grupos vazios são omitidos)
+        """
+        selecao = [
+            [i for i, valor in enumerate(self.valores[dimensao]) if dimensao not in filtros or valor in filtros[dimensao]]
+            for dimensao in self.dimensoes
+        ]
+        rotulos = [[self.valores[dimensao][i] for i in indices] for dimensao, indices in zip(self.dimensoes, selecao)]
+        
+        # Soma as dimensões fora de agrupar; categoria (último eixo) fica para a distribuição
+        somar = tuple(i for i, dimensao in enumerate(self.dimensoes[:-1]) if dimensao not in agrupar)
+        recorte = self.medidas[np.ix_(*selecao)].sum(axis=somar)
+        contagens = recorte[..., 0]
+        
+        agrupadas = [i for i, dimensao in enumerate(self.dimensoes) if dimensao in agrupar]
+        if 'categoria' in agrupar:
+            # Cada categoria é um grupo: a distribuição dele é só a própria categoria
+            contagens = contagens[..., None] * np.eye(len(rotulos[-1]))
+        else:
+            recorte = recorte.sum(axis=-2)
+        
+        medidas = recorte.reshape(-1, len(MEDIDAS_CUBO))
+        contagens = contagens.reshape(len(medidas), len(rotulos[-1]))
+        total = self._metricas(medidas.sum(axis=0, keepdims=True), contagens.sum(axis=0, keepdims=True), rotulos[-1])[0]
+        
+        combinacoes = list(itertools.product(*[rotulos[i] for i in agrupadas]))
+        ocupados = np.flatnonzero(medidas[:, 0])
+        nomes = [self.dimensoes[i] for i in agrupadas]
+        grupos = [
+            {**dict(zip(nomes, combinacoes[i])), **metricas}
+            for i, metricas in zip(ocupados.tolist(), self._metricas(medidas[ocupados], contagens[ocupados], rotulos[-1]))
+        ]
+        return total, grupos
+    
+    def _metricas(self, medidas: np.ndarray, contagens: np.ndarray, categorias: list) -> List[Dict[str, Any]]:
+        """
+        Indicadores do dashboard de cada grupo, numa única divisão para todos:
+        medidas (grupo × MEDIDAS_CUBO) e contagens (grupo × categoria)
+        """
+        coluna = {medida: i for i, medida in enumerate(MEDIDAS_CUBO)}
+        jogadores = medidas[:, [coluna['jogadores']]]
+        posicao = {categoria: i for i, categoria in enumerate(categorias)}
+        distribuicao = np.zeros((len(medidas), len(CHAVES_CATEGORIAS)))
+        for j, categoria in enumerate(CHAVES_CATEGORIAS.values()):
+            if categoria in posicao:
+                distribuicao[:, j] = contagens[:, posicao[categoria]]
+        
+        # Colunas: percentual, percentual_ativos, médias dos scores, distribuição
+        numerador = np.hstack([jogadores * 100, medidas[:, [coluna['ativos']]] * 100,
+                               medidas[:, [coluna[f'soma_{score}'] for score in SCORES_CUBO]], distribuicao * 100])
+        denominador = np.hstack([np.full_like(jogadores, self.total), jogadores,
+                                 medidas[:, [coluna[f'n_{score}'] for score in SCORES_CUBO]],
+                                 np.repeat(jogadores, len(CHAVES_CATEGORIAS), axis=1)])
+        fim_medias = 2 + len(SCORES_CUBO)
+        resultado = np.zeros_like(numerador)
+        resultado[:, 2:fim_medias] = np.nan  # Média sem valores: None
+        np.divide(numerador, denominador, out=resultado, where=denominador > 0)
+        
+        return [
+            {
+                "quantidade": int(linha_jogadores),
+                "percentual": linha[0],
+                "percentual_ativos": linha[1],
+                **{f"{score}_medio": (None if media != media else media)
+                   for score, media in zip(SCORES_CUBO, linha[2:fim_medias])},
+                "distribuicao_categorias": dict(zip(CHAVES_CATEGORIAS, linha[fim_medias:])),
+            }
+            for linha_jogadores, linha in zip(jogadores[:, 0].tolist(), np.round(resultado, 2).tolist())
+        ]
+
+
+def _valor_cubo(valor):
+    """Coordenada do cubo como valor JSON (nivel_vip vira int; NaN vira None)"""
+    if pd.isna(valor):
+        return None
+    if isinstance(valor, (float, np.floating)) and float(valor).is_integer():
+        return int(valor)
+    return valor.item() if isinstance(valor, np.generic) else valor
+
+
+# ========== PERSISTÊNCIA DOS DATASETS (ARROW) ==========
+
+# Cada dataset publicado é gravado em Arrow IPC (sem compressão) ao lado do
+# historico.db, com resumo e params nos metadados. Ao reiniciar, o mais recente
+# é aberto via memory-map: as colunas numéricas são usadas direto do arquivo
+# (zero-copy) e só saem do disco quando acessadas. Requer pyarrow.
+DATASETS_DIR = os.path.join(os.path.dirname(DB_PATH), "datasets")
+DATASETS_PERSISTIDOS = int(os.environ.get('DATASETS_PERSISTIDOS', 5))  # Arquivos mantidos em disco
+METADADOS_ARROW = b'health_score'
+
+
+def caminho_arrow(dataset_id: str) -> Optional[str]:
+    """Arquivo Arrow de um dataset (None para IDs fora do formato)"""
+    if not re.fullmatch(r'[0-9a-f]{12}', dataset_id or ''):
+        return None
+    return os.path.join(DATASETS_DIR, f"{dataset_id}.arrow")
+
+
+def _valor_json(valor):
+    """Escalares numpy/pandas nos metadados (json.dumps default)"""
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, (pd.Timestamp, datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def salvar_dataset_arrow(dataset: Dict[str, Any]):
+    """Persiste df, resumo e params do dataset e mantém só os DATASETS_PERSISTIDOS mais recentes"""
+    import pyarrow as pa
+    
+    caminho = caminho_arrow(dataset['dataset_id'])
+    os.makedirs(DATASETS_DIR, exist_ok=True)
+    
+    if os.path.exists(caminho):
+        # Mesmo arquivo de origem, mesmo resultado: só marca como o mais recente
+        os.utime(caminho)
+    else:
+        metadados = json.dumps({
+            'dataset_id': dataset['dataset_id'],
+            'chave': dataset['chave'],
+            'timestamp': dataset['timestamp'].isoformat(),
+            'versao': dataset['versao'],
+            'versao_score': VERSAO_SCORE,
+            'resumo': dataset['resumo'].calculado(),
+            'params': dataset['params']
+        }, default=_valor_json)
+        
+        tabela = pa.Table.from_pandas(dataset['df'], preserve_index=False)
+        tabela = tabela.replace_schema_metadata({**tabela.schema.metadata, METADADOS_ARROW: metadados.encode('utf-8')})
+        
+        # Grava em arquivo temporário e renomeia: quem abre nunca vê arquivo pela metade
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        with pa.OSFile(temporario, 'wb') as destino:
+            with pa.ipc.new_file(destino, tabela.schema) as escritor:
+                escritor.write_table(tabela)
+        os.replace(temporario, caminho)
+    
+    arquivos = sorted(
+        (os.path.getmtime(os.path.join(DATASETS_DIR, nome)), os.path.join(DATASETS_DIR, nome))
+        for nome in os.listdir(DATASETS_DIR) if nome.endswith('.arrow')
+    )
+    for _, antigo in arquivos[:-DATASETS_PERSISTIDOS]:
+        try:
+            os.remove(antigo)
+        except OSError as e:
+            # No Windows, um arquivo mapeado em memória não pode ser removido
+            print(f"[AVISO] Não foi possível remover {antigo}: {e}")
+
+
+def abrir_dataset_arrow(caminho: str) -> Optional[Dict[str, Any]]:
+    """Abre um dataset persistido via memory-map (None se for de outra VERSAO_SCORE)"""
+    import pyarrow as pa
+    
+    tabela = pa.ipc.open_file(pa.memory_map(caminho, 'r')).read_all()
+    metadados = json.loads(tabela.schema.metadata[METADADOS_ARROW])
+    
+    if metadados.get('versao_score') != VERSAO_SCORE:
+        print(f"[AVISO] {caminho} foi gerado por outra versão do cálculo, ignorado")
+        return None
+    
+    return {
+        'dataset_id': metadados['dataset_id'],
+        'chave': metadados['chave'],
+        'timestamp': datetime.fromisoformat(metadados['timestamp']),
+        'versao': metadados.get('versao', 0),
+        # split_blocks: cada coluna numérica sem nulos vira uma view do arquivo mapeado
+        'df': tabela.to_pandas(split_blocks=True),
+        'resumo': metadados['resumo'],
+        'params': metadados['params']
+    }
+
+
+def ultimo_dataset_arrow() -> Optional[str]:
+    """Arquivo do dataset persistido mais recente (None se não houver)"""
+    if not os.path.isdir(DATASETS_DIR):
+        return None
+    
+    arquivos = [os.path.join(DATASETS_DIR, nome) for nome in os.listdir(DATASETS_DIR) if nome.endswith('.arrow')]
+    return max(arquivos, key=os.path.getmtime, default=None)
+
+
+# ========== REGISTRO DE DATASETS ==========
+
+# Vários datasets processados ficam disponíveis ao mesmo tempo (ex.: ontem e hoje),
+# cada um com seu ID. Acima de DATASETS_MAX_MB os menos usados vão para o disco
+# (cache de resultados) e voltam para a memória quando pedidos de novo.
+DATASETS_MAX_MB = int(os.environ.get('DATASETS_MAX_MB', 1024))
+
+
+class RegistroDatasets:
+    """
+    Datasets processados (df, resumo, params) por ID, com LRU em memória.
+    O mais recente publicado é o padrão quando nenhum ID é informado e nunca sai da memória.
+    Com pyarrow, cada dataset também é persistido em Arrow (ver salvar_dataset_arrow).
+    
+    Cada publicação gera um objeto somente leitura com uma versão nova, trocado
+    de uma vez sob o lock: quem já obteve um dataset continua com df, resumo e
+    params da mesma versão, e leitores nunca esperam o processamento de um upload.
+    Junto vão os índices por grupo e o cubo de métricas, montados fora do lock; as seções
+    do resumo (ResumoDashboard) são calculadas no primeiro acesso e ficam com a versão.
+    """
+    
+    def __init__(self, limite_mb: int = DATASETS_MAX_MB):
+        self.limite = limite_mb * 1024 * 1024
+        self.atual: Optional[str] = None
+        self._lock = threading.Lock()
+        self._memoria: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()  # do menos ao mais usado
+        self._info: Dict[str, Dict[str, Any]] = {}  # Metadados de todos os datasets (memória ou disco)
+        self._gravando: Dict[str, Dict[str, Any]] = {}  # Saindo da memória, ainda sem cópia em disco
+        self._ultima_versao = 0
+    
+    def publicar(self, df: pd.DataFrame, resumo: Dict, params: Dict, chave: str = None) -> Dict[str, Any]:
+        """
+        Publica uma nova versão como o dataset atual e a retorna (o mesmo arquivo mantém o mesmo ID).
+        resumo: dict ou ResumoDashboard (seções calculadas sob demanda)
+        """
+        if chave:
+            dataset_id = hashlib.sha256(chave.encode()).hexdigest()[:12]
+        else:
+            dataset_id = uuid.uuid4().hex[:12]
+        
+        novo, tamanho = self._preparar({
+            'dataset_id': dataset_id,
+            'chave': chave or f"dataset-{dataset_id}",
+            'timestamp': datetime.now(),
+            'df': df,
+            'resumo': resumo,
+            'params': params
+        })
+        
+        with self._lock:
+            novo['versao'] = self._nova_versao()
+            self._registrar(novo, tamanho)
+            dataset = self._memoria[dataset_id]
+            self.atual = dataset_id
+            despejados = self._despejar()
+        
+        self._gravar(despejados)
+        
+        if PYARROW_DISPONIVEL:
+            try:
+                salvar_dataset_arrow(dataset)
+            except Exception as e:
+                print(f"[AVISO] Falha ao persistir o dataset {dataset_id}: {e}")
+        
+        self._podar_info()
+        return dataset
+    
+    def restaurar(self) -> Optional[str]:
+        """Abre o último dataset persistido como atual (início do servidor); retorna seu ID"""
+        caminho = ultimo_dataset_arrow() if PYARROW_DISPONIVEL else None
+        if caminho is None:
+            return None
+        
+        try:
+            dataset = abrir_dataset_arrow(caminho)
+        except Exception as e:
+            print(f"[AVISO] Falha ao abrir {caminho}: {e}")
+            return None
+        if dataset is None:
+            return None
+        
+        dataset, tamanho = self._preparar(dataset)
+        with self._lock:
+            self._registrar(dataset, tamanho)
+            self.atual = dataset['dataset_id']
+        return dataset['dataset_id']
+    
+    def obter(self, dataset_id: str = None) -> Optional[Dict[str, Any]]:
+        """Dataset pelo ID (ou o atual), carregando do disco se necessário; None se não existir"""
+        with self._lock:
+            dataset_id = dataset_id or self.atual
+            if dataset_id in self._memoria:
+                self._memoria.move_to_end(dataset_id)
+                return self._memoria[dataset_id]
+            if dataset_id in self._gravando:
+                return self._gravando[dataset_id]
+            info = self._info.get(dataset_id)
+        
+        if dataset_id is None:
+            return None
+        
+        salvo = self._carregar_disco(dataset_id, info)
+        if salvo is not None:
+            salvo, tamanho = self._preparar(salvo)
+        with self._lock:
+            if salvo is None:
+                # Removido do disco pelos limites de DATASETS_PERSISTIDOS / CACHE_MAX_MB
+                self._info.pop(dataset_id, None)
+                return None
+            
+            if dataset_id not in self._memoria:
+                self._registrar(salvo, tamanho)
+            self._memoria.move_to_end(dataset_id)
+            dataset = self._memoria[dataset_id]
+            despejados = self._despejar(manter=dataset_id)
+        
+        self._gravar(despejados)
+        return dataset
+    
+    def obter_por_chave(self, chave: str) -> Optional[Dict[str, Any]]:
+        """Dataset em memória com a chave de cache informada (None se não estiver carregado)"""
+        with self._lock:
+            return next((d for d in self._memoria.values() if d['chave'] == chave), None)
+    
+    def listar(self) -> List[Dict[str, Any]]:
+        """Metadados dos datasets, do mais recente ao mais antigo"""
+        with self._lock:
+            return [
+                {
+                    'dataset_id': dataset_id,
+                    'versao': info['versao'],
+                    'atual': dataset_id == self.atual,
+                    'em_memoria': dataset_id in self._memoria,
+                    'total_jogadores': info['total_jogadores'],
+                    'tamanho_mb': round(info['tamanho'] / 1024 / 1024, 1),
+                    'timestamp': info['timestamp'].isoformat()
+                }
+                for dataset_id, info in sorted(self._info.items(), key=lambda item: item[1]['timestamp'], reverse=True)
+            ]
+    
+    def _nova_versao(self) -> int:
+        """(Com o lock) Versão crescente e única também entre reinícios (microssegundos)"""
+        self._ultima_versao = max(self._ultima_versao + 1, time.time_ns() // 1000)
+        return self._ultima_versao
+    
+    def _preparar(self, dataset: Dict[str, Any]) -> tuple[Dict[str, Any], int]:
+        """
+        Acrescenta índices, consulta de segmentos e cubo de métricas; o resumo vira um
+        ResumoDashboard (seções sob demanda, memorizadas nesta versão). Retorna o dataset e seu tamanho
+        """
+        resumo = dataset['resumo']
+        if not isinstance(resumo, ResumoDashboard):
+            resumo = ResumoDashboard(dataset['df'], dataset['params'], calculado=resumo)
+        
+        indices = construir_indices(dataset['df'])
+        cubo = CuboMetricas(resumo.cubo)
+        tamanho = int(dataset['df'].memory_usage(index=True, deep=True).sum())
+        tamanho += sum(indice.nbytes for indice in indices.values()) + cubo.nbytes
+        
+        return {
+            **dataset,
+            'resumo': resumo,
+            'indices': indices,
+            'segmentos': IndicesSegmento(dataset['df'], indices),
+            'cubo': cubo
+        }, tamanho
+    
+    def _registrar(self, dataset: Dict[str, Any], tamanho: int):
+        """(Com o lock) Coloca o dataset (somente leitura) na memória como o mais recente em uso"""
+        dataset_id = dataset['dataset_id']
+        self._info[dataset_id] = {
+            'chave': dataset['chave'],
+            'versao': dataset['versao'],
+            'timestamp': dataset['timestamp'],
+            'total_jogadores': len(dataset['df']),
+            'tamanho': tamanho
+        }
+        self._memoria[dataset_id] = MappingProxyType(dict(dataset))
+        self._memoria.move_to_end(dataset_id)
+    
+    def _carregar_disco(self, dataset_id: str, info: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Lê o dataset do Arrow persistido ou, sem ele, do cache de resultados"""
+        caminho = caminho_arrow(dataset_id)
+        if PYARROW_DISPONIVEL and caminho and os.path.exists(caminho):
+            try:
+                return abrir_dataset_arrow(caminho)
+            except Exception as e:
+                print(f"[AVISO] Falha ao abrir {caminho}: {e}")
+        
+        if info is None:
+            return None
+        salvo = carregar_cache(info['chave'])
+        if salvo is None:
+            return None
+        return {'dataset_id': dataset_id, 'chave': info['chave'], 'versao': info['versao'],
+                'timestamp': info['timestamp'], **salvo}
+    
+    def _podar_info(self):
+        """
+        Esquece os metadados dos datasets fora da memória cuja cópia em disco já foi
+        removida (limites de DATASETS_PERSISTIDOS / CACHE_MAX_MB): não há mais como carregá-los
+        """
+        with self._lock:
+            fora_da_memoria = {dataset_id: info['chave'] for dataset_id, info in self._info.items()
+                               if dataset_id not in self._memoria and dataset_id not in self._gravando}
+        
+        removidos = []
+        for dataset_id, chave in fora_da_memoria.items():
+            caminho = caminho_arrow(dataset_id)
+            if not (PYARROW_DISPONIVEL and caminho and os.path.exists(caminho)) and not existe_cache(chave):
+                removidos.append(dataset_id)
+        
+        with self._lock:
+            for dataset_id in removidos:
+                # Pode ter voltado à memória enquanto o disco era consultado
+                if dataset_id not in self._memoria and dataset_id not in self._gravando:
+                    self._info.pop(dataset_id, None)
+    
+    def _despejar(self, manter: str = None) -> List[Dict[str, Any]]:
+        """(Com o lock) Retira da memória os menos usados até caber no limite"""
+        total = sum(self._info[dataset_id]['tamanho'] for dataset_id in self._memoria)
+        despejados = []
+        
+        for dataset_id in list(self._memoria):
+            if total <= self.limite:
+                break
+            if dataset_id in (self.atual, manter):
+                continue
+            dataset = self._memoria.pop(dataset_id)
+            self._gravando[dataset_id] = dataset
+            total -= self._info[dataset_id]['tamanho']
+            despejados.append(dataset)
+        
+        return despejados
+    
+    def _gravar(self, despejados: List[Dict[str, Any]]):
+        """Garante a cópia em disco dos datasets retirados da memória (fora do lock)"""
+        for dataset in despejados:
+            try:
+                caminho = caminho_arrow(dataset['dataset_id'])
+                persistido = PYARROW_DISPONIVEL and os.path.exists(caminho)
+                if not persistido and not existe_cache(dataset['chave']):
+                    salvar_cache(dataset['chave'], dataset['df'], dataset['resumo'], dataset['params'])
+                print(f"[INFO] Dataset {dataset['dataset_id']} movido para o disco")
+            except Exception as e:
+                print(f"[AVISO] Falha ao gravar o dataset {dataset['dataset_id']} em disco: {e}")
+            finally:
+                with self._lock:
+                    self._gravando.pop(dataset['dataset_id'], None)
+
+
+registro_datasets = RegistroDatasets()
+
+
+def obter_dataset(dataset_id: str = None,
+                  mensagem: str = "Nenhum dado processado. Faça upload primeiro.") -> Dict[str, Any]:
+    """Dataset pedido pelo endpoint (ou o atual); 404 se não existir"""
+    dataset = registro_datasets.obter(dataset_id)
+    
+    if dataset is None:
+        raise HTTPException(status_code=404, detail=f"Dataset {dataset_id} não encontrado" if dataset_id else mensagem)
+    
+    return dataset
+
+
+def cabecalhos_dataset(dataset: Dict[str, Any]) -> Dict[str, str]:
+    """Cabeçalhos com o ID e a versão do dataset usado na resposta"""
+    return {'X-Dataset-Id': dataset['dataset_id'], 'X-Dataset-Versao': str(dataset['versao'])}
+
+
+@app.on_event("startup")
+def restaurar_dataset_atual():
+    """Serve o último dataset persistido sem precisar de novo upload"""
+    inicio = time.perf_counter()
+    dataset_id = registro_datasets.restaurar()
+    
+    if dataset_id:
+        print(f"[INFO] Dataset {dataset_id} restaurado em {time.perf_counter() - inicio:.2f}s")
+    elif not PYARROW_DISPONIVEL:
+        print("[AVISO] pyarrow não instalado: os datasets não são persistidos entre reinícios")
+
+
+# ========== FILA DE PROCESSAMENTO (JOBS) ==========
+
+# Uploads são processados em threads de fundo; o event loop só recebe o arquivo
+JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+MAX_JOBS_HISTORICO = 50  # Jobs finalizados mantidos para consulta
+ETAPAS_JOB = ['leitura', 'parametros', 'pontuacao', 'resumo']
+
+executor_jobs = ThreadPoolExecutor(max_workers=JOBS_WORKERS, thread_name_prefix='job')
+jobs: Dict[str, Dict[str, Any]] = {}
+jobs_lock = threading.Lock()
+
+
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 1024))  # Limite do /api/upload
+SPOOL_MEMORIA_MB = 16  # Acima disso o upload vai para arquivo temporário em disco
+
+
+async def receber_upload(file: UploadFile, destino, limite_mb: int = None) -> str:
+    """
+    Copia o upload para destino em pedaços de 1 MB, sem carregá-lo inteiro na memória.
+    Retorna o hash SHA-256 do conteúdo; acima de limite_mb responde 413.
+    """
+    hash_arquivo = hashlib.sha256()
+    total = 0
+    
+    while True:
+        pedaco = await file.read(1024 * 1024)
+        if not pedaco:
+            break
+        total += len(pedaco)
+        if limite_mb is not None and total > limite_mb * 1024 * 1024:
+            raise HTTPException(status_code=413, detail=f"Arquivo maior que o limite de {limite_mb} MB")
+        hash_arquivo.update(pedaco)
+        destino.write(pedaco)
+    
+    destino.flush()
+    return hash_arquivo.hexdigest()
+
+
+def abrir_csv_zip(arquivo) -> zipfile.ZipFile:
+    """Abre o único CSV de um .zip (descompressão em streaming)"""
+    pacote = zipfile.ZipFile(arquivo)
+    csvs = [
+        info for info in pacote.infolist()
+        if not info.is_dir() and info.filename.lower().endswith('.csv')
+        and not info.filename.startswith('__MACOSX/')
+    ]
+    if len(csvs) != 1:
+        raise ValueError(f"O .zip deve conter exatamente um CSV (encontrados: {len(csvs)})")
+    return pacote.open(csvs[0])
+
+
+def ler_colunar(arquivo, file_type: str, colunas_extras: bool = False) -> pd.DataFrame:
+    """
+    Lê Parquet ou Feather/Arrow IPC com pyarrow, carregando só as colunas do
+    ESQUEMA_ENTRADA (projeção feita no próprio formato, sem ler as demais).
+    """
+    import pyarrow.feather as feather
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    
+    # Nomes das colunas vêm só dos metadados (rodapé do arquivo)
+    arquivo.seek(0)
+    if file_type == 'parquet':
+        nomes = pq.ParquetFile(arquivo).schema_arrow.names
+    else:
+        nomes = ipc.open_file(arquivo).schema.names
+    
+    colunas = nomes if colunas_extras else [col for col in nomes if coluna_do_esquema(col)]
+    if not colunas:
+        colunas = nomes
+    
+    arquivo.seek(0)
+    if file_type == 'parquet':
+        tabela = pq.read_table(arquivo, columns=colunas)
+    else:
+        tabela = feather.read_table(arquivo, columns=colunas)
+    return tabela.to_pandas()
+
+
+def ler_arquivo_upload(arquivo, file_type: str, colunas_extras: bool = False,
+                       info: Dict = None) -> pd.DataFrame:
+    """
+    Lê um upload (arquivo binário aberto) em um DataFrame: CSV (também .csv.gz
+    ou .zip com um CSV), Excel, Parquet ou Feather/Arrow IPC.
+    Só as colunas do ESQUEMA_ENTRADA são lidas, a menos que colunas_extras seja True
+    (ou que o arquivo não tenha nenhuma delas).
+    Se info for informado, recebe o motor de leitura usado em info['motor'].
+    """
+    info = info if info is not None else {}
+    usecols = None if colunas_extras else coluna_do_esquema
+    
+    if file_type == 'csv':
+        return ler_csv(arquivo, info=info, usecols=usecols)
+    
+    if file_type in ('csv_gz', 'zip'):
+        arquivo.seek(0)
+        descompactado = gzip.GzipFile(fileobj=arquivo, mode='rb') if file_type == 'csv_gz' else abrir_csv_zip(arquivo)
+        with descompactado:
+            return ler_csv(descompactado, info=info, usecols=usecols)
+    
+    if file_type in TIPOS_COLUNARES:
+        info['motor'] = 'pyarrow'
+        return ler_colunar(arquivo, file_type, colunas_extras)
+    
+    return ler_excel(arquivo, usecols, info)
+
+
+def criar_job(arquivo: str, etapas: List[str] = None) -> str:
+    """Registra um novo job pendente (etapas padrão: ETAPAS_JOB) e retorna seu ID"""
+    agora = datetime.now().isoformat()
+    job_id = uuid.uuid4().hex
+    
+    with jobs_lock:
+        jobs[job_id] = {
+            'job_id': job_id,
+            'arquivo': arquivo,
+            'status': 'pendente',
+            'etapa': None,
+            'etapas': {etapa: 'pendente' for etapa in (etapas or ETAPAS_JOB)},
+            'progresso': 0,
+            'criado_em': agora,
+            'atualizado_em': agora,
+            'resultado': None,
+            'erro': None
+        }
+        
+        # Descarta os jobs finalizados mais antigos
+        finalizados = [j for j in jobs.values() if j['status'] in ('concluido', 'erro')]
+        for job in finalizados[:max(0, len(finalizados) - MAX_JOBS_HISTORICO)]:
+            del jobs[job['job_id']]
+    
+    return job_id
+
+
+def marcar_etapa_job(job_id: str, etapa: str, estado: str):
+    """Atualiza o estado de uma etapa ('processando', 'concluido' ou 'erro') e o progresso"""
+    with jobs_lock:
+        job = jobs[job_id]
+        job['etapas'][etapa] = estado
+        if estado == 'processando':
+            job['etapa'] = etapa
+        job['status'] = 'processando'
+        finalizadas = sum(1 for valor in job['etapas'].values() if valor in ('concluido', 'erro'))
+        job['progresso'] = int(100 * finalizadas / len(job['etapas']))
+        job['atualizado_em'] = datetime.now().isoformat()
+
+
+def iniciar_etapa_job(job_id: str, etapa: str):
+    """Marca a etapa atual como concluída e inicia a próxima"""
+    etapa_atual = jobs[job_id]['etapa']
+    if etapa_atual:
+        marcar_etapa_job(job_id, etapa_atual, 'concluido')
+    marcar_etapa_job(job_id, etapa, 'processando')
+
+
+def finalizar_job(job_id: str, resultado: Dict = None, erro: str = None):
+    """Registra o resultado (ou o erro) de um job"""
+    with jobs_lock:
+        job = jobs[job_id]
+        if erro is None:
+            job['etapas'] = {
+                etapa: 'erro' if estado == 'erro' else 'concluido'
+                for etapa, estado in job['etapas'].items()
+            }
+            job['progresso'] = 100
+            job['status'] = 'concluido'
+        else:
+            if job['etapa']:
+                job['etapas'][job['etapa']] = 'erro'
+            job['status'] = 'erro'
+        job['resultado'] = resultado
+        job['erro'] = erro
+        job['atualizado_em'] = datetime.now().isoformat()
+
+
+def consultar_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Retorna uma cópia do estado do job (None se não existir)"""
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return None
+        return {**job, 'etapas': dict(job['etapas'])}
+
+
+def executar_job_upload(job_id: str, arquivo, file_type: str, workers: int = None,
+                        colunas_extras: bool = False, chave: str = None,
+                        data_historico: str = None):
+    """
+    Processa um upload em thread de fundo: leitura, parâmetros, pontuação e o cabeçalho
+    do resumo (seção 'principal'; as demais são calculadas no primeiro acesso).
+    Com chave, reaproveita o resultado do mesmo arquivo já processado (memória ou disco).
+    Com data_historico, grava também o snapshot do dia (etapa 'historico').
+    O arquivo (temporário) é fechado ao final.
+    """
+    try:
+        iniciar_etapa_job(job_id, 'leitura')
+        
+        em_cache = None
+        if chave is not None:
+            em_cache = registro_datasets.obter_por_chave(chave) or carregar_cache(chave)
+        
+        inicio_leitura = time.perf_counter()
+        leitura = {'formato': file_type, 'motor': 'cache'}
+        
+        if em_cache is not None:
+            df_processado, resumo, params = em_cache['df'], em_cache['resumo'], em_cache['params']
+            leitura['segundos'] = round(time.perf_counter() - inicio_leitura, 3)
+        else:
+            df = ler_arquivo_upload(arquivo, file_type, colunas_extras, info=leitura)
+            arquivo.close()
+            leitura['segundos'] = round(time.perf_counter() - inicio_leitura, 3)
+            print(f"[INFO] Leitura ({file_type}, motor {leitura['motor']}): {len(df)} linhas em {leitura['segundos']}s")
+            
+            # Processa dados com parâmetros dinâmicos (sem salvar no histórico ainda)
+            df_processado, params = processar_dados_jogadores(
+                df, workers, progresso=lambda etapa: iniciar_etapa_job(job_id, etapa)
+            )
+            
+            # Gera o cabeçalho do resumo; as demais seções saem sob demanda (/api/dados, /api/resumo)
+            iniciar_etapa_job(job_id, 'resumo')
+            resumo = ResumoDashboard(df_processado, params)
+            resumo.secao('principal')
+            
+            if chave is not None:
+                salvar_cache(chave, df_processado, resumo, params)
+        
+        # Publica como nova versão do dataset atual
+        dataset = registro_datasets.publicar(df_processado, resumo, params, chave)
+        
+        resultado = {
+            "success": True,
+            "dataset_id": dataset['dataset_id'],
+            "versao": dataset['versao'],
+            "message": f"Processados {len(df_processado)} jogadores com parâmetros dinâmicos",
+            "resumo": clean_for_json(dataset['resumo'].secao('principal')),
+            "cache": em_cache is not None,
+            "leitura": leitura
+        }
+        
+        if data_historico is not None:
+            iniciar_etapa_job(job_id, 'historico')
+            resultado['historico'] = {'data': data_historico, **gravar_historico(df_processado, resumo, data_historico)}
+        
+        finalizar_job(job_id, resultado=resultado)
+        
+    except Exception as e:
+        import traceback
+        error_msg = f"Erro ao processar arquivo: {str(e)}"
+        print(f"\n{'='*60}")
+        print(f"ERRO NO UPLOAD (job {job_id}):")
+        print(f"{'='*60}")
+        print(error_msg)
+        print("\nTraceback:")
+        traceback.print_exc()
+        print(f"{'='*60}\n")
+        finalizar_job(job_id, erro=error_msg)
+    finally:
+        arquivo.close()
+
+
+# ========== PROCESSAMENTO EM LOTE (BACKFILL DO HISTÓRICO) ==========
+
+# Snapshots e player_snapshots são gravados por um único escritor por vez
+db_escrita_lock = threading.Lock()
+WORKERS_LOTE = int(os.environ.get('LOTE_WORKERS', os.cpu_count() or 1))
+
+
+def data_do_nome_arquivo(nome: str) -> Optional[str]:
+    """Extrai uma data AAAA-MM-DD (ou AAAAMMDD) do nome do arquivo"""
+    for ano, mes, dia in re.findall(r'(\d{4})-?(\d{2})-?(\d{2})', os.path.basename(nome)):
+        try:
+            return datetime(int(ano), int(mes), int(dia)).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def validar_data(data: str) -> bool:
+    """Indica se a data está no formato AAAA-MM-DD"""
+    try:
+        datetime.strptime(data, "%Y-%m-%d")
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def gravar_historico(df: pd.DataFrame, resumo: Dict, data: str, filtros: Dict = None,
+                     campanha_nome: str = None) -> Dict[str, Any]:
+    """
+    Grava o snapshot do dia e os dados individuais dos jogadores (escritor serializado).
+    Erro nos player_snapshots não desfaz o snapshot geral.
+    """
+    with db_escrita_lock:
+        snapshot_id = salvar_snapshot(resumo, filtros, data)
+        
+        try:
+            total_salvos = salvar_player_snapshots(df, data, campanha_nome)
+            print(f"[INFO] {total_salvos} jogadores salvos para acompanhamento individual (data: {data})")
+        except Exception as e:
+            total_salvos = 0
+            print(f"[WARN] Erro ao salvar player_snapshots: {e}")
+    
+    return {'snapshot_id': snapshot_id, 'jogadores_salvos': total_salvos}
+
+
+def _worker_lote(caminho: str, file_type: str) -> tuple[pd.DataFrame, Dict]:
+    """Lê, pontua e resume um arquivo do lote (executa em processo separado)"""
+    with open(caminho, 'rb') as arquivo:
+        df = ler_arquivo_upload(arquivo, file_type)
+    
+    df_processado, params = processar_dados_jogadores(df, workers=1)
+    # O snapshot do histórico só usa o cabeçalho do resumo
+    return df_processado, ResumoDashboard(df_processado, params).secao('principal')
+
+
+def processar_lote(arquivos: List[Dict[str, str]], workers: int = None, campanha_nome: str = None,
+                   progresso: Callable[[str, str], None] = None) -> List[Dict[str, Any]]:
+    """
+    Processa vários arquivos datados ({'caminho', 'tipo', 'data', 'nome'}) e grava
+    cada dia no histórico:
+    1. Leitura, scores e resumo em paralelo (processos, até workers por vez)
+    2. Cada dia é gravado assim que fica pronto, por um único escritor (gravar_historico)
+    
+    progresso(data, estado) é chamado a cada mudança. Um arquivo com erro não
+    interrompe os demais. Retorna um resultado por arquivo, na ordem recebida.
+    """
+    workers = max(1, min(workers or WORKERS_LOTE, len(arquivos), os.cpu_count() or 1))
+    progresso = progresso or (lambda data, estado: None)
+    resultados = {}
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=CONTEXTO_PROCESSOS) as pool:
+        futuros = {pool.submit(_worker_lote, item['caminho'], item['tipo']): item for item in arquivos}
+        for item in arquivos:
+            progresso(item['data'], 'processando')
+        
+        for futuro in as_completed(futuros):
+            item = futuros[futuro]
+            resultado = {'arquivo': item['nome'], 'data': item['data']}
+            try:
+                df_processado, resumo = futuro.result()
+                gravado = gravar_historico(df_processado, resumo, item['data'], campanha_nome=campanha_nome)
+                resultado.update(total_jogadores=len(df_processado), **gravado)
+                progresso(item['data'], 'concluido')
+            except Exception as e:
+                print(f"[ERRO] Lote: falha em {item['nome']} ({item['data']}): {e}")
+                resultado['erro'] = str(e)
+                progresso(item['data'], 'erro')
+            resultados[item['data']] = resultado
+    
+    return [resultados[item['data']] for item in arquivos]
+
+
+def executar_job_lote(job_id: str, arquivos: List[Dict[str, str]], workers: int = None,
+                      campanha_nome: str = None):
+    """Executa processar_lote em thread de fundo e remove os arquivos temporários"""
+    try:
+        resultados = processar_lote(
+            arquivos, workers, campanha_nome,
+            progresso=lambda data, estado: marcar_etapa_job(job_id, data, estado)
+        )
+        gravados = sum(1 for resultado in resultados if 'erro' not in resultado)
+        finalizar_job(job_id, resultado={
+            "success": gravados == len(resultados),
+            "message": f"{gravados} de {len(resultados)} arquivos gravados no histórico",
+            "arquivos": resultados
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        finalizar_job(job_id, erro=f"Erro no processamento em lote: {str(e)}")
+    finally:
+        for item in arquivos:
+            if os.path.exists(item['caminho']):
+                os.remove(item['caminho'])
+
+
+def main_lote(argv: List[str]) -> int:
+    """
+    Linha de comando do backfill:
+        python app.py lote ARQUIVO[@AAAA-MM-DD] ... [--workers N] [--campanha NOME]
+    Sem @data, a data vem do nome do arquivo (ex.: export_2026-10-01.csv).
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='app.py lote', description='Processa arquivos datados e grava o histórico')
+    parser.add_argument('arquivos', nargs='+', help='ARQUIVO[@AAAA-MM-DD]')
+    parser.add_argument('--workers', type=int, default=None, help='Processos em paralelo (padrão: LOTE_WORKERS)')
+    parser.add_argument('--campanha', default=None, help='Nome da campanha gravado nos player_snapshots')
+    args = parser.parse_args(argv)
+    
+    arquivos = []
+    for entrada in args.arquivos:
+        caminho, _, data = entrada.rpartition('@')
+        if not caminho or not validar_data(data):
+            caminho, data = entrada, data_do_nome_arquivo(entrada)
+        tipo = detectar_tipo_arquivo(caminho)
+        
+        if not os.path.exists(caminho):
+            parser.error(f"Arquivo não encontrado: {caminho}")
+        if tipo == 'unknown':
+            parser.error(f"Formato não suportado: {caminho}")
+        if data is None:
+            parser.error(f"Sem data para {caminho}: use ARQUIVO@AAAA-MM-DD")
+        arquivos.append({'caminho': caminho, 'tipo': tipo, 'data': data, 'nome': os.path.basename(caminho)})
+    
+    if len({item['data'] for item in arquivos}) != len(arquivos):
+        parser.error("Cada data deve aparecer uma única vez no lote")
+    
+    inicio = time.perf_counter()
+    resultados = processar_lote(arquivos, args.workers, args.campanha)
+    
+    print()
+    for resultado in resultados:
+        if 'erro' in resultado:
+            print(f"  ✗ {resultado['data']}  {resultado['arquivo']}: {resultado['erro']}")
+        else:
+            print(f"  ✓ {resultado['data']}  {resultado['arquivo']}: {resultado['total_jogadores']} jogadores "
+                  f"(snapshot {resultado['snapshot_id']})")
+    print(f"\n{len(resultados)} arquivos em {time.perf_counter() - inicio:.1f}s")
     
-    return {
-        'periodo': {'inicio': data_inicio, 'fim': data_fim, 'dias': total_dias},
-        'medias': {
-            'total_jogadores': round(media_jogadores, 0),
-            'percentual_ativos': round(media_ativos, 2),
-            'score_geral': round(media_score, 2),
-        },
-        'tendencia': {
-            'total_jogadores': ultima_data[3] - primeira_data[3],
-            'percentual_ativos': round(ultima_data[4] - primeira_data[4], 2),
-            'score_geral': round(ultima_data[5] - primeira_data[5], 2),
-        },
-        'evolucao_diaria': [
-            {
-                'data': r[1],
-                'total_jogadores': r[3],
-                'percentual_ativos': r[4],
-                'score_geral': r[5],
-            } for r in rows
-        ]
-    }
+    return 1 if any('erro' in resultado for resultado in resultados) else 0
 
 
-def clean_for_json(obj):
-    """Limpa valores NaN, Infinity para serialização JSON"""
-    if isinstance(obj, dict):
-        return {k: clean_for_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [clean_for_json(item) for item in obj]
-    elif isinstance(obj, float):
-        if pd.isna(obj):
-            return 0.0
-        elif np.isinf(obj):
-            return 999999.99 if obj > 0 else -999999.99
-        return round(obj, 2)
-    elif isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj) if not (pd.isna(obj) or np.isinf(obj)) else 0.0
-    else:
-        return obj
+# ========== MONITORAMENTO DE PASTA (INGESTÃO AUTOMÁTICA) ==========
 
+# Pasta onde o CRM deposita a exportação diária (vazio = desativado)
+PASTA_MONITORADA = os.environ.get('PASTA_MONITORADA', '')
+MONITOR_MODO = os.environ.get('MONITOR_MODO', 'auto')  # auto, inotify ou polling
+MONITOR_INTERVALO = float(os.environ.get('MONITOR_INTERVALO', 10))  # Segundos entre varreduras
+SUFIXOS_TEMPORARIOS = ('.tmp', '.part', '.partial', '.crdownload', '.filepart')
 
-def gerar_resumo_dashboard(df: pd.DataFrame, params: Dict) -> Dict[str, Any]:
-    """Gera resumo estatístico para o dashboard"""
-    total = len(df)
-    ativos = df['ativo'].sum()
-    
-    # Identifica coluna de ID
-    id_col = 'player_id' if 'player_id' in df.columns else df.columns[0]
+# inotify via libc (Linux), sem dependências extras; nos demais sistemas usa polling
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+EVENTO_INOTIFY = struct.Struct('iIII')  # wd, mask, cookie, len (seguido do nome)
+
+INOTIFY_DISPONIVEL = False
+if sys.platform.startswith('linux'):
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+        INOTIFY_DISPONIVEL = True
+    except (OSError, AttributeError):
+        print("[AVISO] inotify indisponível, monitoramento de pasta usará polling")
+
+
+def arquivo_ignorado(nome: str) -> bool:
+    """Ocultos, temporários (cópia em andamento) e formatos não suportados não são ingeridos"""
+    return (
+        nome.startswith(('.', '~$'))
+        or nome.lower().endswith(SUFIXOS_TEMPORARIOS)
+        or detectar_tipo_arquivo(nome) == 'unknown'
+    )
+
+
+def arquivo_ja_processado(nome: str, tamanho: int, modificado_em: float) -> bool:
+    """
+    Indica se esta versão do arquivo (nome, tamanho e modificação) já foi ingerida
+    com sucesso. Versões com erro são tentadas de novo no próximo início do servidor.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 1 FROM arquivos_monitorados
+            WHERE nome = ? AND tamanho = ? AND modificado_em = ? AND status = 'concluido'
+        ''', (nome, tamanho, modificado_em))
+        return cursor.fetchone() is not None
+    finally:
+        conn.close()
+
+
+def registrar_arquivo_monitorado(nome: str, tamanho: int, modificado_em: float, hash_arquivo: str,
+                                 data: str, job: Optional[Dict[str, Any]]):
+    """Grava o resultado da ingestão de um arquivo (concluído ou erro)"""
+    historico = ((job or {}).get('resultado') or {}).get('historico') or {}
+    
+    with db_escrita_lock:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO arquivos_monitorados
+                (nome, tamanho, modificado_em, hash, data, status, job_id, snapshot_id, erro, processado_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                nome, tamanho, modificado_em, hash_arquivo, data,
+                job['status'] if job else 'erro',
+                job['job_id'] if job else None,
+                historico.get('snapshot_id'),
+                job['erro'] if job else 'Job não encontrado',
+                datetime.now().isoformat()
+            ))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def listar_arquivos_monitorados(limite: int = 20) -> List[Dict]:
+    """Últimos arquivos ingeridos pelo monitoramento"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT nome, tamanho, data, status, job_id, snapshot_id, erro, processado_em
+            FROM arquivos_monitorados
+            ORDER BY processado_em DESC
+            LIMIT ?
+        ''', (limite,))
+        colunas = [descricao[0] for descricao in cursor.description]
+        return [dict(zip(colunas, linha)) for linha in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+class MonitorPasta:
+    """
+    Observa uma pasta e ingere cada exportação nova pela fila de jobs: leitura,
+    scores, resumo (atualiza o dashboard) e gravação no histórico. A data vem
+    do nome do arquivo (AAAA-MM-DD) ou, sem ela, da data de modificação.
     
-    # Calcula contagem por categoria
-    contagem_categorias = df['categoria'].value_counts()
+    Um arquivo está completo quando:
+    - inotify: o escritor o fechou (IN_CLOSE_WRITE) ou ele foi movido para a pasta (IN_MOVED_TO)
+    - polling: tamanho e modificação não mudaram entre duas varreduras
     
-    resumo = {
-        "data": datetime.now().strftime("%d/%m/%Y"),
-        "total_jogadores": total,
-        "percentual_ativos": round(ativos / total * 100, 2) if total > 0 else 0,
-        "media_saude_login": round(df['score_login'].mean(), 2),
-        "media_saude_engajamento": round(df['score_engajamento'].mean(), 2),
-        "media_saude_compras": round(df['score_compras'].mean(), 2),
-        "media_pontuacao_geral": round(df['score_geral'].mean(), 2),
-        "distribuicao_categorias": {
-            "elite": round((df['categoria'] == '⭐ Elite').sum() / total * 100, 2) if total > 0 else 0,
-            "vip_ativo": round((df['categoria'] == '🏆 VIP Ativo').sum() / total * 100, 2) if total > 0 else 0,
-            "bom": round((df['categoria'] == '📈 Bom').sum() / total * 100, 2) if total > 0 else 0,
-            "estavel": round((df['categoria'] == '📊 Estável').sum() / total * 100, 2) if total > 0 else 0,
-            "atencao": round((df['categoria'] == '⚠️ Atenção').sum() / total * 100, 2) if total > 0 else 0,
-            "risco_alto": round((df['categoria'] == '🚨 Risco Alto').sum() / total * 100, 2) if total > 0 else 0,
-            "risco_receita": round((df['categoria'] == '🚨 Risco: Queda Receita').sum() / total * 100, 2) if total > 0 else 0,
-            "risco_engajamento": round((df['categoria'] == '🚨 Risco: Queda Engajamento').sum() / total * 100, 2) if total > 0 else 0,
-            "churn_iminente": round((df['categoria'] == '💎 Churn Iminente').sum() / total * 100, 2) if total > 0 else 0,
-            "oportunidade_vip": round((df['categoria'] == '💰 Oportunidade VIP').sum() / total * 100, 2) if total > 0 else 0,
-            "oportunidade": round((df['categoria'] == '💰 Oportunidade').sum() / total * 100, 2) if total > 0 else 0,
-            "potencial": round((df['categoria'] == '🎯 Potencial').sum() / total * 100, 2) if total > 0 else 0,
-        },
-        "contagem_por_categoria": contagem_categorias.to_dict(),
-        "parametros_calculados": params,
-        "benchmarks": {
-            "torneios_por_dia": round(params.get('torneios_por_dia', 0), 2),
-            "maratonas_por_dia": round(params.get('maratonas_por_dia', 0), 2),
-            "missoes_por_dia": round(params.get('missoes_por_dia', 0), 2),
-            "promos_por_dia": round(params.get('promos_por_dia', 0), 2),
-            "logins_3d": round(params.get('media_logins_3d', 0), 2),
-        },
-        "estatisticas": {
-            # Médias (MÉDIA no Excel)
-            "media_torneios_3d": round(params.get('media_torneios_3d', 0), 2),
-            "media_maratonas_3d": round(params.get('media_maratonas_3d', 0), 2),
-            "media_missoes_3d": round(params.get('media_missoes_3d', 0), 2),
-            "media_promos_3d": round(params.get('media_promos_3d', 0), 2),
-            "media_logins_3d": round(params.get('media_logins_3d', 0), 2),
-            # Desvios Padrão (DESVPAD.P no Excel)
-            "desvpad_torneios_3d": round(params.get('desvpad_torneios_3d', 0), 2),
-            "desvpad_maratonas_3d": round(params.get('desvpad_maratonas_3d', 0), 2),
-            "desvpad_missoes_3d": round(params.get('desvpad_missoes_3d', 0), 2),
-            "desvpad_promos_3d": round(params.get('desvpad_promos_3d', 0), 2),
-            "desvpad_logins_3d": round(params.get('desvpad_logins_3d', 0), 2),
-            # Medianas (MED no Excel)
-            "mediana_torneios_3d": round(params.get('mediana_torneios_3d', 0), 2),
-            "mediana_maratonas_3d": round(params.get('mediana_maratonas_3d', 0), 2),
-            "mediana_missoes_3d": round(params.get('mediana_missoes_3d', 0), 2),
-            "mediana_promos_3d": round(params.get('mediana_promos_3d', 0), 2),
-            "mediana_logins_3d": round(params.get('mediana_logins_3d', 0), 2),
-        },
-        "top_jogadores": df.nlargest(10, 'score_geral')[[id_col, 
-                                                          'score_login', 'score_engajamento', 
-                                                          'score_compras', 'score_geral', 
-                                                          'categoria', 'acao_sugerida']].to_dict('records'),
-        "jogadores_risco_receita": df[df['categoria'] == 'Risco: Queda em Receita'][[id_col, 
-                                                                          'score_geral', 'score_engajamento', 'score_compras',
-                                                                          'categoria', 'acao_sugerida']].head(50).to_dict('records'),
-        "jogadores_risco_engajamento": df[df['categoria'] == 'Risco: Queda em Engajamento'][[id_col, 
-                                                                          'score_geral', 'score_engajamento', 'score_compras',
-                                                                          'categoria', 'acao_sugerida']].head(50).to_dict('records'),
-    }
+    Cada versão ingerida fica em arquivos_monitorados e não é reprocessada ao reiniciar.
+    """
     
-    # Adiciona análise por região
-    if 'regiao' in df.columns:
-        resumo["analise_regiao"] = {}
-        resumo["distribuicao_regiao"] = {}
-        
-        for regiao in ['es', 'br', 'int']:
-            df_regiao = df[df['regiao'] == regiao]
-            if len(df_regiao) > 0:
-                resumo["analise_regiao"][regiao] = {
-                    "codigo": regiao,
-                    "nome": get_regiao_nome(regiao),
-                    "quantidade": len(df_regiao),
-                    "percentual": round(len(df_regiao) / total * 100, 2),
-                    "score_geral_medio": round(df_regiao['score_geral'].mean(), 2),
-                    "score_login_medio": round(df_regiao['score_login'].mean(), 2),
-                    "score_engajamento_medio": round(df_regiao['score_engajamento'].mean(), 2),
-                    "score_compras_medio": round(df_regiao['score_compras'].mean(), 2),
-                    "percentual_ativos": round((df_regiao['ativo'].sum() / len(df_regiao) * 100), 2),
-                    "distribuicao_categorias": {
-                        "elite": round((df_regiao['categoria'] == '⭐ Elite').sum() / len(df_regiao) * 100, 2),
-                        "vip_ativo": round((df_regiao['categoria'] == '🏆 VIP Ativo').sum() / len(df_regiao) * 100, 2),
-                        "bom": round((df_regiao['categoria'] == '📈 Bom').sum() / len(df_regiao) * 100, 2),
-                        "estavel": round((df_regiao['categoria'] == '📊 Estável').sum() / len(df_regiao) * 100, 2),
-                        "atencao": round((df_regiao['categoria'] == '⚠️ Atenção').sum() / len(df_regiao) * 100, 2),
-                        "risco_alto": round((df_regiao['categoria'] == '🚨 Risco Alto').sum() / len(df_regiao) * 100, 2),
-                        "risco_receita": round((df_regiao['categoria'] == '🚨 Risco: Queda Receita').sum() / len(df_regiao) * 100, 2),
-                        "risco_engajamento": round((df_regiao['categoria'] == '🚨 Risco: Queda Engajamento').sum() / len(df_regiao) * 100, 2),
-                        "churn_iminente": round((df_regiao['categoria'] == '💎 Churn Iminente').sum() / len(df_regiao) * 100, 2),
-                        "oportunidade_vip": round((df_regiao['categoria'] == '💰 Oportunidade VIP').sum() / len(df_regiao) * 100, 2),
-                        "oportunidade": round((df_regiao['categoria'] == '💰 Oportunidade').sum() / len(df_regiao) * 100, 2),
-                        "potencial": round((df_regiao['categoria'] == '🎯 Potencial').sum() / len(df_regiao) * 100, 2),
-                    },
-                    "top_3": df_regiao.nlargest(3, 'score_geral')[[id_col, 'score_geral', 'categoria', 'regiao']].to_dict('records')
-                }
-                resumo["distribuicao_regiao"][regiao] = len(df_regiao)
+    def __init__(self, pasta: str, modo: str = 'auto', intervalo: float = MONITOR_INTERVALO):
+        self.pasta = os.path.abspath(pasta)
+        self.intervalo = intervalo
+        self.modo = 'polling'
+        if modo in ('auto', 'inotify'):
+            if INOTIFY_DISPONIVEL:
+                self.modo = 'inotify'
+            elif modo == 'inotify':
+                print("[AVISO] MONITOR_MODO=inotify sem suporte neste sistema, usando polling")
+        
+        self._parar = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._vistos: Dict[str, tuple] = {}  # nome -> (tamanho, modificação) na última varredura
+        self._registrados = set()  # (nome, tamanho, modificação) já ingeridos
+        self._em_andamento = set()  # nomes com job em execução
+    
+    def iniciar(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        self._thread = threading.Thread(target=self._executar, name='monitor-pasta', daemon=True)
+        self._thread.start()
+        print(f"[INFO] Monitorando pasta {self.pasta} ({self.modo})")
+    
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+    
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            em_andamento = sorted(self._em_andamento)
+        return {
+            'ativo': self._thread is not None and self._thread.is_alive(),
+            'pasta': self.pasta,
+            'modo': self.modo,
+            'intervalo': self.intervalo,
+            'em_andamento': em_andamento
+        }
     
-    # Adiciona análise por nível VIP
-    if 'nivel_vip' in df.columns:
-        resumo["analise_vip"] = {}
-        resumo["distribuicao_vip"] = {}
+    def _executar(self):
+        if self.modo == 'inotify':
+            try:
+                self._loop_inotify()
+                return
+            except OSError as e:
+                print(f"[AVISO] Falha no inotify ({e}), monitoramento passa para polling")
+                self.modo = 'polling'
         
-        for nivel in sorted(df['nivel_vip'].dropna().unique()):
-            nivel_int = int(nivel)
-            df_vip = df[df['nivel_vip'] == nivel]
-            vip_info = get_vip_info(nivel_int)
+        while not self._parar.is_set():
+            self.varrer()
+            self._parar.wait(self.intervalo)
+    
+    def _loop_inotify(self):
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        
+        try:
+            if libc.inotify_add_watch(fd, os.fsencode(self.pasta), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch {self.pasta}')
             
-            resumo["analise_vip"][f"vip_{nivel_int}"] = {
-                "nivel": nivel_int,
-                "nome": vip_info['nome'],
-                "cor": vip_info['cor'],
-                "icone": vip_info['icone'],
-                "quantidade": len(df_vip),
-                "percentual": round(len(df_vip) / total * 100, 2),
-                "score_geral_medio": round(df_vip['score_geral'].mean(), 2),
-                "score_login_medio": round(df_vip['score_login'].mean(), 2),
-                "score_engajamento_medio": round(df_vip['score_engajamento'].mean(), 2),
-                "score_compras_medio": round(df_vip['score_compras'].mean(), 2),
-                "percentual_ativos": round((df_vip['ativo'].sum() / len(df_vip) * 100), 2) if len(df_vip) > 0 else 0,
-                "distribuicao_categorias": {
-                    "elite": round((df_vip['categoria'] == '⭐ Elite').sum() / len(df_vip) * 100, 2),
-                    "vip_ativo": round((df_vip['categoria'] == '🏆 VIP Ativo').sum() / len(df_vip) * 100, 2),
-                    "bom": round((df_vip['categoria'] == '📈 Bom').sum() / len(df_vip) * 100, 2),
-                    "estavel": round((df_vip['categoria'] == '📊 Estável').sum() / len(df_vip) * 100, 2),
-                    "atencao": round((df_vip['categoria'] == '⚠️ Atenção').sum() / len(df_vip) * 100, 2),
-                    "risco_alto": round((df_vip['categoria'] == '🚨 Risco Alto').sum() / len(df_vip) * 100, 2),
-                    "risco_receita": round((df_vip['categoria'] == '🚨 Risco: Queda Receita').sum() / len(df_vip) * 100, 2),
-                    "risco_engajamento": round((df_vip['categoria'] == '🚨 Risco: Queda Engajamento').sum() / len(df_vip) * 100, 2),
-                    "churn_iminente": round((df_vip['categoria'] == '💎 Churn Iminente').sum() / len(df_vip) * 100, 2),
-                    "oportunidade_vip": round((df_vip['categoria'] == '💰 Oportunidade VIP').sum() / len(df_vip) * 100, 2),
-                    "oportunidade": round((df_vip['categoria'] == '💰 Oportunidade').sum() / len(df_vip) * 100, 2),
-                    "potencial": round((df_vip['categoria'] == '🎯 Potencial').sum() / len(df_vip) * 100, 2),
-                },
-                "top_3": df_vip.nlargest(3, 'score_geral')[[id_col, 'score_geral', 'categoria']].to_dict('records')
-            }
+            # Arquivos depositados com o servidor parado: duas varreduras, um intervalo
+            # entre elas, para não pegar uma cópia que ainda está em andamento
+            self.varrer()
+            proxima_varredura = time.monotonic() + self.intervalo
             
-            resumo["distribuicao_vip"][vip_info['nome']] = len(df_vip)
-    
-    return resumo
+            while not self._parar.is_set():
+                if proxima_varredura is not None and time.monotonic() >= proxima_varredura:
+                    self.varrer()
+                    proxima_varredura = None
+                
+                prontos, _, _ = select.select([fd], [], [], 1.0)
+                if not prontos:
+                    continue
+                
+                dados = os.read(fd, 64 * 1024)
+                posicao = 0
+                while posicao < len(dados):
+                    _, mascara, _, tamanho = EVENTO_INOTIFY.unpack_from(dados, posicao)
+                    posicao += EVENTO_INOTIFY.size
+                    nome = os.fsdecode(dados[posicao:posicao + tamanho].rstrip(b'\0'))
+                    posicao += tamanho
+                    
+                    if mascara & IN_Q_OVERFLOW:
+                        # Eventos perdidos: volta a conferir a pasta por varredura
+                        self.varrer()
+                        proxima_varredura = time.monotonic() + self.intervalo
+                    elif nome and not arquivo_ignorado(nome):
+                        try:
+                            info = os.stat(os.path.join(self.pasta, nome))
+                        except FileNotFoundError:
+                            continue
+                        self.ingerir(nome, (info.st_size, info.st_mtime))
+        finally:
+            os.close(fd)
+    
+    def varrer(self):
+        """Ingere os arquivos cujo tamanho e modificação não mudaram desde a varredura anterior"""
+        atuais = {}
+        try:
+            entradas = list(os.scandir(self.pasta))
+        except OSError as e:
+            print(f"[WARN] Monitoramento: não foi possível ler {self.pasta}: {e}")
+            return
+        
+        for entrada in entradas:
+            if arquivo_ignorado(entrada.name):
+                continue
+            try:
+                if not entrada.is_file():
+                    continue
+                info = entrada.stat()
+            except OSError:
+                continue
+            
+            assinatura = (info.st_size, info.st_mtime)
+            atuais[entrada.name] = assinatura
+            if self._vistos.get(entrada.name) == assinatura:
+                self.ingerir(entrada.name, assinatura)
+        
+        self._vistos = atuais
+    
+    def ingerir(self, nome: str, assinatura: tuple):
+        """Enfileira o arquivo (uma vez por versão) para processamento e gravação no histórico"""
+        versao = (nome, *assinatura)
+        with self._lock:
+            if versao in self._registrados or nome in self._em_andamento:
+                return
+            self._em_andamento.add(nome)
+        
+        arquivo = job_id = None
+        try:
+            if arquivo_ja_processado(*versao):
+                with self._lock:
+                    self._registrados.add(versao)
+                    self._em_andamento.discard(nome)
+                return
+            
+            caminho = os.path.join(self.pasta, nome)
+            data = data_do_nome_arquivo(nome) or datetime.fromtimestamp(assinatura[1]).strftime("%Y-%m-%d")
+            
+            arquivo = open(caminho, 'rb')
+            hash_sha256 = hashlib.sha256()
+            for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+                hash_sha256.update(bloco)
+            arquivo.seek(0)
+            hash_arquivo = hash_sha256.hexdigest()
+            
+            job_id = criar_job(nome, etapas=ETAPAS_JOB + ['historico'])
+            futuro = executor_jobs.submit(
+                executar_job_upload, job_id, arquivo, detectar_tipo_arquivo(nome),
+                chave=chave_cache(hash_arquivo), data_historico=data
+            )
+            arquivo = None  # O job fecha o arquivo
+            futuro.add_done_callback(lambda _: self._concluir(versao, hash_arquivo, data, job_id))
+            print(f"[INFO] Monitoramento: {nome} enfileirado (job {job_id}, data {data})")
+        except Exception as e:
+            print(f"[ERRO] Monitoramento: falha ao enfileirar {nome}: {e}")
+            if arquivo is not None:
+                arquivo.close()
+                if job_id is not None:
+                    finalizar_job(job_id, erro=str(e))
+            with self._lock:
+                self._em_andamento.discard(nome)
+    
+    def _concluir(self, versao: tuple, hash_arquivo: str, data: str, job_id: str):
+        job = consultar_job(job_id)
+        try:
+            registrar_arquivo_monitorado(*versao, hash_arquivo, data, job)
+        except Exception as e:
+            print(f"[ERRO] Monitoramento: falha ao registrar {versao[0]}: {e}")
+        
+        with self._lock:
+            self._registrados.add(versao)
+            self._em_andamento.discard(versao[0])
+        print(f"[INFO] Monitoramento: {versao[0]} {job['status'] if job else 'erro'}")
+
+
+monitor_pasta: Optional[MonitorPasta] = None
+
+
+@app.on_event("startup")
+def iniciar_monitor_pasta():
+    """Inicia o monitoramento quando PASTA_MONITORADA está configurada"""
+    global monitor_pasta
+    
+    if PASTA_MONITORADA:
+        monitor_pasta = MonitorPasta(PASTA_MONITORADA, MONITOR_MODO)
+        monitor_pasta.iniciar()
+
+
+@app.on_event("shutdown")
+def parar_monitor_pasta():
+    if monitor_pasta is not None:
+        monitor_pasta.parar()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -1464,83 +3985,247 @@ async def read_root():
     return FileResponse(index_path)
 
 
-@app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Recebe upload de CSV ou Excel e processa os dados com parâmetros dinâmicos"""
-    global cached_data
-    
+@app.post("/api/upload", status_code=202)
+async def upload_file(
+    file: UploadFile = File(...),
+    workers: int = Query(None, ge=1, description="Processos para o modo paralelo (padrão: SCORE_WORKERS, máx.: núcleos da CPU)"),
+    colunas_extras: bool = Query(False, description="Mantém as colunas fora do esquema de entrada")
+):
+    """
+    Recebe upload de CSV ou Excel e enfileira o processamento com parâmetros dinâmicos.
+    Retorna o ID do job imediatamente; acompanhe em /api/jobs/{job_id}.
+    """
     file_type = detectar_tipo_arquivo(file.filename)
     
     if file_type == 'unknown':
-        raise HTTPException(status_code=400, detail="Arquivo deve ser CSV ou Excel (.xlsx/.xls)")
+        raise HTTPException(
+            status_code=400,
+            detail="Arquivo deve ser CSV (.csv, .csv.gz, .zip), Excel (.xlsx/.xls), Parquet ou Feather/Arrow IPC (.feather, .arrow, .ipc)"
+        )
     
+    if file_type in TIPOS_COLUNARES and not PYARROW_DISPONIVEL:
+        raise HTTPException(status_code=400, detail="Parquet/Feather requerem o pacote pyarrow instalado")
+    
+    # Copia o upload para um arquivo temporário (em memória até SPOOL_MEMORIA_MB),
+    # calculando o hash do conteúdo para o cache de resultados
+    arquivo = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORIA_MB * 1024 * 1024)
     try:
-        contents = await file.read()
-        
-        if file_type == 'csv':
-            df = pd.read_csv(io.StringIO(contents.decode('utf-8')), sep=None, engine='python')
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-        
-        # Processa dados com parâmetros dinâmicos (sem salvar no histórico ainda)
-        df_processado, params = processar_dados_jogadores(df)
-        
-        # Gera resumo
-        resumo = gerar_resumo_dashboard(df_processado, params)
-        
-        # Armazena em cache
-        cached_data = {
-            'df': df_processado,
-            'resumo': resumo,
-            'params': params,
-            'timestamp': datetime.now()
-        }
-        
-        # Limpa valores para JSON
-        resumo_clean = clean_for_json(resumo)
+        hash_arquivo = await receber_upload(file, arquivo, MAX_UPLOAD_MB)
+    except BaseException:
+        arquivo.close()
+        raise
+    
+    chave = chave_cache(hash_arquivo, colunas_extras)
+    
+    if workers:
+        workers = min(workers, os.cpu_count() or 1)
+    job_id = criar_job(file.filename)
+    executor_jobs.submit(executar_job_upload, job_id, arquivo, file_type, workers, colunas_extras, chave)
+    
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": "pendente",
+        "message": f"Arquivo {file.filename} recebido, processamento em fila"
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Retorna status, etapa atual, progresso e resultado de um job de upload"""
+    job = consultar_job(job_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    return job
+
+
+@app.get("/api/monitor")
+async def get_monitor():
+    """Status do monitoramento de pasta e últimos arquivos ingeridos"""
+    status = monitor_pasta.status() if monitor_pasta is not None else {'ativo': False, 'pasta': None}
+    
+    return {
+        **status,
+        "arquivos": await run_in_threadpool(listar_arquivos_monitorados)
+    }
+
+
+@app.post("/api/lote", status_code=202)
+async def upload_lote(
+    files: List[UploadFile] = File(...),
+    datas: List[str] = Form(None),
+    workers: int = Query(None, ge=1, description="Processos em paralelo (padrão: LOTE_WORKERS, máx.: núcleos da CPU)"),
+    campanha_nome: str = Query(None, description="Campanha gravada nos player_snapshots")
+):
+    """
+    Backfill do histórico: recebe vários arquivos, cada um com sua data (campo
+    datas, na mesma ordem, ou AAAA-MM-DD no nome do arquivo), processa em
+    paralelo e grava snapshots e player_snapshots. Acompanhe em /api/jobs/{job_id}.
+    """
+    if datas and len(datas) != len(files):
+        raise HTTPException(status_code=400, detail="Informe uma data para cada arquivo")
+    
+    arquivos = []
+    for i, file in enumerate(files):
+        data = datas[i] if datas else data_do_nome_arquivo(file.filename)
+        tipo = detectar_tipo_arquivo(file.filename)
         
-        return {
-            "success": True,
-            "message": f"Processados {len(df)} jogadores com parâmetros dinâmicos",
-            "resumo": resumo_clean
-        }
+        if not data or not validar_data(data):
+            raise HTTPException(status_code=400, detail=f"Data inválida ou ausente para {file.filename} (use AAAA-MM-DD)")
+        if tipo == 'unknown':
+            raise HTTPException(status_code=400, detail=f"Formato não suportado: {file.filename}")
+        if tipo in TIPOS_COLUNARES and not PYARROW_DISPONIVEL:
+            raise HTTPException(status_code=400, detail="Parquet/Feather requerem o pacote pyarrow instalado")
+        arquivos.append({'nome': file.filename, 'tipo': tipo, 'data': data})
+    
+    if len({item['data'] for item in arquivos}) != len(arquivos):
+        raise HTTPException(status_code=400, detail="Cada data deve aparecer uma única vez no lote")
+    
+    # Os workers leem os arquivos do disco
+    try:
+        for file, item in zip(files, arquivos):
+            destino = tempfile.NamedTemporaryFile(suffix=os.path.splitext(file.filename)[1], delete=False)
+            item['caminho'] = destino.name
+            with destino:
+                await receber_upload(file, destino, MAX_UPLOAD_MB)
+    except BaseException:
+        for item in arquivos:
+            if 'caminho' in item and os.path.exists(item['caminho']):
+                os.remove(item['caminho'])
+        raise
+    
+    job_id = criar_job(f"{len(arquivos)} arquivos", etapas=[item['data'] for item in arquivos])
+    executor_jobs.submit(executar_job_lote, job_id, arquivos, workers, campanha_nome)
+    
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": "pendente",
+        "message": f"{len(arquivos)} arquivos recebidos, processamento em fila"
+    }
+
+
+@app.post("/api/upload/grande")
+async def upload_arquivo_grande(
+    file: UploadFile = File(...),
+    tamanho_bloco: int = Query(TAMANHO_BLOCO_PADRAO, ge=1, le=TAMANHO_BLOCO_MAXIMO, description="Linhas por bloco"),
+    colunas_extras: bool = Query(False, description="Mantém as colunas fora do esquema de entrada")
+):
+    """
+    Processa CSVs maiores que a memória em modo streaming (duas passagens por blocos).
+    Retorna o CSV pontuado como download; o resultado não fica em cache.
+    """
+    if detectar_tipo_arquivo(file.filename) != 'csv':
+        raise HTTPException(status_code=400, detail="Modo streaming aceita apenas CSV")
+    
+    # Grava o upload em disco aos pedaços, sem carregar o arquivo inteiro
+    entrada = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+    saida = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+    saida.close()
+    
+    def remover_temporarios():
+        for caminho in (entrada.name, saida.name):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+    
+    try:
+        with entrada:
+            await receber_upload(file, entrada)
         
+        resultado = await run_in_threadpool(processar_csv_em_blocos, entrada.name, saida.name,
+                                            tamanho_bloco, colunas_extras)
     except Exception as e:
+        remover_temporarios()
         import traceback
-        error_msg = f"Erro ao processar arquivo: {str(e)}"
-        print(f"\n{'='*60}")
-        print("ERRO NO UPLOAD:")
-        print(f"{'='*60}")
-        print(error_msg)
-        print("\nTraceback:")
         traceback.print_exc()
-        print(f"{'='*60}\n")
-        raise HTTPException(status_code=500, detail=error_msg)
+        raise HTTPException(status_code=500, detail=f"Erro ao processar arquivo: {str(e)}")
+    
+    print(f"[INFO] Streaming: {resultado['total_jogadores']} jogadores processados em blocos de {tamanho_bloco}")
+    
+    return FileResponse(
+        saida.name,
+        media_type="text/csv",
+        filename="health_score_resultado.csv",
+        headers={"X-Total-Jogadores": str(resultado['total_jogadores'])},
+        background=BackgroundTask(remover_temporarios)
+    )
+
+
+@app.get("/api/datasets")
+async def get_datasets():
+    """Lista os datasets processados disponíveis (o atual é o padrão dos demais endpoints)"""
+    return {
+        "atual": registro_datasets.atual,
+        "datasets": registro_datasets.listar()
+    }
+
+
+def secoes_pedidas(secoes: Optional[str]) -> Optional[List[str]]:
+    """Nomes de SECOES_RESUMO separados por vírgula (None: todas); HTTP 400 se algum não existir"""
+    if not secoes:
+        return None
+    
+    nomes = [nome.strip() for nome in secoes.split(',') if nome.strip()]
+    invalidas = [nome for nome in nomes if nome not in SECOES_RESUMO]
+    if invalidas:
+        raise HTTPException(status_code=400, detail=f"Seção inválida: {', '.join(invalidas)} (use: {', '.join(SECOES_RESUMO)})")
+    return nomes
 
 
 @app.get("/api/dados")
-async def get_dados():
-    """Retorna dados processados em cache"""
-    if not cached_data:
-        raise HTTPException(status_code=404, detail="Nenhum dado processado. Faça upload primeiro.")
+async def get_dados(
+    response: Response,
+    dataset_id: str = Query(None, description="Dataset (padrão: o mais recente)"),
+    secoes: str = Query(None, description="Seções do resumo separadas por vírgula (padrão: todas)")
+):
+    """Retorna dados processados de um dataset"""
+    dataset = obter_dataset(dataset_id)
+    response.headers.update(cabecalhos_dataset(dataset))
+    nomes = secoes_pedidas(secoes)
     
     # Converte DataFrame para dict limpando NaN
-    df = cached_data['df']
+    df = dataset['df']
     dados_dict = df.astype(object).where(pd.notnull(df), None).to_dict('records')
     
     return {
-        "resumo": cached_data['resumo'],
+        "dataset_id": dataset['dataset_id'],
+        "versao": dataset['versao'],
+        "resumo": dataset['resumo'].secoes(nomes),
         "dados_completos": clean_for_json(dados_dict)
     }
 
 
+@app.get("/api/resumo")
+async def get_resumo(
+    response: Response,
+    secoes: str = Query(None, description="Seções separadas por vírgula (padrão: todas), ex.: regiao,vip"),
+    dataset_id: str = Query(None, description="Dataset (padrão: o mais recente)")
+):
+    """
+    Seções do resumo do dashboard, sem os dados dos jogadores. Cada seção é
+    calculada no primeiro pedido e reaproveitada nesta versão do dataset.
+    """
+    dataset = obter_dataset(dataset_id)
+    response.headers.update(cabecalhos_dataset(dataset))
+    nomes = secoes_pedidas(secoes)
+    resumo = dataset['resumo']
+    
+    return {
+        "dataset_id": dataset['dataset_id'],
+        "versao": dataset['versao'],
+        "secoes": [nome for nome in resumo.nomes if nomes is None or nome in nomes],
+        "resumo": clean_for_json(resumo.secoes(nomes))
+    }
+
+
 @app.get("/api/regiao/{regiao}")
-async def get_dados_regiao(regiao: str):
+async def get_dados_regiao(regiao: str, response: Response, dataset_id: str = Query(None, description="Dataset (padrão: o mais recente)")):
     """Retorna dados filtrados por região (es, br, int)"""
-    if not cached_data:
-        raise HTTPException(status_code=404, detail="Nenhum dado processado. Faça upload primeiro.")
-    
-    df = cached_data['df']
+    dataset = obter_dataset(dataset_id)
+    response.headers.update(cabecalhos_dataset(dataset))
+    df = dataset['df']
     
     if 'regiao' not in df.columns:
         raise HTTPException(status_code=400, detail="Dados não possuem informação de região")
@@ -1548,27 +4233,14 @@ async def get_dados_regiao(regiao: str):
     if regiao not in ['es', 'br', 'int']:
         raise HTTPException(status_code=400, detail="Região inválida. Use: es, br, int")
     
-    df_regiao = df[df['regiao'] == regiao]
-    
-    # Recalcula o resumo para esta região
-    from copy import deepcopy
-    resumo_base = deepcopy(cached_data['resumo'])
-    
-    # Substitui com dados da região específica
-    if 'analise_regiao' in resumo_base and regiao in resumo_base['analise_regiao']:
-        resumo_regiao = resumo_base['analise_regiao'][regiao]
-        # Atualiza campos principais
-        resumo_base['total_jogadores'] = resumo_regiao['quantidade']
-        resumo_base['percentual_ativos'] = resumo_regiao['percentual_ativos']
-        resumo_base['media_saude_login'] = resumo_regiao['score_login_medio']
-        resumo_base['media_saude_engajamento'] = resumo_regiao['score_engajamento_medio']
-        resumo_base['media_saude_compras'] = resumo_regiao['score_compras_medio']
-        resumo_base['media_pontuacao_geral'] = resumo_regiao['score_geral_medio']
-        resumo_base['distribuicao_categorias'] = resumo_regiao['distribuicao_categorias']
-        resumo_base['regiao_atual'] = regiao
-        resumo_base['regiao_nome'] = resumo_regiao['nome']
+    df_regiao = df.take(posicoes_grupos(dataset['indices'], regiao=regiao))
+    
+    # Resumo da região (memorizado por região na versão do dataset)
+    resumo_base = dataset['resumo'].da_regiao(regiao)
     
     return {
+        "dataset_id": dataset['dataset_id'],
+        "versao": dataset['versao'],
         "regiao": regiao,
         "nome": get_regiao_nome(regiao),
         "quantidade": len(df_regiao),
@@ -1578,20 +4250,21 @@ async def get_dados_regiao(regiao: str):
 
 
 @app.get("/api/vip/{nivel}")
-async def get_dados_vip(nivel: int):
+async def get_dados_vip(nivel: int, response: Response, dataset_id: str = Query(None, description="Dataset (padrão: o mais recente)")):
     """Retorna dados filtrados por nível VIP"""
-    if not cached_data:
-        raise HTTPException(status_code=404, detail="Nenhum dado processado. Faça upload primeiro.")
-    
-    df = cached_data['df']
+    dataset = obter_dataset(dataset_id)
+    response.headers.update(cabecalhos_dataset(dataset))
+    df = dataset['df']
     
     if 'nivel_vip' not in df.columns:
         raise HTTPException(status_code=400, detail="Dados não possuem informação de nível VIP")
     
-    df_vip = df[df['nivel_vip'] == nivel]
+    df_vip = df.take(posicoes_grupos(dataset['indices'], nivel_vip=nivel))
     vip_info = get_vip_info(nivel)
     
     return {
+        "dataset_id": dataset['dataset_id'],
+        "versao": dataset['versao'],
         "nivel": nivel,
         "nome": vip_info['nome'],
         "cor": vip_info['cor'],
@@ -1601,13 +4274,111 @@ async def get_dados_vip(nivel: int):
     }
 
 
-@app.get("/api/vip")
-async def get_resumo_vip():
-    """Retorna resumo estatístico por nível VIP"""
-    if not cached_data:
-        raise HTTPException(status_code=404, detail="Nenhum dado processado. Faça upload primeiro.")
+@app.get("/api/segmentos")
+async def get_segmento(
+    response: Response,
+    filtro: str = Query("", description="Ex.: nivel_vip>=3; regiao=es; score_compras<30; categoria in (risco*)"),
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(100, ge=1, le=POR_PAGINA_MAX_SEGMENTO),
+    ordenar: str = Query(None, description="Score para ordenar os IDs; prefixo - para decrescente"),
+    dataset_id: str = Query(None, description="Dataset (padrão: o mais recente)")
+):
+    """
+    Consulta de segmento: quantidade, agregados e IDs (paginados) dos jogadores
+    que atendem ao filtro
+    """
+    inicio = time.perf_counter()
+    dataset = obter_dataset(dataset_id)
+    response.headers.update(cabecalhos_dataset(dataset))
+    df = dataset['df']
+    
+    try:
+        categoricas, scores = interpretar_filtro(filtro, dataset['indices'])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    posicoes = consultar_segmento(dataset['segmentos'], categoricas, scores)
+    
+    if ordenar:
+        coluna = ordenar.lstrip('-')
+        if coluna not in COLUNAS_SCORES:
+            raise HTTPException(status_code=400, detail=f"ordenar aceita: {', '.join(COLUNAS_SCORES)}")
+        posicoes = dataset['segmentos'].ordenar(posicoes, coluna, decrescente=ordenar.startswith('-'))
+    
+    pagina_posicoes = posicoes[(pagina - 1) * por_pagina:pagina * por_pagina]
+    
+    return {
+        "dataset_id": dataset['dataset_id'],
+        "versao": dataset['versao'],
+        "filtro": filtro,
+        "quantidade": len(posicoes),
+        "percentual": round(100 * len(posicoes) / len(df), 2) if len(df) else 0.0,
+        "agregados": agregar_segmento(df, dataset['indices'], posicoes),
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "total_paginas": -(-len(posicoes) // por_pagina),
+        "player_ids": df['player_id'].to_numpy()[pagina_posicoes].tolist(),
+        "tempo_ms": round((time.perf_counter() - inicio) * 1000, 2)
+    }
+
+
+@app.get("/api/cubo")
+async def get_cubo(
+    response: Response,
+    agrupar: str = Query("", description="Dimensões separadas por vírgula, ex.: regiao,nivel_vip"),
+    regiao: str = Query(None, description="Valores aceitos, ex.: es,br"),
+    nivel_vip: str = Query(None, description="Valores aceitos, ex.: 3,4,5"),
+    categoria: str = Query(None, description="Valores aceitos, sem emoji/acentos e com * como coringa, ex.: risco*"),
+    dataset_id: str = Query(None, description="Dataset (padrão: o mais recente)")
+):
+    """
+    Métricas do dashboard (médias dos scores, % ativos, distribuição por categoria)
+    para qualquer recorte regiao × nivel_vip × categoria, consolidadas do cubo
+    materializado no upload, sem varrer os jogadores
+    """
+    inicio = time.perf_counter()
+    dataset = obter_dataset(dataset_id)
+    response.headers.update(cabecalhos_dataset(dataset))
+    cubo = dataset['cubo']
+    
+    dimensoes = [dimensao.strip() for dimensao in agrupar.split(',') if dimensao.strip()]
+    invalidas = [dimensao for dimensao in dimensoes if dimensao not in cubo.dimensoes]
+    if invalidas:
+        raise HTTPException(status_code=400, detail=f"Dimensão inválida: {', '.join(invalidas)} (use: {', '.join(cubo.dimensoes)})")
+    
+    filtros = {}
+    for dimensao, valor in [('regiao', regiao), ('nivel_vip', nivel_vip), ('categoria', categoria)]:
+        if valor is None:
+            continue
+        if dimensao not in cubo.dimensoes:
+            raise HTTPException(status_code=400, detail=f"Dados não possuem {dimensao}")
+        termos = [termo.strip() for termo in valor.split(',') if termo.strip()]
+        try:
+            filtros[dimensao] = valores_aceitos(
+                dimensao, [v for v in cubo.valores[dimensao] if v is not None], 'in', termos
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
-    resumo = cached_data['resumo']
+    total, grupos = cubo.consultar(filtros, dimensoes)
+    
+    return {
+        "dataset_id": dataset['dataset_id'],
+        "versao": dataset['versao'],
+        "agrupar": dimensoes,
+        "filtros": {dimensao: sorted(aceitos, key=str) for dimensao, aceitos in filtros.items()},
+        "total": total,
+        "grupos": grupos,
+        "tempo_ms": round((time.perf_counter() - inicio) * 1000, 3)
+    }
+
+
+@app.get("/api/vip")
+async def get_resumo_vip(response: Response, dataset_id: str = Query(None, description="Dataset (padrão: o mais recente)")):
+    """Retorna resumo estatístico por nível VIP (ID e versão do dataset nos cabeçalhos)"""
+    dataset = obter_dataset(dataset_id)
+    response.headers.update(cabecalhos_dataset(dataset))
+    resumo = dataset['resumo']
     
     if 'analise_vip' not in resumo:
         raise HTTPException(status_code=400, detail="Dados não possuem análise por VIP")
@@ -1616,12 +4387,10 @@ async def get_resumo_vip():
 
 
 @app.get("/api/export/csv")
-async def export_csv():
+async def export_csv(dataset_id: str = Query(None, description="Dataset (padrão: o mais recente)")):
     """Exporta dados processados como CSV"""
-    if not cached_data:
-        raise HTTPException(status_code=404, detail="Nenhum dado para exportar")
-    
-    df = cached_data['df']
+    dataset = obter_dataset(dataset_id, "Nenhum dado para exportar")
+    df = dataset['df']
     output = io.StringIO()
     df.to_csv(output, index=False, encoding='utf-8-sig')
     output.seek(0)
@@ -1629,19 +4398,20 @@ async def export_csv():
     return StreamingResponse(
         io.BytesIO(output.getvalue().encode('utf-8-sig')),
         media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=health_score_resultado.csv"}
+        headers={
+            "Content-Disposition": "attachment; filename=health_score_resultado.csv",
+            **cabecalhos_dataset(dataset)
+        }
     )
 
 
 @app.get("/api/export/excel")
-async def export_excel():
+async def export_excel(dataset_id: str = Query(None, description="Dataset (padrão: o mais recente)")):
     """Exporta dados processados como Excel com parâmetros dinâmicos"""
-    if not cached_data:
-        raise HTTPException(status_code=404, detail="Nenhum dado para exportar")
-    
-    df = cached_data['df']
-    resumo = cached_data['resumo']
-    params = cached_data['params']
+    dataset = obter_dataset(dataset_id, "Nenhum dado para exportar")
+    df = dataset['df']
+    resumo = dataset['resumo']
+    params = dataset['params']
     
     output = io.BytesIO()
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
@@ -1739,7 +4509,10 @@ async def export_excel():
     return StreamingResponse(
         output,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=health_score_resultado.xlsx"}
+        headers={
+            "Content-Disposition": "attachment; filename=health_score_resultado.xlsx",
+            **cabecalhos_dataset(dataset)
+        }
     )
 
 
@@ -1747,12 +4520,10 @@ async def export_excel():
 
 @app.post("/api/historico/salvar")
 async def salvar_historico(request: Dict[str, Any]):
-    """Salva o estado atual como snapshot do dia e dados individuais dos jogadores"""
-    if not cached_data:
-        raise HTTPException(status_code=404, detail="Nenhum dado processado. Faça upload primeiro.")
-    
-    resumo = cached_data['resumo']
-    df = cached_data['df']  # DataFrame completo com dados dos jogadores
+    """Salva um dataset (padrão: o atual) como snapshot do dia e dados individuais dos jogadores"""
+    dataset = obter_dataset(request.get('dataset_id'))
+    resumo = dataset['resumo']
+    df = dataset['df']  # DataFrame completo com dados dos jogadores
     filtros = request.get('filtros', {})
     data_custom = request.get('data')  # Data no formato YYYY-MM-DD
     
@@ -1765,21 +4536,15 @@ async def salvar_historico(request: Dict[str, Any]):
     print(f"[DEBUG] Data recebida do frontend: {data_custom}")
     print(f"[DEBUG] Data usada para salvar: {data_usar}")
     
-    # Salva snapshot geral
-    snapshot_id = salvar_snapshot(resumo, filtros, data_usar)
-    
-    # Salva dados individuais de cada jogador com a mesma data
-    try:
-        total_salvos = salvar_player_snapshots(df, data_usar)
-        print(f"[INFO] {total_salvos} jogadores salvos para acompanhamento individual (data: {data_usar})")
-    except Exception as e:
-        print(f"[WARN] Erro ao salvar player_snapshots: {e}")
-        # Não falha o snapshot se der erro ao salvar jogadores individuais
+    # Salva snapshot geral e dados individuais de cada jogador com a mesma data
+    gravado = await run_in_threadpool(gravar_historico, df, resumo, data_usar, filtros)
     
     return {
         "success": True,
         "message": "Dados do dia salvos com sucesso",
-        "snapshot_id": snapshot_id,
+        "snapshot_id": gravado['snapshot_id'],
+        "dataset_id": dataset['dataset_id'],
+        "versao": dataset['versao'],
         "data": data_usar
     }
 
@@ -2185,22 +4950,26 @@ async def generate_sample():
     df_processado, params = processar_dados_jogadores(sample_data)
     resumo = gerar_resumo_dashboard(df_processado, params)
     
-    # Atualiza cache
-    cached_data = {
-        'df': df_processado,
-        'resumo': resumo,
-        'params': params,
-        'timestamp': datetime.now()
-    }
+    # Publica como nova versão do dataset atual
+    dataset = registro_datasets.publicar(df_processado, resumo, params)
     
     return {
         "success": True,
+        "dataset_id": dataset['dataset_id'],
+        "versao": dataset['versao'],
         "message": "Dados de exemplo gerados com parâmetros dinâmicos",
         "resumo": resumo
     }
 
 
 if __name__ == "__main__":
+    # Necessário para o modo paralelo no executável (PyInstaller)
+    multiprocessing.freeze_support()
+    
+    # Backfill pela linha de comando: python app.py lote ARQUIVO[@AAAA-MM-DD] ...
+    if len(sys.argv) > 1 and sys.argv[1] == 'lote':
+        sys.exit(main_lote(sys.argv[2:]))
+    
     # Porta dinâmica para deploy (Render, Railway, etc)
     port = int(os.environ.get("PORT", 8080))
     host = os.environ.get("HOST", "127.0.0.1")
@@ -0,0 +1,85 @@
+"""
+Benchmark de leitura de CSV do Health Score Dashboard
+Compara o engine python (sep=None), usado antes, com o leitor rápido (ler_csv)
+em exportações sintéticas do CRM de 50 mil e 500 mil jogadores.
+
+Uso: python benchmark_csv.py [linhas ...]
+"""
+
+import io
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import app
+
+TAMANHOS_PADRAO = [50_000, 500_000]
+REPETICOES = 3
+
+
+def gerar_exportacao_crm(n: int, seed: int = 42) -> bytes:
+    """Gera um CSV (;) no formato das exportações do CRM, com colunas extras"""
+    rng = np.random.default_rng(seed)
+    hoje = datetime.now()
+    dias_login = rng.exponential(5, n).astype(int)
+    dias_compra = rng.exponential(10, n).astype(int)
+
+    df = pd.DataFrame({
+        'pid': [f'PLAYER_{i:07d}' for i in range(n)],
+        'nivel_vip': rng.choice([1, 2, 3, 4, 5], n, p=[0.3, 0.3, 0.2, 0.15, 0.05]),
+        'lastLogin': [(hoje - timedelta(days=int(d))).strftime('%Y-%m-%d') for d in dias_login],
+        'translation': rng.choice(['pt_BR', 'es_AR', 'es_MX', 'en_US', 'fr_FR'], n),
+        'qtd_logins_3d': rng.poisson(2, n),
+        'qtd_compras_7d': rng.poisson(1, n),
+        'qtd_torneios_3d': rng.poisson(15, n),
+        'qtd_maratonas_3d': rng.poisson(5, n),
+        'qtd_missoes_3d': rng.poisson(8, n),
+        'qtd_promos_3d': rng.poisson(6, n),
+        'ticket_medio_7d': rng.exponential(30, n).round(2),
+        'ultima_compra': [(hoje - timedelta(days=int(d))).strftime('%Y-%m-%d') for d in dias_compra],
+        # Colunas do CRM que o score não usa
+        'email': [f'jogador{i}@exemplo.com' for i in range(n)],
+        'pais': rng.choice(['BR', 'AR', 'MX', 'US', 'FR'], n),
+        'saldo': rng.exponential(100, n).round(2),
+        'data_cadastro': [(hoje - timedelta(days=int(d))).strftime('%Y-%m-%d') for d in rng.integers(0, 2000, n)],
+    })
+    return df.to_csv(index=False, sep=';').encode('utf-8')
+
+
+def cronometrar(funcao) -> float:
+    """Melhor tempo (s) entre REPETICOES execuções"""
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    tamanhos = [int(arg) for arg in sys.argv[1:]] or TAMANHOS_PADRAO
+
+    leitores = {
+        'python (sep=None)': lambda b: pd.read_csv(io.StringIO(b.decode('utf-8')), sep=None, engine='python'),
+        'ler_csv (c)': app.ler_csv,
+    }
+    if app.PYARROW_DISPONIVEL:
+        leitores['pyarrow'] = lambda b: pd.read_csv(io.BytesIO(b), sep=';', engine='pyarrow')
+
+    for n in tamanhos:
+        conteudo = gerar_exportacao_crm(n)
+        print(f"\n{n:,} linhas ({len(conteudo) / 1024 / 1024:.1f} MB)")
+        print("-" * 45)
+
+        base = None
+        for nome, leitor in leitores.items():
+            tempo = cronometrar(lambda: leitor(conteudo))
+            base = base or tempo
+            print(f"{nome:<20} {tempo:8.3f}s  {base / tempo:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
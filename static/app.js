@@ -14,6 +14,7 @@ let cachedResumo = null;
 let cachedResumoAtual = null;  // Resumo da região atual
 let cachedDataCompleto = null;
 let cachedDadosAtual = null;   // Dados da região atual
+let datasetAtual = null;       // ID do dataset exibido (dados, exportações e histórico)
 let regiaoAtual = 'all';  // 'all', 'es', 'br', 'int'
 let vipAtual = 'all';     // 'all', '1', '2', '3', '4', '5'
 
@@ -413,6 +414,44 @@ function showLoading() {
     showElement('loading');
 }
 
+const ETAPAS_JOB = {
+    leitura: 'Lendo arquivo',
+    parametros: 'Calculando parâmetros',
+    pontuacao: 'Calculando scores',
+    resumo: 'Gerando resumo'
+};
+
+/**
+ * Acompanha um job de upload até terminar e retorna seu resultado
+ */
+async function aguardarJob(jobId, intervalo = 500) {
+    const texto = document.querySelector('#loading span');
+    
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        if (!response.ok) {
+            throw new Error('Falha ao consultar processamento');
+        }
+        
+        const job = await response.json();
+        
+        if (job.status === 'concluido') {
+            if (texto) texto.textContent = 'Processando dados...';
+            return job.resultado;
+        }
+        if (job.status === 'erro') {
+            if (texto) texto.textContent = 'Processando dados...';
+            throw new Error(job.erro || 'Erro ao processar arquivo');
+        }
+        
+        if (texto && job.etapa) {
+            texto.textContent = `${ETAPAS_JOB[job.etapa] || 'Processando dados'}... (${job.progresso}%)`;
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, intervalo));
+    }
+}
+
 /**
  * Mostra dashboard
  */
@@ -1057,10 +1096,10 @@ async function handleFileUpload(event) {
         return;
     }
     
-    const validExtensions = ['.csv', '.xlsx', '.xls'];
+    const validExtensions = ['.csv', '.csv.gz', '.zip', '.xlsx', '.xls', '.parquet', '.feather', '.arrow', '.ipc'];
     const isValid = validExtensions.some(ext => file.name.toLowerCase().endsWith(ext));
     if (!isValid) {
-        alert('Por favor, selecione um arquivo CSV ou Excel válido (.csv, .xlsx, .xls)');
+        alert('Por favor, selecione um arquivo válido (.csv, .csv.gz, .zip, .xlsx, .xls, .parquet, .feather, .arrow, .ipc)');
         return;
     }
     
@@ -1080,20 +1119,24 @@ async function handleFileUpload(event) {
             throw new Error(error.detail || 'Erro ao processar arquivo');
         }
         
-        const data = await response.json();
+        const job = await response.json();
+        const data = await aguardarJob(job.job_id);
         
         if (data.success) {
-            // Busca dados completos
+            datasetAtual = data.dataset_id;
+            
+            // Busca dados completos e as seções do resumo que o dashboard usa
+            // (o upload devolve só o cabeçalho do resumo)
             try {
-                const dadosResponse = await fetch('/api/dados');
+                const dadosResponse = await fetch(`/api/dados?dataset_id=${datasetAtual}&secoes=principal,regiao`);
                 if (!dadosResponse.ok) {
                     throw new Error('Falha ao buscar dados completos');
                 }
                 const dadosData = await dadosResponse.json();
                 
-                updateDashboard(data.resumo, dadosData.dados_completos);
+                updateDashboard(dadosData.resumo, dadosData.dados_completos);
             } catch (dadosError) {
-                // Mesmo sem dados completos, mostra o dashboard com o resumo
+                // Mesmo sem dados completos, mostra o dashboard com o cabeçalho do resumo
                 updateDashboard(data.resumo, []);
             }
             showDashboard();
@@ -1127,6 +1170,7 @@ async function loadSampleData() {
         const data = await response.json();
         
         if (data.success) {
+            datasetAtual = data.dataset_id;
             updateDashboard(data.resumo);
             showDashboard();
         } else {
@@ -1140,12 +1184,19 @@ async function loadSampleData() {
     }
 }
 
+/**
+ * Query string com o dataset exibido (vazia usa o mais recente do servidor)
+ */
+function parametroDataset() {
+    return datasetAtual ? `?dataset_id=${datasetAtual}` : '';
+}
+
 /**
  * Exporta para CSV
  */
 async function exportCSV() {
     try {
-        const response = await fetch('/api/export/csv');
+        const response = await fetch(`/api/export/csv${parametroDataset()}`);
         
         if (!response.ok) {
             throw new Error('Nenhum dado para exportar');
@@ -1171,7 +1222,7 @@ async function exportCSV() {
  */
 async function exportExcel() {
     try {
-        const response = await fetch('/api/export/excel');
+        const response = await fetch(`/api/export/excel${parametroDataset()}`);
         
         if (!response.ok) {
             throw new Error('Nenhum dado para exportar');
@@ -1469,6 +1520,7 @@ async function salvarSnapshot() {
                     regiao: regiaoAtual,
                     vip: vipAtual
                 },
+                dataset_id: datasetAtual,
                 data: dataSnapshot || null // Se vazio, backend usa data atual
             })
         });
@@ -0,0 +1,25 @@
+"""
+Configuração comum dos testes: o app é importado com um histórico SQLite
+temporário (HISTORICO_DB), para não alterar o historico.db do repositório.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+PASTA_TESTES = tempfile.mkdtemp(prefix='health-score-testes-')
+os.environ['HISTORICO_DB'] = os.path.join(PASTA_TESTES, 'historico.db')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def cliente(monkeypatch, tmp_path):
+    """TestClient do app com o cache de resultados em uma pasta temporária"""
+    import app
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(app, 'CACHE_DIR', str(tmp_path / 'cache_resultados'))
+    return TestClient(app.app)
@@ -0,0 +1,42 @@
+"""
+Leitura de Excel: o motor calamine devolve o mesmo DataFrame que o openpyxl.
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+pytest.importorskip('python_calamine')
+
+
+def planilha() -> io.BytesIO:
+    df = pd.DataFrame({
+        'player_id': ['P1', 'P2', 'P3', 'P4'],
+        'nivel_vip': [1, 3, np.nan, 5],
+        'lastlogin': pd.to_datetime(['2026-10-01', None, '2026-10-15 08:30', '2026-09-30'], format='mixed'),
+        'translation': ['pt_BR', 'es_AR', None, 'en_US'],
+        'qtd_logins_3d': [2, 0, np.nan, 7],
+        'ticket_medio_7d': [10.5, np.nan, 0.0, 99.99],
+        'coluna_extra': ['a', 'b', 'c', 'd'],
+    })
+    arquivo = io.BytesIO()
+    df.to_excel(arquivo, index=False)
+    return arquivo
+
+
+@pytest.mark.parametrize('usecols', [None, app.coluna_do_esquema])
+def test_calamine_igual_a_openpyxl(monkeypatch, usecols):
+    info = {}
+    calamine = app.ler_excel(planilha(), usecols, info)
+    assert info['motor'] == 'calamine'
+
+    monkeypatch.setattr(app, 'CALAMINE_DISPONIVEL', False)
+    info = {}
+    openpyxl = app.ler_excel(planilha(), usecols, info)
+    assert info['motor'] == 'openpyxl'
+
+    pd.testing.assert_frame_equal(calamine, openpyxl)
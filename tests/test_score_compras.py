@@ -0,0 +1,140 @@
+"""
+Compara calcular_score_compras (colunar) com a versão original linha a linha
+(iterrows), mantida aqui como referência, com data de referência fixa.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import HealthScoreCalculator
+
+DATA_REFERENCIA = datetime(2026, 10, 18, 12, 0)
+
+
+def score_compras_referencia(calc: HealthScoreCalculator, df: pd.DataFrame) -> pd.Series:
+    """Implementação original (iterrows) de calcular_score_compras"""
+    scores = []
+    hoje = calc.data_referencia
+
+    if 'qtd_compras_7d' in df.columns:
+        valores_qtd = df['qtd_compras_7d'].fillna(0)
+        media_qtd = valores_qtd.mean()
+        std_qtd = valores_qtd.std() if len(valores_qtd) > 1 else 1
+        if std_qtd == 0:
+            std_qtd = 1
+
+    if 'ticket_medio_7d' in df.columns:
+        valores_ticket = df['ticket_medio_7d'].fillna(0)
+        media_ticket = valores_ticket.mean()
+        std_ticket = valores_ticket.std() if len(valores_ticket) > 1 else 1
+        if std_ticket == 0:
+            std_ticket = 1
+
+    for _, row in df.iterrows():
+        pontuacoes = []
+        pesos = []
+
+        if 'qtd_compras_7d' in df.columns:
+            qtd = row.get('qtd_compras_7d', 0) or 0
+            qtd_score = 50 + ((qtd - media_qtd) / std_qtd * 25)
+            qtd_score = max(0, min(100, qtd_score))
+            pontuacoes.append(qtd_score * 0.40)
+            pesos.append(0.40)
+
+        if 'ticket_medio_7d' in df.columns:
+            ticket = row.get('ticket_medio_7d', 0) or 0
+            ticket_score = 50 + ((ticket - media_ticket) / std_ticket * 25)
+            ticket_score = max(0, min(100, ticket_score))
+            pontuacoes.append(ticket_score * 0.35)
+            pesos.append(0.35)
+
+        if 'ultima_compra' in df.columns and pd.notna(row.get('ultima_compra')):
+            try:
+                ultima = pd.to_datetime(row['ultima_compra'])
+                dias_ultima = (hoje - ultima).days
+                recencia_score = 100 * np.exp(-max(0, dias_ultima) / 30)
+                pontuacoes.append(recencia_score * 0.25)
+                pesos.append(0.25)
+            except:
+                pass
+
+        if pontuacoes:
+            score_final = sum(pontuacoes) / sum(pesos) if sum(pesos) > 0 else 30
+            scores.append(score_final)
+        else:
+            scores.append(0)  # Sem dados de compra = 0
+
+    return pd.Series(scores)
+
+
+QTD = [3, 0, 1, 5, np.nan, 2, np.nan, 1]
+TICKET = [25.0, 0.0, np.nan, 80.5, 10.0, np.nan, np.nan, 40.0]
+
+CASOS = {
+    'completo': {
+        'qtd_compras_7d': [3, 0, 1, 5, 2],
+        'ticket_medio_7d': [25.0, 0.0, 12.5, 80.5, 10.0],
+        'ultima_compra': ['2026-10-17', '2026-09-01', '2026-10-10 14:00:00', '2026-08-15', '2026-10-18'],
+    },
+    'sem_ultima_compra_com_qtd_e_ticket': {
+        'qtd_compras_7d': [3, 0, 1, 5, 2],
+        'ticket_medio_7d': [25.0, 0.0, 12.5, 80.5, 10.0],
+        'ultima_compra': [None, np.nan, pd.NaT, '2026-10-01', None],
+    },
+    'sem_ultima_compra_sem_qtd_ou_ticket': {
+        'qtd_compras_7d': QTD,
+        'ticket_medio_7d': TICKET,
+        'ultima_compra': [None, np.nan, None, '2026-10-01', pd.NaT, None, None, '2026-10-12'],
+    },
+    'ultima_compra_invalida': {
+        'qtd_compras_7d': QTD,
+        'ticket_medio_7d': TICKET,
+        'ultima_compra': ['x', '2026-13-45', '2026-10-01', 'sem compra', None, '2026-10-15', 'abc', None],
+    },
+    'ultima_compra_futura': {
+        'qtd_compras_7d': [1, 2, np.nan],
+        'ticket_medio_7d': [5.0, np.nan, 20.0],
+        'ultima_compra': ['2026-10-25', '2027-01-01', '2026-10-18 20:00:00'],
+    },
+    'sem_coluna_ultima_compra': {
+        'qtd_compras_7d': QTD,
+        'ticket_medio_7d': TICKET,
+    },
+    'apenas_ultima_compra': {
+        'ultima_compra': ['2026-10-17', None, 'x', '2026-09-18'],
+    },
+    'sem_colunas': {
+        'player_id': ['P1', 'P2'],
+    },
+}
+
+
+@pytest.mark.parametrize('caso', CASOS)
+def test_score_compras_igual_a_referencia(caso):
+    df = pd.DataFrame(CASOS[caso])
+    calc = HealthScoreCalculator(data_referencia=DATA_REFERENCIA)
+
+    # Quantidade e ticket ausentes valem zero (ver test_qtd_e_ticket_ausentes_pontuam_como_zero)
+    preenchido = df.fillna({col: 0 for col in ('qtd_compras_7d', 'ticket_medio_7d') if col in df.columns})
+    esperado = score_compras_referencia(calc, preenchido).to_numpy(dtype=float)
+    obtido = calc.calcular_score_compras(df)
+
+    assert obtido.index.equals(df.index)
+    np.testing.assert_allclose(obtido.to_numpy(), esperado, rtol=1e-9, atol=1e-9)
+
+
+def test_qtd_e_ticket_ausentes_pontuam_como_zero():
+    # Na referência, o NaN passava pelo "or 0" e min(100, nan) devolvia 100: sem
+    # quantidade ou ticket, o jogador recebia a nota máxima no componente.
+    df = pd.DataFrame(CASOS['sem_ultima_compra_sem_qtd_ou_ticket'])
+    calc = HealthScoreCalculator(data_referencia=DATA_REFERENCIA)
+
+    obtido = calc.calcular_score_compras(df).to_numpy()
+    referencia = score_compras_referencia(calc, df).to_numpy(dtype=float)
+
+    com_ausentes = df[['qtd_compras_7d', 'ticket_medio_7d']].isna().any(axis=1).to_numpy()
+    np.testing.assert_allclose(obtido[~com_ausentes], referencia[~com_ausentes], rtol=1e-9, atol=1e-9)
+    assert (obtido[com_ausentes] < referencia[com_ausentes]).all()
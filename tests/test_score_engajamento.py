@@ -0,0 +1,113 @@
+"""
+Compara calcular_score_engajamento (matriz de Z-Scores) com a versão original
+linha a linha (iterrows), mantida aqui como referência.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import ATIVIDADES_ENGAJAMENTO, HealthScoreCalculator
+
+
+def score_engajamento_referencia(calc: HealthScoreCalculator, df: pd.DataFrame) -> pd.Series:
+    """Implementação original (iterrows) de calcular_score_engajamento, com os pesos do calc"""
+    scores = []
+
+    atividades = {
+        key: {'col': config['col'], 'peso': calc.pesos_engajamento[key]}
+        for key, config in ATIVIDADES_ENGAJAMENTO.items()
+    }
+
+    # Calcula média e desvio padrão para cada atividade
+    stats = {}
+    for key, config in atividades.items():
+        col = config['col']
+        if col in df.columns:
+            valores = df[col].fillna(0)
+            media = valores.mean()
+            std = valores.std() if len(valores) > 1 else 1
+            if std == 0:
+                std = 1  # Evita divisão por zero
+            stats[key] = {'media': media, 'std': std, 'peso': config['peso']}
+
+    for _, row in df.iterrows():
+        atividades_scores = []
+        atividades_pesos = []
+
+        for key, stat in stats.items():
+            col = atividades[key]['col']
+            valor = row.get(col, 0) or 0
+
+            z_score = (valor - stat['media']) / stat['std']
+            atividade_score = 50 + (z_score * 25)
+            atividade_score = max(0, min(100, atividade_score))
+
+            atividades_scores.append(atividade_score * stat['peso'])
+            atividades_pesos.append(stat['peso'])
+
+        if atividades_scores:
+            scores.append(sum(atividades_scores) / sum(atividades_pesos))
+        else:
+            scores.append(40)  # Score padrão se não houver dados
+
+    return pd.Series(scores)
+
+
+def atividades(n: int = 60, ausentes: float = 0.0, seed: int = 3) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'qtd_torneios_3d': rng.poisson(15, n).astype(float),
+        'qtd_maratonas_3d': rng.poisson(5, n).astype(float),
+        'qtd_missoes_3d': rng.poisson(8, n).astype(float),
+        'qtd_promos_3d': rng.poisson(6, n).astype(float),
+        'qtd_logins_3d': rng.poisson(2, n).astype(float),
+    })
+    if ausentes:
+        df = df.mask(rng.random(df.shape) < ausentes)
+    return df
+
+
+CASOS = {
+    'completo': lambda: atividades(),
+    'com_ausentes': lambda: atividades(ausentes=0.2),
+    'coluna_toda_ausente': lambda: atividades().assign(qtd_promos_3d=np.nan),
+    'algumas_colunas': lambda: atividades(ausentes=0.1)[['qtd_torneios_3d', 'qtd_logins_3d']],
+    'coluna_constante': lambda: atividades().assign(qtd_maratonas_3d=4.0),
+    'uma_linha': lambda: atividades(n=1),
+    'sem_atividades': lambda: pd.DataFrame({'player_id': ['P1', 'P2']}),
+}
+
+PESOS = {
+    'padrao': None,
+    'personalizados': {'torneios': 5.0, 'maratonas': 0.5, 'logins': 3.0},
+}
+
+
+@pytest.mark.parametrize('pesos', PESOS)
+@pytest.mark.parametrize('caso', CASOS)
+def test_score_engajamento_igual_a_referencia(caso, pesos):
+    df = CASOS[caso]()
+    calc = HealthScoreCalculator(pesos_engajamento=PESOS[pesos])
+
+    # Contagens ausentes valem zero (ver test_contagem_ausente_pontua_como_zero)
+    esperado = score_engajamento_referencia(calc, df.fillna(0)).to_numpy(dtype=float)
+    obtido = calc.calcular_score_engajamento(df)
+
+    assert obtido.index.equals(df.index)
+    np.testing.assert_allclose(obtido.to_numpy(), esperado, rtol=1e-9, atol=1e-9)
+
+
+def test_contagem_ausente_pontua_como_zero():
+    # Na referência, o NaN passava pelo "or 0" e min(100, nan) devolvia 100: quem
+    # não tinha a contagem recebia a nota máxima. Agora conta como zero atividades.
+    df = atividades(ausentes=0.3)
+    calc = HealthScoreCalculator()
+
+    obtido = calc.calcular_score_engajamento(df).to_numpy()
+    np.testing.assert_allclose(obtido, calc.calcular_score_engajamento(df.fillna(0)).to_numpy(), rtol=0, atol=0)
+
+    linhas_com_ausentes = df.isna().any(axis=1).to_numpy()
+    referencia = score_engajamento_referencia(calc, df).to_numpy(dtype=float)
+    assert linhas_com_ausentes.any()
+    assert (obtido[linhas_com_ausentes] < referencia[linhas_com_ausentes]).all()
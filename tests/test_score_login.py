@@ -0,0 +1,114 @@
+"""
+Compara calcular_score_login (colunar) com a versão original linha a linha (iterrows),
+mantida aqui como referência, com data de referência fixa.
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import HealthScoreCalculator  # noqa: E402
+
+DATA_REFERENCIA = datetime(2026, 10, 18, 12, 0)
+
+
+def score_login_referencia(calc: HealthScoreCalculator, df: pd.DataFrame) -> pd.Series:
+    """Implementação original (iterrows) de calcular_score_login"""
+    hoje = calc.data_referencia
+    scores = []
+
+    for _, row in df.iterrows():
+        pontuacoes = []
+
+        # Recência do último login
+        if 'lastlogin' in df.columns and pd.notna(row.get('lastlogin')):
+            try:
+                last_login = pd.to_datetime(row['lastlogin'])
+                dias_desde_login = (hoje - last_login).days
+                login_score = 100 * np.exp(-max(0, dias_desde_login) / 7)
+                pontuacoes.append(login_score)
+            except:
+                pass
+
+        # Frequência de logins na janela de 3 dias
+        if 'qtd_logins_3d' in df.columns:
+            qtd = row.get('qtd_logins_3d', 0)
+            if pd.notna(qtd):
+                freq_score = min(qtd * calc.params['logins_factor'], 100)
+                pontuacoes.append(freq_score)
+
+        if pontuacoes:
+            scores.append(np.mean(pontuacoes))
+        else:
+            scores.append(50)
+
+    return pd.Series(scores)
+
+
+CASOS = {
+    'ausentes': {
+        'lastlogin': [None, np.nan, '2026-10-17', pd.NaT, '2026-10-01'],
+        'qtd_logins_3d': [3, np.nan, np.nan, 0, 12],
+    },
+    'invalidos': {
+        'lastlogin': ['ontem', '2026-10-15', 'n/a', '2026-13-45'],
+        'qtd_logins_3d': [1, 2, np.nan, 5],
+    },
+    'formatos_mistos': {
+        'lastlogin': ['2026-10-15', '2026-10-10 08:30:00', '10/01/2026', 'Oct 5, 2026',
+                      '2026-09-30T23:59:59', datetime(2026, 10, 16, 18, 0)],
+        'qtd_logins_3d': [4, np.nan, 2, 7, np.nan, 1],
+    },
+    'futuros': {
+        'lastlogin': ['2026-10-19', '2027-01-01', '2026-10-18 18:00:00', '2026-10-18'],
+        'qtd_logins_3d': [np.nan, 2, np.nan, 40],
+    },
+    'sem_lastlogin': {
+        'qtd_logins_3d': [0, 3, np.nan, 100],
+    },
+    'sem_colunas': {
+        'uid': [1, 2, 3],
+    },
+}
+
+
+@pytest.mark.parametrize('caso', CASOS)
+def test_score_login_igual_a_referencia(caso):
+    df = pd.DataFrame(CASOS[caso])
+    calc = HealthScoreCalculator(data_referencia=DATA_REFERENCIA)
+
+    esperado = score_login_referencia(calc, df).to_numpy(dtype=float)
+    obtido = calc.calcular_score_login(df)
+
+    assert obtido.index.equals(df.index)
+    np.testing.assert_allclose(obtido.to_numpy(), esperado, rtol=1e-12, atol=0)
+
+
+def test_score_login_preserva_indice():
+    df = pd.DataFrame(CASOS['formatos_mistos'], index=[10, 3, 7, 42, 5, 0])
+    calc = HealthScoreCalculator(data_referencia=DATA_REFERENCIA)
+
+    esperado = score_login_referencia(calc, df).to_numpy(dtype=float)
+    obtido = calc.calcular_score_login(df)
+
+    assert list(obtido.index) == [10, 3, 7, 42, 5, 0]
+    np.testing.assert_allclose(obtido.to_numpy(), esperado, rtol=1e-12, atol=0)
+
+
+def test_texto_vazio_equivale_a_ausente():
+    # Na referência, pd.to_datetime('') é NaT e max(0, nan) == 0: o texto vazio
+    # contava como login no dia. O cálculo colunar o trata como data ausente.
+    calc = HealthScoreCalculator(data_referencia=DATA_REFERENCIA)
+    vazio = pd.DataFrame({'lastlogin': ['', '2026-10-15'], 'qtd_logins_3d': [np.nan, 2]})
+    ausente = pd.DataFrame({'lastlogin': [None, '2026-10-15'], 'qtd_logins_3d': [np.nan, 2]})
+
+    esperado = score_login_referencia(calc, ausente).to_numpy(dtype=float)
+    obtido = calc.calcular_score_login(vazio)
+
+    np.testing.assert_allclose(obtido.to_numpy(), esperado, rtol=1e-12, atol=0)
@@ -0,0 +1,175 @@
+"""
+Consulta de segmentos (/api/segmentos): resultados comparados com uma máscara
+booleana do pandas sobre o mesmo DataFrame, paginação, ordenação e filtros inválidos.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    """Dataset pequeno processado e publicado no registro (df com scores e categorias)"""
+    n = 400
+    rng = np.random.default_rng(11)
+    hoje = pd.Timestamp.now().normalize()
+    df = pd.DataFrame({
+        'player_id': [f'P{i}' for i in range(n)],
+        'nivel_vip': rng.choice([1, 2, 3, 4, 5, np.nan], n),
+        'lastlogin': hoje - pd.to_timedelta(rng.integers(0, 40, n), unit='D'),
+        'translation': rng.choice(['pt_BR', 'es_AR', 'es_MX', 'en_US', None], n),
+        'qtd_logins_3d': rng.poisson(2, n),
+        'qtd_compras_7d': rng.poisson(1, n),
+        'qtd_torneios_3d': rng.poisson(15, n),
+        'qtd_maratonas_3d': rng.poisson(5, n),
+        'ticket_medio_7d': rng.exponential(30, n).round(2),
+        'ultima_compra': hoje - pd.to_timedelta(rng.integers(0, 90, n), unit='D'),
+    })
+    df_processado, params = app.processar_dados_jogadores(df)
+    publicado = app.registro_datasets.publicar(df_processado, app.ResumoDashboard(df_processado, params), params)
+    return publicado['dataset_id'], df_processado
+
+
+def consultar(cliente, dataset_id: str, filtro: str, **params):
+    return cliente.get('/api/segmentos', params={'filtro': filtro, 'dataset_id': dataset_id, **params})
+
+
+def ids_por_pagina(cliente, dataset_id: str, filtro: str, **params) -> list:
+    """IDs do segmento juntando todas as páginas"""
+    ids, pagina = [], 1
+    while True:
+        resposta = consultar(cliente, dataset_id, filtro, pagina=pagina, **params).json()
+        ids += resposta['player_ids']
+        if pagina >= resposta['total_paginas']:
+            return ids
+        pagina += 1
+
+
+def categoria_normalizada(df: pd.DataFrame) -> pd.Series:
+    """Categoria sem emoji, acentos e pontuação ('🚨 Risco: Queda Receita' -> 'risco queda receita')"""
+    return (df['categoria'].astype(str).str.normalize('NFKD')
+            .str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.replace(r'[^\w]+', ' ', regex=True).str.strip().str.lower())
+
+
+def nivel_vip(df: pd.DataFrame) -> pd.Series:
+    return df['nivel_vip'].astype(float)
+
+
+FILTROS = {
+    '': lambda df: pd.Series(True, index=df.index),
+    'nivel_vip>=3': lambda df: nivel_vip(df) >= 3,
+    'nivel_vip<2': lambda df: nivel_vip(df) < 2,
+    'nivel_vip in (1, 5)': lambda df: nivel_vip(df).isin([1, 5]),
+    'regiao=es': lambda df: df['regiao'] == 'es',
+    'REGIAO = "br"': lambda df: df['regiao'] == 'br',
+    'regiao in (es, int)': lambda df: df['regiao'].isin(['es', 'int']),
+    'score_compras<30': lambda df: df['score_compras'] < 30,
+    'score_geral>=40; score_geral<=60': lambda df: df['score_geral'].between(40, 60),
+    'score_engajamento>50 and score_login<=70': lambda df: (df['score_engajamento'] > 50) & (df['score_login'] <= 70),
+    'categoria in (risco*)': lambda df: categoria_normalizada(df).str.startswith('risco'),
+    'categoria=Estavel': lambda df: categoria_normalizada(df) == 'estavel',
+    "categoria in ('🚨 Risco: Queda Receita', oportunidade*)":
+        lambda df: (categoria_normalizada(df) == 'risco queda receita') | categoria_normalizada(df).str.startswith('oportunidade'),
+    'nivel_vip>=3; regiao=es; score_compras<30; categoria in (risco*, churn*)':
+        lambda df: ((nivel_vip(df) >= 3) & (df['regiao'] == 'es') & (df['score_compras'] < 30)
+                    & categoria_normalizada(df).str.contains(r'^(?:risco|churn)', regex=True)),
+    'regiao in (es, br); regiao=br': lambda df: df['regiao'] == 'br',
+    'regiao=xx': lambda df: pd.Series(False, index=df.index),
+}
+
+
+@pytest.mark.parametrize('filtro', FILTROS)
+def test_segmento_igual_a_mascara_pandas(cliente, dataset, filtro):
+    dataset_id, df = dataset
+    esperado = df.loc[FILTROS[filtro](df).fillna(False).astype(bool), 'player_id'].tolist()
+
+    resposta = consultar(cliente, dataset_id, filtro, por_pagina=1000)
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+
+    assert corpo['quantidade'] == len(esperado)
+    assert corpo['player_ids'] == esperado
+    assert corpo['percentual'] == round(100 * len(esperado) / len(df), 2)
+
+
+def test_segmento_score_igual(cliente, dataset):
+    dataset_id, df = dataset
+    valor = float(df['score_engajamento'].mode()[0])
+    esperado = df.loc[df['score_engajamento'] == valor, 'player_id'].tolist()
+
+    corpo = consultar(cliente, dataset_id, f'score_engajamento={valor!r}; regiao in (es, br, int)').json()
+
+    assert len(esperado) > 1
+    assert corpo['player_ids'] == esperado
+
+
+def test_segmento_agregados(cliente, dataset):
+    dataset_id, df = dataset
+    segmento = df[(df['regiao'] == 'es') & (df['score_compras'] < 30)]
+
+    agregados = consultar(cliente, dataset_id, 'regiao=es; score_compras<30').json()['agregados']
+
+    assert agregados['score_geral']['media'] == round(float(segmento['score_geral'].mean()), 2)
+    assert agregados['score_compras']['max'] == round(float(segmento['score_compras'].max()), 2)
+    assert agregados['percentual_ativos'] == round(float(segmento['ativo'].mean()) * 100, 2)
+    assert agregados['distribuicao_categorias'] == {
+        str(categoria): int(quantidade)
+        for categoria, quantidade in segmento['categoria'].value_counts().items() if quantidade
+    }
+
+
+def test_segmento_paginacao(cliente, dataset):
+    dataset_id, df = dataset
+    filtro = 'score_geral>=30'
+    esperado = df.loc[df['score_geral'] >= 30, 'player_id'].tolist()
+
+    primeira = consultar(cliente, dataset_id, filtro, por_pagina=7).json()
+    assert primeira['total_paginas'] == -(-len(esperado) // 7)
+    assert primeira['player_ids'] == esperado[:7]
+    assert ids_por_pagina(cliente, dataset_id, filtro, por_pagina=7) == esperado
+
+    alem_do_fim = consultar(cliente, dataset_id, filtro, por_pagina=7, pagina=primeira['total_paginas'] + 1).json()
+    assert alem_do_fim['player_ids'] == []
+    assert alem_do_fim['quantidade'] == len(esperado)
+
+
+@pytest.mark.parametrize('ordenar', ['score_compras', '-score_geral'])
+def test_segmento_ordenado(cliente, dataset, ordenar):
+    dataset_id, df = dataset
+    segmento = df[df['regiao'] == 'br']
+    coluna = ordenar.lstrip('-')
+    esperado = segmento.sort_values(coluna, ascending=not ordenar.startswith('-'), kind='stable')
+
+    ids = ids_por_pagina(cliente, dataset_id, 'regiao=br', por_pagina=50, ordenar=ordenar)
+
+    assert sorted(ids) == sorted(esperado['player_id'])
+    np.testing.assert_array_equal(df.set_index('player_id').loc[ids, coluna].to_numpy(), esperado[coluna].to_numpy())
+
+
+@pytest.mark.parametrize('filtro', [
+    'nivel_vip',
+    'nivel_vip>>3',
+    'score_geral>alto',
+    'score_geral in (10, 20)',
+    'regiao>es',
+    'coluna_inexistente=1',
+    'nivel_vip>=tres',
+    'regiao=es; ; score_compras',
+])
+def test_filtro_invalido_retorna_400(cliente, dataset, filtro):
+    dataset_id, _ = dataset
+    resposta = consultar(cliente, dataset_id, filtro)
+    assert resposta.status_code == 400
+    assert resposta.json()['detail']
+
+
+@pytest.mark.parametrize('params', [{'ordenar': 'nivel_vip'}, {'pagina': 0}, {'por_pagina': 0},
+                                    {'por_pagina': app.POR_PAGINA_MAX_SEGMENTO + 1}])
+def test_parametros_invalidos(cliente, dataset, params):
+    dataset_id, _ = dataset
+    resposta = consultar(cliente, dataset_id, '', **params)
+    assert resposta.status_code in (400, 422)
@@ -0,0 +1,46 @@
+"""
+Upload pelo endpoint de jobs (/api/upload) até o resultado em /api/jobs/{job_id}.
+"""
+
+import gzip
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def jogadores(n: int = 200) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        'player_id': [f'P{i}' for i in range(n)],
+        'nivel_vip': rng.integers(1, 6, n),
+        'lastlogin': pd.Timestamp.now().normalize() - pd.to_timedelta(rng.integers(0, 30, n), unit='D'),
+        'translation': rng.choice(['pt_BR', 'es_AR', 'en_US'], n),
+        'qtd_logins_3d': rng.poisson(2, n),
+        'qtd_compras_7d': rng.poisson(1, n),
+        'qtd_torneios_3d': rng.poisson(15, n),
+        'ticket_medio_7d': rng.exponential(30, n).round(2),
+    })
+
+
+def aguardar_job(cliente, job_id: str, limite: float = 30) -> dict:
+    fim = time.monotonic() + limite
+    while True:
+        job = cliente.get(f'/api/jobs/{job_id}').json()
+        if job['status'] in ('concluido', 'erro') or time.monotonic() > fim:
+            return job
+        time.sleep(0.05)
+
+
+def test_upload_csv_gz_conclui(cliente):
+    df = jogadores()
+    conteudo = gzip.compress(df.to_csv(index=False, sep=';').encode('utf-8'))
+
+    resposta = cliente.post('/api/upload', files={'file': ('jogadores.csv.gz', conteudo, 'application/gzip')})
+    assert resposta.status_code == 202
+
+    job = aguardar_job(cliente, resposta.json()['job_id'])
+    assert job['status'] == 'concluido', job.get('erro')
+    assert job['resultado']['resumo']['total_jogadores'] == len(df)
+    assert job['resultado']['leitura']['formato'] == 'csv_gz'